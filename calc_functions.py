@@ -38,14 +38,15 @@ def calc_weighed_percentile_df(dataframe, param):
                                'Percentile 99': np.nan,
                                'Percentile 100': np.nan}
         else:
+            p25, p50, p75, p90, p95, p98, p99 = weighed_percentiles(df, [0.25, 0.5, 0.75, 0.90, 0.95, 0.98, 0.99])
             percentile_dict = {'Percentile 0': dataframe[param].min(),
-                               'Percentile 25': weighed_percentile(df, 0.25),
-                               'Percentile 50': weighed_percentile(df, 0.5),
-                               'Percentile 75': weighed_percentile(df, 0.75),
-                               'Percentile 90': weighed_percentile(df, 0.90),
-                               'Percentile 95': weighed_percentile(df, 0.95),
-                               'Percentile 98': weighed_percentile(df, 0.98),
-                               'Percentile 99': weighed_percentile(df, 0.99),
+                               'Percentile 25': p25,
+                               'Percentile 50': p50,
+                               'Percentile 75': p75,
+                               'Percentile 90': p90,
+                               'Percentile 95': p95,
+                               'Percentile 98': p98,
+                               'Percentile 99': p99,
                                'Percentile 100': dataframe[param].max()}
     except KeyError as e:
         logger.exception(e)
@@ -54,6 +55,58 @@ def calc_weighed_percentile_df(dataframe, param):
         return percentile_dict
 
 
+def calc_weighed_percentile_dfs(dataframe, param, masks):
+    """
+    Function calculates calc_weighed_percentile_df of several row subsets of the dataframe with one sort
+    (grouped_weighed_percentiles, each subset is a group). Subsets the kernel can not calculate
+    (values not numeric, no rank) are calculated with calc_weighed_percentile_df.
+    :param dataframe: dataframe
+    :param param: Calibration parameter used for filter
+    :param masks: list of boolean row masks (None = all rows)
+    :return: list of dictionaries, in masks order
+    """
+    logger.debug(f'param: {param}')
+    try:
+        values = dataframe[param]
+        weights = dataframe['weight'].to_numpy()
+    except KeyError as e:
+        logger.exception(e)
+        raise e
+    masks = [np.ones(dataframe.shape[0], dtype=bool) if mask is None else np.asarray(mask) for mask in masks]
+    nth_q_list = [0.25, 0.5, 0.75, 0.90, 0.95, 0.98, 0.99]
+    # rows of every subset, subset number is the group id (rows without weight are not used)
+    rows = [np.flatnonzero(mask) for mask in masks]
+    row_index = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    group_ids = np.repeat(np.arange(len(masks)), [subset_rows.size for subset_rows in rows])
+    group_ids[pandas.isnull(weights[row_index])] = -1
+    group_ids[weights[row_index] == 0] = -1
+    # object columns (None rows of measurements without convergence) are used if all values are numbers
+    if pandas.api.types.infer_dtype(values, skipna=True) in ('floating', 'integer', 'mixed-integer-float', 'empty'):
+        try:
+            subset_values = pandas.to_numeric(values.iloc[row_index]).to_numpy(dtype=float)
+            percentiles = grouped_weighed_percentiles(subset_values, weights[row_index], group_ids, nth_q_list,
+                                                      n_groups=len(masks))
+        except IndexError:
+            percentiles = None
+    else:
+        percentiles = None
+    has_weight = np.bincount(group_ids[group_ids >= 0], minlength=len(masks)) > 0
+    percentile_dict_list = []
+    for num, mask in enumerate(masks):
+        if not has_weight[num]:
+            percentile_dict = {f'Percentile {p}': np.nan for p in [0, 25, 50, 75, 90, 95, 98, 99, 100]}
+        elif percentiles is None or np.isnan(percentiles[num]).any():
+            percentile_dict = calc_weighed_percentile_df(dataframe[mask], param)
+        else:
+            subset_values = values[mask]
+            percentile_dict = {'Percentile 0': subset_values.min()}
+            for nth_q, percentile in zip(nth_q_list, percentiles[num]):
+                percentile_dict[f'Percentile {round(nth_q * 100)}'] = percentile
+            percentile_dict['Percentile 100'] = subset_values.max()
+        percentile_dict_list.append(percentile_dict)
+    return percentile_dict_list
+
+
 def weighed_percentile(df, nth_q, interpolation='linear'):
     """
     Function calculates weighted percentile
@@ -62,22 +115,58 @@ def weighed_percentile(df, nth_q, interpolation='linear'):
     :param nth_q: nth quantile (n is any number between and including 0 and 1)
     :param interpolation: Optional parameter specifies the interpolation method
     (same as numpy.percentile interpolation parameter)
-    :return: percentile value
+    :return: percentile value, None if 0 < nth_q < 1 and the sum of weights is less than 1
 
     """
-    # drop rows where param is none
-    df = df[pandas.notnull(df[df.columns[0]])]
-    # sort by values row (smallest to biggest)
-    df = df.sort_values(df.columns[0]).reset_index(drop=True)
+    return weighed_percentiles(df, [nth_q], interpolation)[0]
+
 
+def weighed_percentiles(df, nth_q_list, interpolation='linear'):
+    """
+    Function calculates weighted percentiles (see weighed_percentile) of several quantiles with one sort
+    The ranks are found with cumulative weights (each value counted int(weight) times) and searchsorted.
+    :param df: 2 row dataframe, first row: values, second row weights
+    :param nth_q_list: list of nth quantiles (n is any number between and including 0 and 1)
+    :param interpolation: Optional parameter specifies the interpolation method
+    (same as numpy.percentile interpolation parameter)
+    :return: list of percentile values, in nth_q_list order
+    """
+    data = df[df.columns[0]].to_numpy()
+    weights = df[df.columns[1]].to_numpy()
+    # drop rows where param is none
+    not_null = pandas.notnull(data)
+    data = data[not_null]
+    weights = weights[not_null]
+    # sort by values row (smallest to biggest), same sort as DataFrame.sort_values
+    order = np.argsort(data, kind='quicksort')
+    data = data[order]
+    weights = weights[order]
     # if z weight is zero, drop that row
-    if 0 in df[df.columns[1]]:
-        df = df[df[df.columns[1]] != 0]
+    non_zero = weights != 0
+    data = data[non_zero]
+    weights = weights[non_zero]
+    # get sum of weights
+    sum_of_weights = weights.sum()
+    # number of steps of each value (weights are counted as whole steps, values with weight < 1 have no steps)
+    if weights.dtype.kind == 'f':
+        steps = np.trunc(weights).astype(np.int64)
+    else:
+        steps = weights.astype(np.int64)
+    cumulative_steps = np.cumsum(np.maximum(steps, 0))
+    return [sorted_weighed_percentile(data, sum_of_weights, cumulative_steps, nth_q, interpolation)
+            for nth_q in nth_q_list]
 
-    # get data from first row, and weights from second row
-    data = np.array(df[df.columns[0]])
-    weights = np.array(df[df.columns[1]])
 
+def sorted_weighed_percentile(data, sum_of_weights, cumulative_steps, nth_q, interpolation='linear'):
+    """
+    Function calculates weighted percentile of sorted data
+    :param data: sorted values (no nan, no values with zero weight)
+    :param sum_of_weights: sum of the weights of data
+    :param cumulative_steps: cumulative sum of the whole steps (int(weight), at least 0) of data
+    :param nth_q: nth quantile (n is any number between and including 0 and 1)
+    :param interpolation: 'linear', 'higher', 'midpoint', 'nearest' or 'lower'
+    :return: percentile value, None if 0 < nth_q < 1 and the sum of weights is less than 1 (no rank)
+    """
     # min
     if nth_q <= 0:
         return data[0]
@@ -86,39 +175,135 @@ def weighed_percentile(df, nth_q, interpolation='linear'):
         return data[-1]
 
     # get rank: position of nth percentile (as it would be in a not weighed data set)
-    # get sum of weights
-    sum_of_weights = weights.sum()
-    # get rank
     rank = (nth_q * (sum_of_weights - 1)) + 1
-
     rank_int_part = int(rank)
+    if rank_int_part < 1:
+        # no step reaches rank 0, same as the step by step search that found no value
+        return None
     rank_frac_part = rank % rank_int_part
 
-    data_iterator = 0  # keeps track of when to jump to the next value
-    step = 0  # keeps track of steps (total number of steps are defined by rank)
-    while step < rank_int_part:
-        # get weight of current value
-        weight = int(weights[data_iterator])
-        for weight_iterator in range(weight):
-            step += 1
-            if step >= rank_int_part:
-                # if the next value is in the next value/weight set and is not the last value/weight set
-                if weight_iterator == weight - 1 and data_iterator < weights.size - 1:
-                    if interpolation == 'linear':
-                        return data[data_iterator] + (rank_frac_part * (data[data_iterator + 1] - data[data_iterator]))
-                    elif interpolation == 'higher':
-                        return data[data_iterator + 1]
-                    elif interpolation == 'midpoint':
-                        return (data[data_iterator] + data[data_iterator + 1]) / 2
-                    elif interpolation == 'nearest':
-                        return data[data_iterator] if rank_frac_part < 0.5 else data[data_iterator + 1]
-                    elif interpolation == 'lower':
-                        return data[data_iterator]
-                    else:
-                        raise ValueError("interpolation can only be 'linear','higher','midpoint','nearest', or 'lower'")
-                else:
-                    return data[data_iterator]
-        data_iterator += 1
+    # first value where the steps reach the rank
+    data_idx = int(np.searchsorted(cumulative_steps, rank_int_part, side='left'))
+    if data_idx == data.size:
+        raise IndexError(f'rank {rank_int_part} is larger than the number of steps {cumulative_steps[-1]}')
+    # if the rank is the last step of the value and the value is not the last value: next value is used too
+    if cumulative_steps[data_idx] == rank_int_part and data_idx < data.size - 1:
+        if interpolation == 'linear':
+            return data[data_idx] + (rank_frac_part * (data[data_idx + 1] - data[data_idx]))
+        elif interpolation == 'higher':
+            return data[data_idx + 1]
+        elif interpolation == 'midpoint':
+            return (data[data_idx] + data[data_idx + 1]) / 2
+        elif interpolation == 'nearest':
+            return data[data_idx] if rank_frac_part < 0.5 else data[data_idx + 1]
+        elif interpolation == 'lower':
+            return data[data_idx]
+        else:
+            raise ValueError("interpolation can only be 'linear','higher','midpoint','nearest', or 'lower'")
+    return data[data_idx]
+
+
+def grouped_weighed_percentiles(values, weights, group_ids, nth_q_list, interpolation='linear', n_groups=None):
+    """
+    Function calculates weighted percentiles (see weighed_percentile) of every group with one lexsort
+    The groups are sorted by value together, the ranks of each group are found in the common cumulative steps.
+    :param values: array of values
+    :param weights: array of weights
+    :param group_ids: integer array of group ids (0 to n_groups - 1, rows with negative group id are not used)
+    :param nth_q_list: list of nth quantiles (n is any number between and including 0 and 1)
+    :param interpolation: 'linear', 'higher', 'midpoint', 'nearest' or 'lower'
+    :param n_groups: number of groups (default: max group id + 1)
+    :return: float array [group, quantile] of percentile values, nan where a group has no value
+    (no rows, or rank smaller than 1 where weighed_percentile returns None)
+    """
+    if interpolation not in ('linear', 'higher', 'midpoint', 'nearest', 'lower'):
+        raise ValueError("interpolation can only be 'linear','higher','midpoint','nearest', or 'lower'")
+    values = np.asarray(values)
+    weights = np.asarray(weights)
+    group_ids = np.asarray(group_ids, dtype=np.int64)
+    if n_groups is None:
+        n_groups = int(group_ids.max()) + 1 if group_ids.size else 0
+    # drop rows where param is none, rows with zero weight and rows without group
+    used = pandas.notnull(values) & (weights != 0) & (group_ids >= 0)
+    values = values[used]
+    weights = weights[used]
+    group_ids = group_ids[used]
+    # sort by group, then by value
+    order = np.lexsort((values, group_ids))
+    data = values[order].astype(float)
+    weights = weights[order]
+    group_ids = group_ids[order]
+    if weights.dtype.kind == 'f':
+        steps = np.trunc(weights).astype(np.int64)
+    else:
+        steps = weights.astype(np.int64)
+    cumulative_steps = np.cumsum(np.maximum(steps, 0))
+    # first and end position of each group, steps of the previous groups and sum of weights of each group
+    starts = np.searchsorted(group_ids, np.arange(n_groups), side='left')
+    ends = np.searchsorted(group_ids, np.arange(n_groups), side='right')
+    steps_before = np.concatenate(([0], cumulative_steps))[starts]
+    sum_of_weights = np.bincount(group_ids, weights=weights, minlength=n_groups)[:n_groups]
+    if weights.dtype.kind != 'f':
+        sum_of_weights = sum_of_weights.astype(np.int64)
+    not_empty = ends > starts
+    percentiles = np.full((n_groups, len(nth_q_list)), np.nan)
+    for q, nth_q in enumerate(nth_q_list):
+        # min
+        if nth_q <= 0:
+            percentiles[not_empty, q] = data[starts[not_empty]]
+            continue
+        # max
+        if nth_q >= 1:
+            percentiles[not_empty, q] = data[ends[not_empty] - 1]
+            continue
+        # get rank: position of nth percentile (as it would be in a not weighed data set)
+        rank = (nth_q * (sum_of_weights - 1)) + 1
+        rank_int_part = np.trunc(rank).astype(np.int64)
+        has_rank = not_empty & (rank_int_part >= 1)
+        rank = rank[has_rank]
+        rank_int_part = rank_int_part[has_rank]
+        rank_frac_part = rank % rank_int_part
+        end = ends[has_rank]
+        # first value of the group where the steps reach the rank
+        target_steps = steps_before[has_rank] + rank_int_part
+        data_idx = np.searchsorted(cumulative_steps, target_steps, side='left')
+        if np.any(data_idx >= end):
+            raise IndexError('rank is larger than the number of steps of the group')
+        # if the rank is the last step of the value and the value is not the last value: next value is used too
+        use_next = (cumulative_steps[data_idx] == target_steps) & (data_idx < end - 1)
+        lower = data[data_idx]
+        upper = data[np.where(use_next, data_idx + 1, data_idx)]
+        if interpolation == 'linear':
+            result = np.where(use_next, lower + (rank_frac_part * (upper - lower)), lower)
+        elif interpolation == 'higher':
+            result = upper
+        elif interpolation == 'midpoint':
+            result = np.where(use_next, (lower + upper) / 2, lower)
+        elif interpolation == 'nearest':
+            result = np.where(rank_frac_part < 0.5, lower, upper)
+        else:
+            result = lower
+        percentiles[has_rank, q] = result
+    return percentiles
+
+
+def calc_2sigma_weighed_by(df_dict, filter_param):
+    """
+    Function calculates 2 sigma weighed (see calc_2sigma_weighed) for every value of filter_param at once
+    :param df_dict: dictionary of dataframes {param: dataframe}
+    :param filter_param: dataframe column, rows are grouped by its values
+    :return: dictionary {param: {filter value: 2 sigma}}
+    Values where the kernel has no result (nan) are missing, they are calculated with calc_2sigma_weighed.
+    """
+    logger.debug(f'calc 2 sigma weighed by {filter_param}')
+    two_sigma_by_dict = {}
+    for param, dataframe in df_dict.items():
+        group_ids, filter_values = pandas.factorize(dataframe[filter_param])
+        two_sigma = grouped_weighed_percentiles(dataframe[param].to_numpy(), dataframe['weight'].to_numpy(),
+                                                group_ids, [0.95], n_groups=len(filter_values))[:, 0]
+        two_sigma_by_dict[param] = {value: two_sigma[i] for i, value in enumerate(filter_values)
+                                    if not np.isnan(two_sigma[i])}
+    return two_sigma_by_dict
 
 
 def calc_percentile_df(dataframe, param):
@@ -155,7 +340,7 @@ def calc_2sigma_weighed(df_dict):
         if df.shape[0] == 0:
             two_sigma_dict[param] = np.nan
         else:
-            two_sigma_dict[param] = weighed_percentile(df, 0.95)
+            two_sigma_dict[param] = weighed_percentiles(df, [0.95])[0]
 
     return two_sigma_dict
 
@@ -394,6 +579,36 @@ def calc_delta_time_dist_df(dataframe, time_col=const.DFROW_TIME_TO_CONV, dist_c
         return df
 
 
+def calc_driven_distance(time_stamp, veh_speed, start_distance=0.0, prev_time_stamp=None, prev_veh_speed=None):
+    """
+    Function integrates vehicle speed over time (trapezoidal rule) to driven distance.
+    Where the distance increment can not be calculated (nan speed or timestamp), the last valid distance is kept.
+    Can be called split by split: pass the last distance, timestamp and speed of the previous split,
+    the result is the same as for the whole measurement.
+    :param time_stamp: array of timestamps [s]
+    :param veh_speed: array of vehicle speeds [km/h]
+    :param start_distance: distance at first sample, or at previous sample if prev_time_stamp is given [km]
+    :param prev_time_stamp: timestamp of the sample before time_stamp[0] (None = first sample of measurement)
+    :param prev_veh_speed: vehicle speed of the sample before time_stamp[0]
+    :return: array of driven distances [km], same size as time_stamp
+    """
+    time_stamp = np.asarray(time_stamp, dtype=float)
+    veh_speed = np.asarray(veh_speed, dtype=float)
+    if time_stamp.size == 0:
+        return np.array([], dtype=float)
+    if prev_time_stamp is not None:
+        time_stamp = np.concatenate(([prev_time_stamp], time_stamp))
+        veh_speed = np.concatenate(([prev_veh_speed], veh_speed))
+    v_mean = (veh_speed[1:] + veh_speed[:-1]) / 2
+    increments = np.diff(time_stamp) * (v_mean / 3600)
+    increments[np.isnan(increments)] = 0.0
+    # cumsum adds sequentially, same as adding increments one by one to the last distance
+    distance = np.cumsum(np.concatenate(([start_distance], increments)))
+    if prev_time_stamp is not None:
+        return distance[1:]
+    return distance
+
+
 def calc_calib_mbly_state_ratio_df(dataframe):
     """
     Function reads data_frame calib_param column, and calculates ratio of values ('Suspected' +
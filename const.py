@@ -17,6 +17,8 @@ SW_PACKAGE_NUM = 'E130'
 # GT_DATA_FILE = 'GT_Data.xls'
 GT_DATA_FILE = 'GT_Data.xls'
 GT_DATA_FOLDER = 'F:/CARIAD/CAL/KPI_DS_INFO/'
+# Parsed GT data cache, saved next to GT_DATA_FILE, valid while the workbook mtime and size are unchanged ('' = no cache)
+GT_DATA_CACHE_SUFFIX = '.cache.pickle'
 # Prelable dictionary
 PRELABEL_DICT_FOLDER = 'F:/CARIAD/CAL/KPI_DS_INFO/'
 PRELABEL_DICT_FILE = 'prelable_dict.json'
@@ -25,7 +27,7 @@ LOG_PICKLE_FOLDER = f'F:/CARIAD/CAL/REPRO/{SW_PACKAGE_NUM}/pickles/'
 LOG_PICKLE_EXT = 'xz'
 # CAL dictionary pickles (CAL data from reprocessed/extracted pickles)
 CAL_DICT_PICKLE_FOLDER = f'F:/CARIAD/CAL/REPRO/{SW_PACKAGE_NUM}/pickle_dict/'
-CAL_PKL_DICT_EXT = 'pickle'
+CAL_PKL_DICT_EXT = 'pickle'  # 'npz' for typed columnar split dictionaries
 # Output excel test report
 TEST_REPORT_FOLDER = f'F:/CARIAD/CAL/REPRO/{SW_PACKAGE_NUM}/test_report/'
 TEST_REPORT_FILE_NAME = 'CAL_KPI_REPORT'  # date and time added to name in main
@@ -34,10 +36,50 @@ TEST_REPORT_FILE_EXT = 'xls'  # without dot
 PARTIAL_RESULTS_FOLDER = f'F:/CARIAD/CAL/REPRO/{SW_PACKAGE_NUM}/test_report/partial_results/'
 # Measurements folder (folder where splits joined into measurements are held)
 MEASUREMENT_DFS_FOLDER = f'F:/CARIAD/CAL/REPRO/{SW_PACKAGE_NUM}/measurements/'
+MEASUREMENT_DF_EXT = 'pickle'  # 'npz' for columnar measurement dataframes (sequences load only their columns)
+# Compact dtypes of saved measurement dataframes (dtype schema below MEASUREMENT_DATA_INFO)
+MEASUREMENT_DF_COMPACT = True
+MEASUREMENT_DF_FLOAT32 = False  # also store calibration signals as float32 (changes values in the 8th digit)
+# npz measurement dataframes: run-length encode columns with at most this many runs per row (0 = no encoding)
+MEASUREMENT_DF_RLE_RATIO = 0.1
+# Summary of each measurement (HEADER sheet data), saved next to the measurement dataframe
+MEASUREMENT_SUMMARY_SUFFIX = '_summary.json'
+# Number of worker processes used to extract split pickles and make measurements (1 = no process pool)
+WORKERS = 1
+# Memory limit of each measurement in a worker process in MB (0 = no limit): resident memory the measurement adds
+# to its worker, over the resident memory of the worker when the measurement started (checked with psutil).
+# Measurements over the limit are made again once, alone in a new worker, and skipped and reported if still over it.
+WORKER_MEMORY_MB = 0
+WORKER_MEMORY_CHECK_INTERVAL = 0.5  # seconds between resident memory checks of a worker
+WORKER_MEMORY_KILL_CHECKS = 20  # busy worker exits if its memory stays over the limit this many checks after interrupt
+# Manifest of converted splits, saved in CAL_DICT_PICKLE_FOLDER
+SPLIT_MANIFEST_FILE = 'split_manifest.json'
+SPLIT_MANIFEST_HASH = False  # also compare sha1 of splits whose mtime changed (reads the split)
+SPLIT_MANIFEST_SAVE_INTERVAL = 200  # save the manifest after this many converted splits
+# Streaming mode (script function 5): also save the split calibration dictionaries to CAL_DICT_PICKLE_FOLDER
+SAVE_SPLIT_DICTS = False
+# Memory budget of the measurement dataframe cache shared by the kpi sequences (0 = no cache)
+# Only useful if sequences read the same measurements again (run outside of the single pass measurement engine)
+MEASUREMENT_CACHE_SIZE_MB = 0
+# Aggregation of the accuracy and velocity percentiles over all measurements:
+# 'frames' (unique values with weights of every measurement, exact) or
+# 'sketch' (mergeable quantile sketch per condition, memory does not grow with the measurements, see quantile_sketch.py)
+# 'histogram' (exact counts per condition and rounded delta, accuracy only, see histogram_cube.py)
+ACCURACY_AGGREGATION = 'frames'
+# Sketches keep all values only up to QUANTILE_SKETCH_COMPRESSION distinct values. Deltas rounded to 3 decimals easily
+# have more than 200 distinct values per condition, so sketch percentiles are rarely exact (use 'histogram' for exact).
+QUANTILE_SKETCH_COMPRESSION = 200  # max centroids of a sketch, more = smaller percentile error
+# Sketches are saved to json in the report folder (one file per sequence, 'sketches_<sequence>.json').
+# Sketches saved in these folders (reports of earlier runs) are merged into the sketches of this run.
+QUANTILE_SKETCH_MERGE_FOLDERS = []
+HISTOGRAM_DECIMALS = 3  # decimals of the rounded deltas (DELTA_ROUNDING), bin = rint(delta * 10 ** decimals)
 
 # Constants
 FUNCTIONALITY = 'CAL'
 SPI_CYCLE_TIME = 0.110  # sec
+# Alignment of the log streams to the master timeline (df_loader.align_streams)
+ALIGN_DIRECTION = 'auto'  # 'auto' (by first/last timestamps, as merge_df), 'backward', 'forward' or 'nearest'
+ALIGN_TOLERANCE = None  # max timestamp distance of an aligned row in sec (None = no limit)
 DFROW_GT_ID = 'GT_ID'  # Signal name that holds the GT ID in log
 DFROW_LOG_FILE = 'LogName'
 DFROW_TIMESTAMP = 'timestamp'
@@ -85,6 +127,24 @@ DFROW_D_HEIGHT = 'Delta Height'
 DFROW_PITCH_DEG = 'Pitch deg'
 DFROW_YAW_DEG = 'Yaw deg'
 DFROW_ROLL_DEG = 'Roll deg'
+# Derived calibration columns added by df_loader.put_deltas_into_master_df, in column order
+# (column, kind, signal, gt column), kinds: 'delta_deg' = abs(signal - gt) in degrees,
+# 'delta_percent' = abs(signal - gt) / gt * 100, 'deg' = signal in degrees (no gt column)
+DELTA_COLUMNS = [(DFROW_D_PITCH, 'delta_deg', SIG_CLB_C2W_PITCH, DFROW_GT_PITCH),
+                 (DFROW_D_YAW, 'delta_deg', SIG_CLB_C2W_YAW, DFROW_GT_YAW),
+                 (DFROW_D_ROLL, 'delta_deg', SIG_CLB_C2W_ROLL, DFROW_GT_ROLL),
+                 (DFROW_D_HEIGHT, 'delta_percent', SIG_CLB_C2W_CAM_HEIGHT, DFROW_GT_HEIGHT),
+                 (DFROW_PITCH_DEG, 'deg', SIG_CLB_C2W_PITCH, None),
+                 (DFROW_YAW_DEG, 'deg', SIG_CLB_C2W_YAW, None),
+                 (DFROW_ROLL_DEG, 'deg', SIG_CLB_C2W_ROLL, None),
+                 (DFROW_GT_PITCH_DEG, 'deg', DFROW_GT_PITCH, None),
+                 (DFROW_GT_YAW_DEG, 'deg', DFROW_GT_YAW, None),
+                 (DFROW_GT_ROLL_DEG, 'deg', DFROW_GT_ROLL, None)]
+# Rounding steps after the derived columns, in order: (column converted to float, decimals)
+# each step rounds all float columns of the dataframe (as df.astype({column: float}).round(decimals))
+DELTA_ROUNDING = [(DFROW_D_PITCH, 3), (DFROW_D_YAW, 3), (DFROW_D_ROLL, 3), (DFROW_D_HEIGHT, 3),
+                  (DFROW_PITCH_DEG, 3), (DFROW_YAW_DEG, 3), (DFROW_ROLL_DEG, 3),
+                  (DFROW_GT_PITCH, 3), (DFROW_GT_YAW, 3), (DFROW_GT_ROLL, 6)]
 DFROW_SUSPENSION = 'Suspension'
 VAL_SUSP_ANY = 'any'
 VAL_SUSP_DEFAULT = 'default'
@@ -113,6 +173,19 @@ VAL_VALID = 1
 VAL_INVALID = 0
 # GT_ROLL_GROUND_RAD = 0.00635  # ground slope correction: 1.2cm difference on either side of car (car width 1890cm)
 
+# required columns for measurement data (drive scenario, number of clips, distance and time driven)
+MEASUREMENT_DATA_INFO = [DFROW_LOG_FILE, DFROW_GT_ID, DFROW_BR_PITCH, DFROW_BR_YAW, DFROW_BR_ROLL, DFROW_SUSPENSION,
+                         DFROW_ROAD, DFROW_WEATHER, DFROW_DAYTIME, DFROW_TIMESTAMP, DFROW_DISTANCE]
+
+# dtype schema of measurement dataframes (used if MEASUREMENT_DF_COMPACT)
+# categorical columns (condition and prelabel columns, same value on many rows)
+MEASUREMENT_DF_CATEGORY_COLUMNS = [DFROW_LOG_FILE, DFROW_VEHICLE, DFROW_BR_PITCH, DFROW_BR_YAW, DFROW_BR_ROLL,
+                                   DFROW_SUSPENSION, DFROW_ROAD, DFROW_WEATHER, DFROW_DAYTIME]
+# smallest integer type, if the column has only integer values and no nan
+MEASUREMENT_DF_INT_COLUMNS = [DFROW_GT_ID, SIG_CLB_C2W_STATE, SIG_CLB_C2W_STATE_DEGRADE_CAUSE]
+# float32 columns (if MEASUREMENT_DF_FLOAT32)
+MEASUREMENT_DF_FLOAT32_COLUMNS = [SIG_CLB_C2W_PITCH, SIG_CLB_C2W_YAW, SIG_CLB_C2W_ROLL, SIG_CLB_C2W_CAM_HEIGHT]
+
 # required columns for 'Accuracy' sheet
 ACCURACY_INFO = [DFROW_LOG_FILE, DFROW_GT_ID,
                  DFROW_BR_PITCH, DFROW_BR_YAW, DFROW_BR_ROLL, DFROW_SUSPENSION,
@@ -124,6 +197,11 @@ ACCURACY_INFO = [DFROW_LOG_FILE, DFROW_GT_ID,
 
 # signal parameters for accuracy
 S_PARAMS_ACC = {DFROW_D_YAW: 'Yaw ', DFROW_D_PITCH: 'Pitch ', DFROW_D_ROLL: 'Roll ', DFROW_D_HEIGHT: 'Height '}
+# accuracy pass thresholds (failed frames)
+ACCURACY_PASS_THRESHOLDS = {DFROW_D_PITCH: 0.3, DFROW_D_YAW: 0.3, DFROW_D_ROLL: 0.5, DFROW_D_HEIGHT: 0.06}
+# condition columns of the accuracy and velocity sketches and of the accuracy histogram (ACCURACY_AGGREGATION)
+SKETCH_CONDITION_COLUMNS = [DFROW_GT_ID, DFROW_BR_PITCH, DFROW_BR_YAW, DFROW_BR_ROLL, DFROW_SUSPENSION, DFROW_ROAD,
+                            DFROW_WEATHER, DFROW_DAYTIME]
 
 # required columns for 'Time to AF' and 'Distance to AF' sheets
 TIME_DIST_INFO = [DFROW_LOG_FILE, DFROW_GT_ID, DFROW_BR_PITCH, DFROW_BR_YAW, DFROW_BR_ROLL, DFROW_SUSPENSION,
@@ -225,6 +303,110 @@ CARIAD_CONFIG = (
     (VAL_ROAD_ANY, VAL_WEATHER_RAIN, VAL_DAYTIME_NIGHT, VAL_SUSP_HIGH)
 )
 
+# Conditions of the kpi sequence sheets (name, road, daytime, weather), 'any' = not filtered
+# daytime of the City/Highway/Rural Day Rain conditions: night for CARIAD, day for ADCAM
+VAL_DAYTIME_RAIN_COND = 'rain condition daytime'
+# Full data, DS 1-7 of the CAL KPI report (KpiSequence.calc_all_cond)
+KPI_ALL_CONDITIONS = (
+    ('Full data', VAL_ROAD_ANY, VAL_DAYTIME_ANY, VAL_WEATHER_ANY),
+    ('Day', VAL_ROAD_ANY, VAL_DAYTIME_DAY, VAL_WEATHER_ANY),
+    ('Night', VAL_ROAD_ANY, VAL_DAYTIME_NIGHT, VAL_WEATHER_ANY),
+    ('City', VAL_ROAD_CITY, VAL_DAYTIME_ANY, VAL_WEATHER_ANY),
+    ('Highway', VAL_ROAD_HIGHWAY, VAL_DAYTIME_ANY, VAL_WEATHER_ANY),
+    ('Rural', VAL_ROAD_RURAL, VAL_DAYTIME_ANY, VAL_WEATHER_ANY),
+    ('Clear', VAL_ROAD_ANY, VAL_DAYTIME_ANY, VAL_WEATHER_CLEAR),
+    ('Rain', VAL_ROAD_ANY, VAL_DAYTIME_ANY, VAL_WEATHER_RAIN),
+    ('Snow', VAL_ROAD_ANY, VAL_DAYTIME_ANY, VAL_WEATHER_SNOW),
+    ('Fog', VAL_ROAD_ANY, VAL_DAYTIME_ANY, VAL_WEATHER_FOG),
+    ('CityDayClear', VAL_ROAD_CITY, VAL_DAYTIME_DAY, VAL_WEATHER_CLEAR),
+    ('HighwayDayClear', VAL_ROAD_HIGHWAY, VAL_DAYTIME_DAY, VAL_WEATHER_CLEAR),
+    ('RuralDayClear', VAL_ROAD_RURAL, VAL_DAYTIME_DAY, VAL_WEATHER_CLEAR),
+    ('CityNightClear', VAL_ROAD_CITY, VAL_DAYTIME_NIGHT, VAL_WEATHER_CLEAR),
+    ('HighwayNightClear', VAL_ROAD_HIGHWAY, VAL_DAYTIME_NIGHT, VAL_WEATHER_CLEAR),
+    ('RuralNightClear', VAL_ROAD_RURAL, VAL_DAYTIME_NIGHT, VAL_WEATHER_CLEAR),
+    ('CityDayRain', VAL_ROAD_CITY, VAL_DAYTIME_RAIN_COND, VAL_WEATHER_RAIN),
+    ('HighwayDayRain', VAL_ROAD_HIGHWAY, VAL_DAYTIME_RAIN_COND, VAL_WEATHER_RAIN),
+    ('RuralDayRain', VAL_ROAD_RURAL, VAL_DAYTIME_RAIN_COND, VAL_WEATHER_RAIN),
+    ('CityDaySnow', VAL_ROAD_CITY, VAL_DAYTIME_DAY, VAL_WEATHER_SNOW),
+    ('HighwayDaySnow', VAL_ROAD_HIGHWAY, VAL_DAYTIME_DAY, VAL_WEATHER_SNOW),
+    ('RuralDaySnow', VAL_ROAD_RURAL, VAL_DAYTIME_DAY, VAL_WEATHER_SNOW),
+    ('CityDayFog', VAL_ROAD_CITY, VAL_DAYTIME_DAY, VAL_WEATHER_FOG),
+    ('HighwayDayFog', VAL_ROAD_HIGHWAY, VAL_DAYTIME_DAY, VAL_WEATHER_FOG),
+    ('RuralDayFog', VAL_ROAD_RURAL, VAL_DAYTIME_DAY, VAL_WEATHER_FOG)
+)
+# Full data and road types, DS 8-last of the CAL KPI report (KpiSequence.calc_road_cond)
+KPI_ROAD_CONDITIONS = (
+    ('Full data', VAL_ROAD_ANY, VAL_DAYTIME_ANY, VAL_WEATHER_ANY),
+    ('City', VAL_ROAD_CITY, VAL_DAYTIME_ANY, VAL_WEATHER_ANY),
+    ('Highway', VAL_ROAD_HIGHWAY, VAL_DAYTIME_ANY, VAL_WEATHER_ANY),
+    ('Rural', VAL_ROAD_RURAL, VAL_DAYTIME_ANY, VAL_WEATHER_ANY)
+)
+
+# Drive scenario (DS) tables, defined in document BMW ADCAM Mid-ECU-10031411-UCC-015000-CAL-Use_Case_Catalog
+# Measurement is labeled with DS of the first row that matches its first frame (None = any value), DS 0 = no match
+DS_TABLE_COLUMNS = [DFROW_BR_PITCH, DFROW_BR_YAW, DFROW_BR_ROLL, DFROW_SUSPENSION, DFROW_ROAD, DFROW_WEATHER, DFROW_DAYTIME]
+# HEADER sheet has at least rows DS-0 ... DS-30 (layout read by the VBA macro), DS without a table row are 0
+NUM_OF_DS_SLOTS = 31
+# (DS, pitch, yaw, roll, suspension, road, weather, daytime)
+ADCAM_DS_TABLE = (
+    (1, 0, 0, 0, VAL_SUSP_DEFAULT, VAL_ROAD_HIGHWAY, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (2, 0, 0, 0, VAL_SUSP_DEFAULT, VAL_ROAD_RURAL, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (3, 0, 0, 0, VAL_SUSP_DEFAULT, VAL_ROAD_CITY, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (4, 0, 0, 0, VAL_SUSP_DEFAULT, None, VAL_WEATHER_CLEAR, VAL_DAYTIME_NIGHT),
+    (5, 0, 0, 0, VAL_SUSP_DEFAULT, None, VAL_WEATHER_RAIN, VAL_DAYTIME_DAY),
+    (6, 0, 0, 0, VAL_SUSP_DEFAULT, None, VAL_WEATHER_SNOW, VAL_DAYTIME_DAY),
+    (7, 0, 0, 0, VAL_SUSP_DEFAULT, None, VAL_WEATHER_FOG, VAL_DAYTIME_DAY),
+    (8, 0, 0, 0, VAL_SUSP_HIGH, None, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (9, 0, 0, 0, VAL_SUSP_LOW, None, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (10, 0, 0, 0, VAL_SUSP_VARYING, None, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (11, 3.5, 0, 0, None, None, None, None),
+    (12, 2.5, 0, 0, None, None, None, None),
+    (13, -2.5, 0, 0, None, None, None, None),
+    (14, -3.5, 0, 0, None, None, None, None),
+    (15, 0, 3.5, 0, None, None, None, None),
+    (16, 0, 2.5, 0, None, None, None, None),
+    (17, 0, -2.5, 0, None, None, None, None),
+    (18, 0, -3.5, 0, None, None, None, None),
+    (19, 0, 0, 3.5, None, None, None, None),
+    (20, 0, 0, 2.5, None, None, None, None),
+    (21, 0, 0, -2.5, None, None, None, None),
+    (22, 0, 0, -3.5, None, None, None, None),
+    (23, 3.5, 3.5, 3.5, None, None, None, None),
+    (24, -3.5, -3.5, -3.5, None, None, None, None),
+    (25, 4, 0, 0, None, None, None, None),
+    (26, -4, 0, 0, None, None, None, None),
+    (27, 0, 4, 0, None, None, None, None),
+    (28, 0, -4, 0, None, None, None, None),
+    (29, 5, 0, 0, None, None, None, None),
+    (30, -5, 0, 0, None, None, None, None)
+)
+CARIAD_DS_TABLE = (
+    (1, None, None, None, VAL_SUSP_LOW, VAL_ROAD_HIGHWAY, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (2, None, None, None, VAL_SUSP_LOW, VAL_ROAD_RURAL, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (3, None, None, None, VAL_SUSP_LOW, VAL_ROAD_CITY, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (4, None, None, None, VAL_SUSP_LOW, VAL_ROAD_HIGHWAY, VAL_WEATHER_CLEAR, VAL_DAYTIME_NIGHT),
+    (5, None, None, None, VAL_SUSP_LOW, VAL_ROAD_RURAL, VAL_WEATHER_CLEAR, VAL_DAYTIME_NIGHT),
+    (6, None, None, None, VAL_SUSP_LOW, VAL_ROAD_CITY, VAL_WEATHER_CLEAR, VAL_DAYTIME_NIGHT),
+    (7, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_HIGHWAY, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (8, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_RURAL, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (9, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_CITY, VAL_WEATHER_CLEAR, VAL_DAYTIME_DAY),
+    (10, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_HIGHWAY, VAL_WEATHER_CLEAR, VAL_DAYTIME_NIGHT),
+    (11, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_RURAL, VAL_WEATHER_CLEAR, VAL_DAYTIME_NIGHT),
+    (12, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_CITY, VAL_WEATHER_CLEAR, VAL_DAYTIME_NIGHT),
+    (13, None, None, None, VAL_SUSP_LOW, VAL_ROAD_HIGHWAY, VAL_WEATHER_RAIN, VAL_DAYTIME_DAY),
+    (14, None, None, None, VAL_SUSP_LOW, VAL_ROAD_RURAL, VAL_WEATHER_RAIN, VAL_DAYTIME_DAY),
+    (15, None, None, None, VAL_SUSP_LOW, VAL_ROAD_CITY, VAL_WEATHER_RAIN, VAL_DAYTIME_DAY),
+    (16, None, None, None, VAL_SUSP_LOW, VAL_ROAD_HIGHWAY, VAL_WEATHER_RAIN, VAL_DAYTIME_NIGHT),
+    (17, None, None, None, VAL_SUSP_LOW, VAL_ROAD_RURAL, VAL_WEATHER_RAIN, VAL_DAYTIME_NIGHT),
+    (18, None, None, None, VAL_SUSP_LOW, VAL_ROAD_CITY, VAL_WEATHER_RAIN, VAL_DAYTIME_NIGHT),
+    (19, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_HIGHWAY, VAL_WEATHER_RAIN, VAL_DAYTIME_DAY),
+    (20, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_RURAL, VAL_WEATHER_RAIN, VAL_DAYTIME_DAY),
+    (21, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_CITY, VAL_WEATHER_RAIN, VAL_DAYTIME_DAY),
+    (22, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_HIGHWAY, VAL_WEATHER_RAIN, VAL_DAYTIME_NIGHT),
+    (23, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_RURAL, VAL_WEATHER_RAIN, VAL_DAYTIME_NIGHT),
+    (24, None, None, None, VAL_SUSP_HIGH, VAL_ROAD_CITY, VAL_WEATHER_RAIN, VAL_DAYTIME_NIGHT)
+)
+
 # dataframe columns for ground truth from highway data
 GT_HW_POSE_INFO = [DFROW_GT_ID, DFROW_GT_PITCH, DFROW_GT_YAW, DFROW_GT_ROLL, DFROW_GT_HEIGHT, DFROW_GT_PITCH_DEG, DFROW_GT_YAW_DEG, DFROW_GT_ROLL_DEG]
 # map delta names to signal columns
@@ -7,10 +7,31 @@ CALIBRATION
 """
 import const
 import logging
+import numpy as np
+import pandas as pd
 
 logger = logging.getLogger(__name__)
 
 
+def get_rows_eq_val(series, value):
+    """
+    :param series: dataframe column
+    :param value: value to compare with
+    :return: boolean array, True where series == value
+    Categorical columns (constant condition columns of measurement dataframes) are compared by their codes,
+    the column values are not expanded
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        try:
+            code = series.cat.categories.get_loc(value)
+        except (KeyError, TypeError, pd.errors.InvalidIndexError):
+            return np.zeros(series.shape[0], dtype=bool)
+        if not isinstance(code, (int, np.integer)):
+            return np.zeros(series.shape[0], dtype=bool)
+        return series.cat.codes.to_numpy() == code
+    return (series == value).to_numpy()
+
+
 def copy_rows__col_eq_val_df(dataframe, col_name, param_value):
     """
     :param dataframe: Dataframe
@@ -23,7 +44,7 @@ def copy_rows__col_eq_val_df(dataframe, col_name, param_value):
     try:
         # df = dataframe.where(dataframe[calib_param] == param_value)  #  leaves not matched rows empty
         logger.debug(f'getting data where {col_name} = {param_value}')
-        df = dataframe[dataframe[col_name] == param_value]
+        df = dataframe[get_rows_eq_val(dataframe[col_name], param_value)]
     except KeyError as e:
         logger.exception(e)
         raise e
@@ -48,10 +69,10 @@ def copy_rows__bracket_df(dataframe, pitch_value, yaw_value, roll_value, suspens
     """
     try:
         logger.debug(f'getting bracket ({pitch_value}, {yaw_value}, {roll_value}, {suspension_value})')
-        df = dataframe[(dataframe[const.DFROW_BR_PITCH] == pitch_value) &
-                       (dataframe[const.DFROW_BR_YAW] == yaw_value) &
-                       (dataframe[const.DFROW_BR_ROLL] == roll_value) &
-                       (dataframe[const.DFROW_SUSPENSION] == suspension_value)]
+        df = dataframe[get_rows_eq_val(dataframe[const.DFROW_BR_PITCH], pitch_value) &
+                       get_rows_eq_val(dataframe[const.DFROW_BR_YAW], yaw_value) &
+                       get_rows_eq_val(dataframe[const.DFROW_BR_ROLL], roll_value) &
+                       get_rows_eq_val(dataframe[const.DFROW_SUSPENSION], suspension_value)]
     except KeyError as e:
         logger.exception(e)
         raise e
@@ -72,15 +93,20 @@ def copy_rows__cariad_ds_df(dataframe, road, weather, daytime, suspension):
     """
     try:
         logger.debug(f'getting df ({road}, {weather}, {daytime}, {suspension})')
-        df = dataframe  # .copy()
+        rows = np.ones(dataframe.shape[0], dtype=bool)
         if road != const.VAL_ROAD_ANY:
-            df = df[(dataframe[const.DFROW_ROAD] == road)]
+            rows &= get_rows_eq_val(dataframe[const.DFROW_ROAD], road)
         if weather != const.VAL_WEATHER_ANY:
-            df = df[(dataframe[const.DFROW_WEATHER] == weather)]
+            rows &= get_rows_eq_val(dataframe[const.DFROW_WEATHER], weather)
         if daytime != const.VAL_DAYTIME_ANY:
-            df = df[(dataframe[const.DFROW_DAYTIME] == daytime)]
+            rows &= get_rows_eq_val(dataframe[const.DFROW_DAYTIME], daytime)
         if suspension != const.VAL_SUSP_ANY:
-            df = df[(dataframe[const.DFROW_SUSPENSION] == suspension)]
+            rows &= get_rows_eq_val(dataframe[const.DFROW_SUSPENSION], suspension)
+        if road != const.VAL_ROAD_ANY or weather != const.VAL_WEATHER_ANY or daytime != const.VAL_DAYTIME_ANY or \
+                suspension != const.VAL_SUSP_ANY:
+            df = dataframe[rows]
+        else:
+            df = dataframe  # .copy()
     except KeyError as e:
         logger.exception(e)
         raise e
@@ -11,16 +11,23 @@ import const
 import xlrd
 import logging
 import math
+import numpy as np
+import os
+import serializer
 
 logger = logging.getLogger(__name__)
 
+# GT data of the last read workbook in this process {'key': (path, mtime, size), 'df': gt_data_df}
+gt_data_cache = {}
 
-def load_df(data_dict, gt_data_df):
+
+def load_df(data_dict, gt_data_df, gt_lookup=None):
     """
     Function calls functions that take the nested dictionary defined for the calibration function and transforms
     it into a dataframe
     :param data_dict: master dictionary
     :param gt_data_df: dataframe containing gt data
+    :param gt_lookup: gt_data_df compiled by compile_gt_data (None = merge gt_data_df)
     :return: dataframe
     """
     try:
@@ -28,7 +35,7 @@ def load_df(data_dict, gt_data_df):
     except KeyError as e:
         raise e
     else:
-        df = put_gt_data_into_master_df(df, gt_data_df)
+        df = put_gt_data_into_master_df(df, gt_data_df, gt_lookup)
         df = put_deltas_into_master_df(df)
         return df
 
@@ -73,8 +80,9 @@ def merge_df(master_df, slave_df):
         elif master_df.shape[0] > slave_df.shape[0] == 1 and const.DFROW_GT_ID in slave_df:
             # get number of rows of master
             df_size = master_df.shape[0]
-            # fill slave with values from first row
+            # fill slave with values from first row (constant columns as categoricals, only their codes are repeated)
             try:
+                slave_df = categorize_constant_columns(slave_df)
                 slave_df = slave_df.loc[slave_df.index.repeat(df_size)].reset_index(drop=True)
             except Exception as e:
                 logger.error('Error filling slave with values from first row')
@@ -164,41 +172,285 @@ def merge_df(master_df, slave_df):
         raise pderr.MergeError
 
 
+def align_streams(df_list, tolerance=None, direction='auto'):
+    """
+    :param df_list: list of stream dataframes (timestamped streams, one row prelabel streams), in merge order
+    :param tolerance: max timestamp distance of an aligned slave row (None = no limit), rows beyond it get nan
+    :param direction: 'auto' (merge_df first/last timestamp rules), 'backward', 'forward' or 'nearest'
+    :return: dataframe, same as chained merge_df(merge_df(df_list[0], df_list[1]), df_list[2])...
+             None if the streams need merge_df (not default index, not sorted or nan timestamps, ...)
+    Function aligns all streams to the master timeline in one pass. The row order of every stream is kept as an
+    integer index array (-1 = no row), merging two streams only composes these arrays with searchsorted indexing.
+    Each column is copied once at the end, from its stream dataframe to a new array of the master length.
+    """
+    frame = None
+    for df in df_list:
+        if not df.index.equals(pd.RangeIndex(df.shape[0])):
+            return None
+        stream = {'rows': df.shape[0], 'columns': list(df.columns),
+                  'data': {column: (_get_column_values(df[column]), None, False) for column in df.columns}}
+        frame = stream if frame is None else _align_pair(frame, stream, tolerance, direction)
+        if frame is None:
+            return None
+    data = {}
+    for column in frame['columns']:
+        values = _gather_column(*frame['data'][column])
+        if isinstance(values, np.ndarray) and values.dtype == object:
+            # explicit dtype, object columns are not inferred again
+            values = pd.Series(values, dtype=object, copy=False)
+        data[column] = values
+    # data is in column order (columns= would make pandas build an object array of the columns)
+    return pd.DataFrame(data, copy=False)
+
+
+def _get_column_values(series):
+    """
+    :param series: column of a stream dataframe
+    :return: numpy array (extension array for pandas extension dtypes)
+    """
+    if isinstance(series.dtype, np.dtype):
+        return series.to_numpy()
+    return series.array
+
+
+def is_category_column(column, values):
+    """
+    :param column: column name
+    :param values: column array
+    :return: True if the column is kept as categorical from the start (const.MEASUREMENT_DF_CATEGORY_COLUMNS with
+             non numeric values, if const.MEASUREMENT_DF_COMPACT)
+    """
+    return const.MEASUREMENT_DF_COMPACT and column in const.MEASUREMENT_DF_CATEGORY_COLUMNS and \
+        not isinstance(values.dtype, pd.CategoricalDtype) and not pd.api.types.is_numeric_dtype(values.dtype)
+
+
+def to_categorical(values):
+    """
+    :param values: column array
+    :return: categorical of values, categories in order of appearance and with the dtype of values (nan = code -1)
+    """
+    codes, uniques = pd.factorize(values)
+    return pd.Categorical.from_codes(codes, pd.Index(uniques, dtype=uniques.dtype))
+
+
+def categorize_constant_columns(df):
+    """
+    :param df: one row (prelabel) dataframe
+    :return: copy of df, columns of is_category_column as categoricals
+    """
+    df = df.copy()
+    for column in df.columns:
+        values = _get_column_values(df[column])
+        if is_category_column(column, values):
+            df[column] = to_categorical(values)
+    return df
+
+
+def _gather_column(values, indexer, has_missing):
+    """
+    :param values: column array of a stream dataframe
+    :param indexer: rows to take from values (None = all rows, -1 = nan)
+    :param has_missing: True if the column was aligned with missing rows (dtype promoted as in pd.merge_asof)
+    :return: column array
+    """
+    if indexer is None:
+        indexer = np.arange(len(values))
+    if has_missing:
+        # take a missing row too, so the dtype is promoted even if the missing rows were dropped later
+        return pd.api.extensions.take(values, np.append(indexer, -1), allow_fill=True)[:-1]
+    return pd.api.extensions.take(values, indexer, allow_fill=True)
+
+
+def _reindex_columns(data, columns, indexer, has_missing=False):
+    """
+    :param data: column dictionary of a stream frame {column: (values, indexer, has_missing)}
+    :param columns: columns to reindex
+    :param indexer: new rows of the frame as rows of the old frame (-1 = no row)
+    :param has_missing: True if indexer has missing rows
+    :return: None
+    """
+    composed_dict = {}
+    for column in columns:
+        values, old_indexer, old_missing = data[column]
+        # columns of one stream share the indexer, compose it once
+        key = id(old_indexer)
+        if key not in composed_dict:
+            if old_indexer is None:
+                composed = indexer
+            else:
+                composed = old_indexer[indexer]
+                composed[indexer < 0] = -1
+            composed_dict[key] = (old_indexer, composed)
+        data[column] = (values, composed_dict[key][1], old_missing or has_missing)
+
+
+def _fill_nan_columns(frame, rows):
+    """
+    :param frame: stream frame without rows
+    :param rows: number of rows
+    :return: None
+    Function fills the frame with object nans, as pd.DataFrame(index=..., columns=...) in merge_df
+    """
+    nan_values = np.full(1, np.nan, dtype=object)
+    indexer = np.zeros(rows, dtype=np.intp)
+    frame['data'] = {column: (nan_values, indexer, False) for column in frame['columns']}
+    frame['rows'] = rows
+
+
+def _first_column_value(frame, row):
+    """
+    :param frame: stream frame
+    :param row: row position
+    :return: value of the first column (as master_df.iloc[row, 0])
+    """
+    values, indexer, has_missing = frame['data'][frame['columns'][0]]
+    if indexer is not None:
+        row = indexer[row]
+        if row < 0:
+            return np.nan
+    return values[row]
+
+
+def _get_asof_direction(master, slave):
+    """
+    :param master: stream frame with more rows
+    :param slave: stream frame with less rows
+    :return: direction as chosen by merge_df, None if merge_df raises
+    """
+    try:
+        delta_1st = abs(_first_column_value(master, 0) - _first_column_value(slave, 0))
+        delta_last = abs(_first_column_value(master, -1) - _first_column_value(slave, -1))
+    except TypeError:
+        return None
+    cycle_time = const.SPI_CYCLE_TIME
+    if delta_1st <= cycle_time >= delta_last:
+        return 'nearest'
+    elif delta_1st > cycle_time >= delta_last:
+        return 'backward'
+    elif delta_1st <= cycle_time < delta_last:
+        return 'forward'
+    elif delta_1st < delta_last:
+        return 'forward'
+    elif delta_1st > delta_last:
+        return 'backward'
+    return None
+
+
+def get_asof_indexer(master_ts, slave_ts, direction, tolerance=None):
+    """
+    :param master_ts: sorted master timestamps
+    :param slave_ts: sorted slave timestamps
+    :param direction: 'backward', 'forward' or 'nearest' (ties go backward, as pd.merge_asof)
+    :param tolerance: max timestamp distance (None = no limit)
+    :return: slave row for every master row (-1 = no row)
+    """
+    slave_rows = slave_ts.shape[0]
+    backward = np.searchsorted(slave_ts, master_ts, side='right') - 1
+    forward = np.searchsorted(slave_ts, master_ts, side='left')
+    forward[forward == slave_rows] = -1
+    if direction == 'backward':
+        indexer = backward
+    elif direction == 'forward':
+        indexer = forward
+    else:
+        backward_delta = np.where(backward >= 0, master_ts - slave_ts[backward], np.inf)
+        forward_delta = np.where(forward >= 0, slave_ts[forward] - master_ts, np.inf)
+        indexer = np.where(forward_delta < backward_delta, forward, backward)
+    if tolerance is not None:
+        delta = np.abs(slave_ts[indexer] - master_ts)
+        indexer[(indexer >= 0) & (delta > tolerance)] = -1
+    return indexer
+
+
+def _align_pair(master, slave, tolerance, direction):
+    """
+    :param master: stream frame {'rows': int, 'columns': list, 'data': {column: (values, indexer, has_missing)}}
+    :param slave: stream frame
+    :param tolerance: max timestamp distance (None = no limit)
+    :param direction: 'auto', 'backward', 'forward' or 'nearest'
+    :return: aligned stream frame, same rules as merge_df, None if merge_df is needed
+    """
+    if not master['columns'] or not slave['columns']:
+        return None
+    columns_to_remove = set(master['columns']).intersection(slave['columns'])
+    if master['rows'] > 0 and slave['rows'] == 0:
+        _fill_nan_columns(slave, master['rows'])
+    elif master['rows'] == 0 and slave['rows'] > 0:
+        _fill_nan_columns(master, slave['rows'])
+    elif master['rows'] > slave['rows'] == 1 and const.DFROW_GT_ID in slave['columns']:
+        # constant columns as categoricals, the gather then only fills their codes
+        for column in slave['columns']:
+            values, indexer, has_missing = slave['data'][column]
+            if is_category_column(column, values):
+                slave['data'][column] = (to_categorical(values), indexer, has_missing)
+        _reindex_columns(slave['data'], slave['columns'], np.zeros(master['rows'], dtype=np.intp))
+        slave['rows'] = master['rows']
+    if master['rows'] < slave['rows']:
+        master, slave = slave, master
+
+    if master['rows'] == slave['rows']:
+        columns = master['columns'] + [column for column in slave['columns'] if column not in columns_to_remove]
+        master['data'].update({column: slave['data'][column] for column in slave['columns']
+                               if column not in columns_to_remove})
+        master['columns'] = columns
+        return master
+
+    timestamp = const.DFROW_TIMESTAMP
+    if timestamp not in master['columns'] or timestamp not in slave['columns'] or \
+            set(master['columns']).intersection(slave['columns']) != {timestamp}:
+        return None
+    if direction == 'auto':
+        direction = _get_asof_direction(master, slave)
+        if direction is None:
+            return None
+    master_ts = _gather_column(*master['data'][timestamp])
+    slave_ts = _gather_column(*slave['data'][timestamp])
+    if not isinstance(master_ts, np.ndarray) or not isinstance(slave_ts, np.ndarray) or \
+            master_ts.dtype != slave_ts.dtype or master_ts.dtype.kind not in 'iuf' or \
+            np.isnan(master_ts).any() or np.isnan(slave_ts).any() or (np.diff(slave_ts) < 0).any():
+        return None
+    # master sorted by timestamp (same sort as master_df.sort_values('timestamp'))
+    order = np.argsort(master_ts, kind='quicksort')
+    _reindex_columns(master['data'], master['columns'], order)
+    indexer = get_asof_indexer(master_ts[order], slave_ts, direction, tolerance)
+    slave_columns = [column for column in slave['columns'] if column != timestamp]
+    _reindex_columns(slave['data'], slave_columns, indexer, bool((indexer < 0).any()))
+    master['data'].update({column: slave['data'][column] for column in slave_columns})
+    master['columns'] = master['columns'] + slave_columns
+    return master
+
+
 def dict_to_full_data_df(master_dict):
     """
     :param master_dict:
     :return: dataframe
-    Function merges dictionaries from log files into one dataframe (master dataframe)
+    Function merges dictionaries from log files into one dataframe (master dataframe).
+    The dataframes are aligned in one pass by align_streams, merge_df is used for streams align_streams can't align.
     """
     try:
         # ----------------------------------------------------------------------------
         # Load dictionaries from master dictionary, put in dataframes, and merge the dataframes
         # ------------------------------------
-        # Load dictionary 'veh_speed_dict' from master dictionary to dataframes
-        veh_speed_dict = pd.DataFrame(master_dict['veh_speed_dict'])
-        # Load dictionary 'cal_c2w_dict' from master dictionary to dataframe
-        cal_c2w_df = pd.DataFrame(master_dict['cal_c2w_dict'])
-        # Merge 'cal_c2w_df' dataframe into master 'full_data_df' dataframe
-        full_data_df = merge_df(veh_speed_dict, cal_c2w_df)
-        # Delete 'cal_c2w_df' reference
-        del cal_c2w_df
-        # ------------------------------------
-        # Load dictionary 'common_counter_dict' from master dictionary to dataframe
-        common_counter_df = pd.DataFrame(master_dict['common_counter_dict'])
-        # Merge 'common_counter_df' dataframe into master 'full_data_df' dataframe
-        full_data_df = merge_df(full_data_df, common_counter_df)
-        # Delete 'common_counter_df' reference
-        del common_counter_df
-        # ------------------------------------
-        # Load dictionary 'prelabel_dict' from master dictionary to dataframe
-        prelabel_df = pd.DataFrame(master_dict['prelabel_dict'])
-        # Merge 'prelabel_df' dataframe into master 'full_data_df' dataframe
-        full_data_df = merge_df(full_data_df, prelabel_df)
-        # Delete 'prelabel_df' reference
-        del prelabel_df
-        # ------------------------------------
+        # Load dictionaries 'veh_speed_dict', 'cal_c2w_dict', 'common_counter_dict' and 'prelabel_dict'
+        # from master dictionary to dataframes (in merge order)
+        df_list = [pd.DataFrame(master_dict['veh_speed_dict']),
+                   pd.DataFrame(master_dict['cal_c2w_dict']),
+                   pd.DataFrame(master_dict['common_counter_dict']),
+                   pd.DataFrame(master_dict['prelabel_dict'])]
         # Delete 'master_dict' reference
         del master_dict
+        # ------------------------------------
+        # Align all dataframes to the master timeline
+        full_data_df = align_streams(df_list, const.ALIGN_TOLERANCE, const.ALIGN_DIRECTION)
+        if full_data_df is None:
+            if const.ALIGN_TOLERANCE is not None or const.ALIGN_DIRECTION != 'auto':
+                logger.warning('dict_to_full_data_df: streams merged by merge_df, alignment policy not applied')
+            # Merge the dataframes one by one into master 'full_data_df' dataframe
+            full_data_df = df_list[0]
+            for slave_df in df_list[1:]:
+                full_data_df = merge_df(full_data_df, slave_df)
+        # Delete dataframe references
+        del df_list
         # ----------------------------------------------------------------------------
         logger.info('dict_to_full_data_df: Converted Dictionaries to Dataframe')
         return full_data_df
@@ -208,76 +460,565 @@ def dict_to_full_data_df(master_dict):
         pass
         # raise e
 
+
 def get_gt_data():
+    """
+    Function returns the GT data dataframe of const.GT_DATA_FILE (see read_gt_data).
+    The parsed dataframe is kept in the process and saved next to the workbook (const.GT_DATA_CACHE_SUFFIX),
+    keyed on workbook path, mtime and size, so the workbook is read again only after it changed.
+    :return: dataframe
+    """
+    path = const.GT_DATA_FOLDER
+    file = const.GT_DATA_FILE
+    stat = os.stat(path + file)
+    key = (os.path.abspath(path + file), stat.st_mtime_ns, stat.st_size)
+    if gt_data_cache.get('key') == key:
+        logger.info('get_gt_data: Got GT Data from process cache')
+        return gt_data_cache['df']
+
+    gt_data_df = None
+    cache_file = file + const.GT_DATA_CACHE_SUFFIX
+    if const.GT_DATA_CACHE_SUFFIX and os.path.isfile(path + cache_file):
+        try:
+            cache = serializer.load_pkl(path, cache_file)
+        except Exception as e:
+            logger.warning(f'get_gt_data: Failed to load GT data cache {cache_file}')
+            logger.exception(e)
+        else:
+            if isinstance(cache, dict) and cache.get('key') == key:
+                gt_data_df = cache['df']
+                logger.info('get_gt_data: Got GT Data from cache')
+
+    if gt_data_df is None:
+        gt_data_df = read_gt_data(path + file)
+        if const.GT_DATA_CACHE_SUFFIX:
+            try:
+                serializer.save_pkl({'key': key, 'df': gt_data_df}, path, cache_file, atomic=True)
+            except Exception as e:
+                logger.warning(f'get_gt_data: Failed to save GT data cache {cache_file}')
+                logger.exception(e)
+    gt_data_cache['key'] = key
+    gt_data_cache['df'] = gt_data_df
+    return gt_data_df
+
+
+def read_gt_data(path_file):
     """
     Function reads an n*m excel sheet, first sheet in workbook. Creates nested dictionary where keys of main dictionary
     are A2 to An. Values of main dictionary are dictionaries where keys are B1 to m1, and
     values are B2 to nm. Example:
     {A2: {B1: B2, C1: C2, D1:  D2}, A3: {B1: B3, C1: C3, D1: D3}, A4: {B1: B4, C1: C4, D1: D4}}
+    The sheet is read column by column.
     Returns dataframe (from converted dictionary)
+    :param path_file: path to workbook
     :return: dataframe
     """
-    path = const.GT_DATA_FOLDER
-    file = const.GT_DATA_FILE
-    workbook = xlrd.open_workbook(path + file)
+    workbook = xlrd.open_workbook(path_file)
     sheet = workbook.sheet_by_index(0)
+    keys = sheet.col_values(0, start_rowx=1)
+    header = sheet.row_values(0, start_colx=1)
+    columns = [sheet.col_values(col, start_rowx=1) for col in range(1, sheet.ncols)]
     gt_data_dict = {}
-    col = 0
-
-    for row in range(1, sheet.nrows):
-        key = sheet.cell(row, col).value
-        gt_event = {}
-        for col in range(1, sheet.ncols):
-            gt_event[sheet.cell(0, col).value] = sheet.cell(row, col).value
-        gt_data_dict[key] = gt_event
-        col = 0
+    rows = zip(*columns) if columns else [()] * len(keys)
+    for key, row in zip(keys, rows):
+        gt_data_dict[key] = dict(zip(header, row))
     logger.info('get_gt_data: Got GT Data')
     return pd.DataFrame(gt_data_dict).T
 
 
-def put_gt_data_into_master_df(full_data_df, gt_data_df):
+def compile_gt_data(gt_data_df, max_size=1000000):
+    """
+    :param gt_data_df: dataframe containing gt data (index = GT ID)
+    :param max_size: max size of the GT ID lookup array
+    :return: dictionary {'offset': smallest GT ID, 'rows': gt_data_df row of each GT ID - offset (-1 = no row),
+             'columns': gt_data_df columns, 'values': {column: column array (categorical for is_category_column)}},
+             None if the GT IDs are not unique integer values (put_gt_data_into_master_df then merges gt_data_df)
+    """
+    try:
+        gt_ids = gt_data_df.index.to_numpy(dtype=float)
+    except (TypeError, ValueError):
+        return None
+    if gt_ids.shape[0] == 0 or not np.isfinite(gt_ids).all() or (gt_ids != np.round(gt_ids)).any() or \
+            not gt_data_df.index.is_unique:
+        return None
+    offset = int(gt_ids.min())
+    size = int(gt_ids.max()) - offset + 1
+    if size > max_size:
+        return None
+    rows = np.full(size, -1, dtype=np.intp)
+    rows[gt_ids.astype(np.int64) - offset] = np.arange(gt_ids.shape[0])
+    values_dict = {}
+    for column in gt_data_df.columns:
+        values = gt_data_df[column].to_numpy()
+        # condition columns are gathered as categorical codes, not as object arrays of the full length
+        values_dict[column] = to_categorical(values) if is_category_column(column, values) else values
+    return {'offset': offset,
+            'rows': rows,
+            'columns': list(gt_data_df.columns),
+            'values': values_dict}
+
+
+def get_gt_rows(gt_id_values, gt_lookup):
+    """
+    :param gt_id_values: GT ID of each row (numpy array)
+    :param gt_lookup: gt data compiled by compile_gt_data
+    :return: gt_data_df row of each GT ID (-1 = GT ID not in gt_data_df)
+    """
+    gt_ids = gt_id_values.astype(float)
+    codes = np.full(gt_ids.shape[0], -1, dtype=np.int64)
+    valid = np.isfinite(gt_ids) & (gt_ids == np.round(gt_ids)) & (np.abs(gt_ids) < 2 ** 62)
+    codes[valid] = gt_ids[valid].astype(np.int64) - gt_lookup['offset']
+    valid &= (codes >= 0) & (codes < gt_lookup['rows'].shape[0])
+    gt_rows = np.full(gt_ids.shape[0], -1, dtype=np.intp)
+    gt_rows[valid] = gt_lookup['rows'][codes[valid]]
+    return gt_rows
+
+
+def put_gt_data_into_master_df(full_data_df, gt_data_df, gt_lookup=None):
     """
     :param full_data_df: dataframe
     :param gt_data_df: dataframe
+    :param gt_lookup: gt_data_df compiled by compile_gt_data (None = merge gt_data_df)
     :return: df: dataframe
     Function merges gt_data_df rows with full_data_df, based on gt_data_df keys
-    that match full_data_df GT_ID column values
+    that match full_data_df GT_ID column values.
+    With gt_lookup, the gt columns are gathered by GT ID and added to full_data_df (no join, full_data_df is
+    changed in place), same result as the merge.
     """
-    df = full_data_df.merge(gt_data_df, how='left', left_on=const.DFROW_GT_ID, right_index=True)
+    gt_id_column = full_data_df[const.DFROW_GT_ID] if const.DFROW_GT_ID in full_data_df else None
+    if gt_lookup is None or gt_id_column is None or gt_id_column.dtype.kind not in 'iuf' or full_data_df.empty or \
+            not full_data_df.index.equals(pd.RangeIndex(full_data_df.shape[0])) or \
+            set(gt_lookup['columns']).intersection(full_data_df.columns):
+        df = full_data_df.merge(gt_data_df, how='left', left_on=const.DFROW_GT_ID, right_index=True)
+        logger.info('put_gt_data_into_master_df: Put GT data into dataframe')
+        return df
+
+    gt_rows = get_gt_rows(gt_id_column.to_numpy(), gt_lookup)
+    for column in gt_lookup['columns']:
+        values = pd.api.extensions.take(gt_lookup['values'][column], gt_rows, allow_fill=True)
+        full_data_df[column] = pd.Series(values, index=full_data_df.index, dtype=values.dtype, copy=False)
     logger.info('put_gt_data_into_master_df: Put GT data into dataframe')
-    return df
+    return full_data_df
 
 
 def put_deltas_into_master_df(df):
     """
     :param df: dataframe
     Function adds columns with delta value for pitch, yaw, roll, height returns the updated Dataframe, converted to degrees
+    Rows without calibration state are dropped. The derived columns are defined by const.DELTA_COLUMNS and computed
+    into new arrays, the rounding steps of const.DELTA_ROUNDING are applied once per column at the end.
     :return: df: dataframe
     """
+    not_null = pd.notnull(df[const.SIG_CLB_C2W_STATE]).to_numpy()
+    if not not_null.any():
+        return df[not_null].copy()
+    index = df.index[not_null]
+    column_dict = {column: _get_column_values(df[column])[not_null] for column in df.columns}
+
+    for column, kind, signal, gt_column in const.DELTA_COLUMNS:
+        operand_list = [column_dict[signal]] if gt_column is None else [column_dict[signal], column_dict[gt_column]]
+        if not all(_is_float_array(values) for values in operand_list):
+            # not only float signals (ex. object gt columns of the gt workbook): pandas column arithmetic
+            operand_list = [pd.Series(values, dtype=values.dtype, copy=False) for values in operand_list]
+        if kind == 'delta_deg':
+            values = abs(operand_list[0] - operand_list[1]) / (math.pi / 180)
+        elif kind == 'delta_percent':
+            values = (abs(operand_list[0] - operand_list[1]) / operand_list[1]) * 100
+        elif kind == 'deg':
+            values = operand_list[0] / (math.pi / 180)
+        else:
+            raise ValueError(f'unknown delta column kind: {kind}')
+        column_dict[column] = values if isinstance(values, np.ndarray) else _get_column_values(values)
 
-    df_af = df[pd.notnull(df[const.SIG_CLB_C2W_STATE])].copy()
-    if df_af.shape[0] > 0:
-        df_af[const.DFROW_D_PITCH] = abs(df_af[const.SIG_CLB_C2W_PITCH] - df_af[const.DFROW_GT_PITCH]) / (math.pi / 180)
-        df_af[const.DFROW_D_YAW] = abs(df_af[const.SIG_CLB_C2W_YAW] - df_af[const.DFROW_GT_YAW]) / (math.pi / 180)
-        df_af[const.DFROW_D_ROLL] = abs(df_af[const.SIG_CLB_C2W_ROLL] - df_af[const.DFROW_GT_ROLL]) / (math.pi / 180)
-        df_af[const.DFROW_D_HEIGHT] = (abs(df_af[const.SIG_CLB_C2W_CAM_HEIGHT] - df_af[const.DFROW_GT_HEIGHT]) / df_af[const.DFROW_GT_HEIGHT]) * 100
-
-        df_af[const.DFROW_PITCH_DEG] = df_af[const.SIG_CLB_C2W_PITCH] / (math.pi / 180)
-        df_af[const.DFROW_YAW_DEG] = df_af[const.SIG_CLB_C2W_YAW] / (math.pi / 180)
-        df_af[const.DFROW_ROLL_DEG] = df_af[const.SIG_CLB_C2W_ROLL] / (math.pi / 180)
-
-        df_af[const.DFROW_GT_PITCH_DEG] = df_af[const.DFROW_GT_PITCH] / (math.pi / 180)
-        df_af[const.DFROW_GT_YAW_DEG] = df_af[const.DFROW_GT_YAW] / (math.pi / 180)
-        df_af[const.DFROW_GT_ROLL_DEG] = df_af[const.DFROW_GT_ROLL] / (math.pi / 180)
-
-        df_af = df_af.astype({const.DFROW_D_PITCH: float}).round(3)
-        df_af = df_af.astype({const.DFROW_D_YAW: float}).round(3)
-        df_af = df_af.astype({const.DFROW_D_ROLL: float}).round(3)
-        df_af = df_af.astype({const.DFROW_D_HEIGHT: float}).round(3)
-        df_af = df_af.astype({const.DFROW_PITCH_DEG: float}).round(3)
-        df_af = df_af.astype({const.DFROW_YAW_DEG: float}).round(3)
-        df_af = df_af.astype({const.DFROW_ROLL_DEG: float}).round(3)
-        df_af = df_af.astype({const.DFROW_GT_PITCH: float}).round(3)
-        df_af = df_af.astype({const.DFROW_GT_YAW: float}).round(3)
-        df_af = df_af.astype({const.DFROW_GT_ROLL: float}).round(6)
+    # rounding: a step converts its column to float and rounds all float columns. Rounding again to the same or
+    # more decimals does not change a value, so only the steps with less decimals than the last one are kept
+    round_dict = {}  # column: list of decimals still to apply
+    last_decimals_dict = {}  # column: decimals of the last rounding step
+    for column, decimals in const.DELTA_ROUNDING:
+        values = column_dict[column]
+        if not isinstance(values, np.ndarray) or values.dtype != np.float64:
+            values = _round_column(values, round_dict.pop(column, []))
+            last_decimals_dict.pop(column, None)
+            column_dict[column] = pd.Series(values, dtype=values.dtype, copy=False).astype(float).to_numpy()
+        for float_column, float_values in column_dict.items():
+            if _is_float_array(float_values) and decimals < last_decimals_dict.get(float_column, np.inf):
+                round_dict.setdefault(float_column, []).append(decimals)
+                last_decimals_dict[float_column] = decimals
+    for column, decimals_list in round_dict.items():
+        column_dict[column] = _round_column(column_dict[column], decimals_list)
+
+    for column, values in column_dict.items():
+        if isinstance(values, np.ndarray) and values.dtype == object:
+            # explicit dtype, object columns are not inferred again
+            column_dict[column] = pd.Series(values, index=index, dtype=object, copy=False)
+    df_af = pd.DataFrame(column_dict, index=index, copy=False)
     return df_af
+
+
+def _is_float_array(values):
+    """
+    :param values: column array
+    :return: True if values is a numpy float array
+    """
+    return isinstance(values, np.ndarray) and values.dtype.kind == 'f'
+
+
+def _round_column(values, decimals_list):
+    """
+    :param values: column array
+    :param decimals_list: decimals of the rounding steps, in order
+    :return: rounded column array (numpy float arrays only)
+    """
+    if not _is_float_array(values):
+        return values
+    for decimals in decimals_list:
+        values = np.round(values, decimals)
+    return values
+
+
+class SplitConcatenator:
+    """
+    Class concatenates the split dataframes of one measurement into one array per column, split by split.
+    Each split is copied into the arrays when it is added, so the caller releases it right away: the splits of
+    a measurement are never all in memory, the peak is the measurement arrays and one split.
+    The arrays are sized from the known rows, or from the average split length and expected_splits, and resized
+    in place when the splits are longer. The dtype of a column is the dtype pd.concat would choose, planned from
+    one row proxies of the splits; an array is converted when a later split changes the dtype.
+    Categorical columns are kept as codes of the union of the split categories, their values are never expanded.
+    Columns with other non numpy dtypes are kept per split and concatenated with pd.concat in get_df.
+    get_df returns the same dataframe as pd.concat(splits, ignore_index=True, sort=True), except that categorical
+    columns stay categorical (same as .astype('category') of the pd.concat column).
+    """
+
+    def __init__(self, expected_splits=None, rows=None):
+        """
+        :param expected_splits: number of splits of the measurement (None = unknown)
+        :param rows: number of rows of the measurement (None = unknown)
+        """
+        self.expected_splits = expected_splits
+        self.split_count = 0
+        self.rows = 0
+        self.capacity = 0
+        self.buffer_dict = {}  # column: array (capacity rows), codes for categorical columns
+        self.filled_dict = {}  # column: rows filled in the array (missing rows are filled with nan later)
+        self.proxy_dict = {}  # column: {kind of split: one row proxy of the column in the split} (dtype plan)
+        self.category_dict = {}  # categorical column: categories of the codes in the array (order of appearance)
+        self.split_categories_dict = {}  # categorical column: list of _get_split_categories series of the splits
+        self.chunk_dict = {}  # column with other dtype: list of one column split dataframes
+        if rows:
+            self.reserve(rows)
+
+    def reserve(self, rows):
+        """
+        :param rows: number of rows the arrays must hold
+        :return: None
+        Method resizes the arrays in place (realloc, without a second copy where the memory can be extended)
+        """
+        if rows <= self.capacity:
+            return
+        if self.expected_splits and self.split_count < self.expected_splits:
+            # average length of the splits so far (and of the split being added) times the number of splits
+            rows = max(rows, int(rows / (self.split_count + 1) * self.expected_splits * 1.05))
+        for buffer in self.buffer_dict.values():
+            buffer.resize(rows, refcheck=False)
+        self.capacity = rows
+
+    def add(self, df):
+        """
+        :param df: split dataframe (next split of the measurement)
+        :return: None
+        Method copies the split into the column arrays, the caller can release df afterwards
+        """
+        start = self.rows
+        end = start + df.shape[0]
+        self.reserve(end)
+        for column in df.columns:
+            series = df[column]
+            if column in self.category_dict or isinstance(series.dtype, pd.CategoricalDtype):
+                self._add_category(column, series, start, end)
+            elif column in self.chunk_dict or not isinstance(series.dtype, np.dtype):
+                self._add_chunk(column, series.to_frame(), start)
+            else:
+                self._add_array(column, series, start, end)
+        for column in set(self.filled_dict).union(self.chunk_dict).difference(df.columns):
+            if column in self.chunk_dict:
+                self._add_chunk(column, pd.DataFrame(index=range(df.shape[0])), start)
+            elif column in self.proxy_dict:
+                # missing rows are filled with nan, the dtype must hold nan
+                self._update_dtype(column, _get_proxy(None, df.shape[0]))
+        self.rows = end
+        self.split_count += 1
+
+    def get_df(self):
+        """
+        :return: measurement dataframe, same as pd.concat(splits, ignore_index=True, sort=True)
+        Method hands the arrays over to the dataframe, the concatenator is empty afterwards
+        """
+        if self.split_count == 0:
+            raise ValueError('No objects to concatenate')
+        columns = sorted(set(self.filled_dict).union(self.chunk_dict))
+        data = {}
+        for column in columns:
+            if column in self.chunk_dict:
+                chunk_list = self.chunk_dict.pop(column)
+                data[column] = pd.concat(chunk_list, ignore_index=True, sort=True)[column]
+                continue
+            self._fill_missing(column, self.rows)
+            buffer = self.buffer_dict.pop(column)
+            buffer.resize(self.rows, refcheck=False)
+            if column in self.category_dict:
+                categories = _get_concat_categories(self.split_categories_dict.pop(column))
+                codes_dtype = _get_codes_dtype(categories)
+                recode = np.append(categories.get_indexer(self.category_dict.pop(column)), -1).astype(codes_dtype)
+                buffer = pd.Categorical.from_codes(recode[buffer], dtype=pd.CategoricalDtype(categories))
+            elif buffer.dtype == object:
+                # explicit dtype, object columns are not inferred again
+                buffer = pd.Series(buffer, dtype=object, copy=False)
+            data[column] = buffer
+        self.__init__()
+        logger.info('SplitConcatenator: Concatenated split dataframes')
+        # data is in column order (columns= would make pandas build an object array of the columns)
+        return pd.DataFrame(data, copy=False)
+
+    def _add_array(self, column, series, start, end):
+        """
+        :param column: column name
+        :param series: numpy dtype column of the split
+        :param start: first row of the split
+        :param end: row after the last row of the split
+        :return: None
+        """
+        if column not in self.filled_dict:
+            self.buffer_dict[column] = np.empty(self.capacity, dtype=series.dtype)
+            self.filled_dict[column] = 0
+            if self.split_count > 0:
+                # earlier splits without the column
+                self._update_dtype(column, _get_proxy(None, start))
+        self._update_dtype(column, _get_proxy(series, series.shape[0]))
+        self._fill_missing(column, start)
+        self.buffer_dict[column][start:end] = series.to_numpy()
+        self.filled_dict[column] = end
+
+    def _update_dtype(self, column, proxy):
+        """
+        :param column: column name
+        :param proxy: one row proxy of the column in the split (see _get_proxy)
+        :return: None
+        Method adds the proxy to the dtype plan of the column, the array is converted if the dtype changed
+        """
+        # splits of the same kind (dtype, without rows, without values, without the column) give the same dtype,
+        # one proxy of each kind is kept
+        if column in proxy.columns:
+            key = (str(proxy[column].dtype), proxy.shape[0] > 0, bool(proxy[column].notnull().any()))
+        else:
+            key = (None, proxy.shape[0] > 0, False)
+        proxy_kind_dict = self.proxy_dict.setdefault(column, {})
+        if key in proxy_kind_dict:
+            return
+        proxy_kind_dict[key] = proxy
+        proxy = pd.concat(list(proxy_kind_dict.values()), ignore_index=True, sort=True)
+        if column not in proxy.columns:
+            # only splits without the column so far
+            return
+        dtype = proxy[column].dtype
+        if dtype != self.buffer_dict[column].dtype:
+            self.buffer_dict[column] = self.buffer_dict[column].astype(dtype)
+
+    def _fill_missing(self, column, row):
+        """
+        :param column: column name
+        :param row: rows of the column array to fill
+        :return: None
+        Method fills rows of splits without the column with nan (-1 codes for categorical columns)
+        """
+        filled = self.filled_dict[column]
+        if filled >= row:
+            return
+        buffer = self.buffer_dict[column]
+        if column in self.category_dict:
+            buffer[filled:row] = -1
+        elif buffer.dtype.kind == 'M':
+            buffer[filled:row] = np.datetime64('NaT')
+        elif buffer.dtype.kind == 'm':
+            buffer[filled:row] = np.timedelta64('NaT')
+        else:
+            buffer[filled:row] = np.nan
+        self.filled_dict[column] = row
+
+    def _add_category(self, column, series, start, end):
+        """
+        :param column: column name
+        :param series: column of the split
+        :param start: first row of the split
+        :param end: row after the last row of the split
+        :return: None
+        """
+        if column not in self.category_dict:
+            values = self._pop_column(column, start)
+            self.category_dict[column] = pd.Index([], dtype=object)
+            self.split_categories_dict[column] = []
+            self.buffer_dict[column] = np.empty(self.capacity, dtype=np.int32)
+            self.filled_dict[column] = 0
+            if values is not None:
+                self._add_category(column, values, 0, start)
+        split_categories = _get_split_categories(series)
+        self.split_categories_dict[column].append(split_categories)
+        categories = self.category_dict[column]
+        new_categories = split_categories[categories.get_indexer(split_categories) < 0]
+        if new_categories.shape[0] > 0:
+            self.category_dict[column] = categories.append(pd.Index(new_categories.to_numpy(dtype=object),
+                                                                    dtype=object))
+        self._fill_missing(column, start)
+        self.buffer_dict[column][start:end] = _get_split_codes(series, self.category_dict[column])
+        self.filled_dict[column] = end
+
+    def _add_chunk(self, column, frame, start):
+        """
+        :param column: column name
+        :param frame: one column dataframe of the split (no columns if the split has no column)
+        :param start: first row of the split
+        :return: None
+        """
+        if column not in self.chunk_dict:
+            values = self._pop_column(column, start)
+            self.chunk_dict[column] = []
+            if values is not None:
+                self._add_chunk(column, values.to_frame(column), 0)
+            elif start > 0:
+                self._add_chunk(column, pd.DataFrame(index=range(start)), 0)
+        # other column, so no chunk is a dataframe without columns (pandas skips those)
+        frame = frame.copy()
+        frame[_get_proxy_column(column)] = 0
+        self.chunk_dict[column].append(frame)
+
+    def _pop_column(self, column, row):
+        """
+        :param column: column name
+        :param row: number of rows of the column
+        :return: series of the column array or chunks (None if the column is new), the array or chunks are removed
+        """
+        if column in self.chunk_dict:
+            return pd.concat(self.chunk_dict.pop(column), ignore_index=True, sort=True)[column]
+        if column not in self.filled_dict:
+            return None
+        self._fill_missing(column, row)
+        values = self.buffer_dict.pop(column)[:row]
+        del self.filled_dict[column]
+        self.proxy_dict.pop(column, None)
+        return pd.Series(values, dtype=values.dtype)
+
+
+def _get_proxy_column(column):
+    """
+    :param column: column name
+    :return: name of the other column of proxies and chunks
+    """
+    return '' if column != '' else '_'
+
+
+def _get_proxy(series, rows):
+    """
+    :param series: column of a split (None = split without the column)
+    :param rows: rows of the split
+    :return: one row proxy of the column (same dtype, empty and all nan splits are kept as such)
+    """
+    if series is None:
+        proxy = pd.DataFrame(index=range(min(rows, 1)))
+    else:
+        not_null = series.notnull().to_numpy()
+        if series.shape[0] == 0 or not not_null.any():
+            proxy = series.iloc[:1].to_frame()
+        else:
+            proxy = series.iloc[[int(not_null.argmax())]].to_frame()
+        proxy = proxy.reset_index(drop=True)
+    # other column, so no proxy is a dataframe without columns (pandas skips those)
+    proxy[_get_proxy_column(series.name if series is not None else None)] = 0
+    return proxy
+
+
+def concat_split_dfs(df_list):
+    """
+    :param df_list: list of split dataframes of one measurement (in split order), emptied by the function
+    :return: measurement dataframe, same as pd.concat(df_list, ignore_index=True, sort=True), except that columns
+             that are categorical in a split stay categorical (see SplitConcatenator)
+    Each split is released (its df_list item set to None) as soon as it is copied
+    """
+    splits = SplitConcatenator(rows=sum(df.shape[0] for df in df_list if df is not None))
+    for idx in range(len(df_list)):
+        if df_list[idx] is not None:
+            splits.add(df_list[idx])
+        # release the split
+        df_list[idx] = None
+    df_list.clear()
+    return splits.get_df()
+
+
+def _get_split_categories(series):
+    """
+    :param series: column of a split dataframe
+    :return: series of the distinct values of the column (without nan) in order of appearance,
+             read from the categories if the column is categorical
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        return pd.Series(series.cat.categories.take(pd.unique(codes[codes >= 0])))
+    return series.dropna().drop_duplicates()
+
+
+def _get_concat_categories(split_categories_list):
+    """
+    :param split_categories_list: list of _get_split_categories series of the splits (in split order)
+    :return: categories of the concatenated column, same as pd.concat(columns).astype('category')
+             (sorted, or in order of appearance if the values can't be sorted)
+    """
+    non_empty_list = [values for values in split_categories_list if values.shape[0] > 0]
+    values = pd.concat(non_empty_list or split_categories_list[:1], ignore_index=True)
+    return values.drop_duplicates().astype('category').cat.categories
+
+
+def _get_codes_dtype(categories):
+    """
+    :param categories: categories of a categorical column
+    :return: smallest integer dtype of the codes (as chosen by pd.Categorical)
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if len(categories) < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _get_split_codes(series, categories):
+    """
+    :param series: column of a split dataframe
+    :param categories: categories of the concatenated column
+    :return: codes of the column values in categories (-1 = nan), categorical columns are recoded without
+             expanding their values
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # code -1 (nan) takes the last item, -1
+        recode = np.append(categories.get_indexer(series.cat.categories), -1)
+        return recode[series.cat.codes.to_numpy()]
+    return categories.get_indexer(series)
+
+
+def compact_dtypes(df):
+    """
+    :param df: measurement dataframe
+    :return: df with compact dtypes (const.MEASUREMENT_DF_CATEGORY_COLUMNS, const.MEASUREMENT_DF_INT_COLUMNS and,
+    if const.MEASUREMENT_DF_FLOAT32, const.MEASUREMENT_DF_FLOAT32_COLUMNS). Values are not changed, except float32.
+    Function changes columns of df in place
+    """
+    for column in const.MEASUREMENT_DF_CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    for column in const.MEASUREMENT_DF_INT_COLUMNS:
+        if column in df.columns and df[column].notnull().all():
+            values = pd.to_numeric(df[column], errors='coerce')
+            if values.notnull().all() and (values == values.round()).all():
+                df[column] = pd.to_numeric(values, downcast='integer')
+    if const.MEASUREMENT_DF_FLOAT32:
+        for column in const.MEASUREMENT_DF_FLOAT32_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].astype('float32')
+    logger.info('compact_dtypes: Changed dataframe dtypes')
+    return df
@@ -11,13 +11,13 @@ import xlwt
 from xlutils.copy import copy
 from file_list import FileList
 import math
+import os
 
 
 class ExcelPrinter:
     """
     Class exports a dictionary of dictionaries, and dataframes to an Excel sheet.
-    Note that the oldest instance should call export_to_excel first, otherwise any other instance's workbooks will be
-    overwritten by the oldest instance's export_to_excel call.
+    The workbook is made by the first export_to_excel call of any instance, later calls add sheets to it.
     """
 
     def __init__(self, path, file_name, sheet_name):
@@ -60,7 +60,8 @@ class ExcelPrinter:
 
         row, col = 0, 0
 
-        if self.file not in self.file_list:
+        # workbook may have been made by another instance after this instance was initialized
+        if self.file not in self.file_list and not os.path.isfile(self.path + self.file):
             wb = xlwt.Workbook()
             ws = wb.add_sheet('HEADER')
             ws.write(row, col, 'CAL KPI Report data')
@@ -147,7 +148,7 @@ class ExcelPrinter:
         d = df.to_dict()
         row, col = 0, 0
 
-        if self.file not in self.file_list:
+        if self.file not in self.file_list and not os.path.isfile(self.path + self.file):
             wb = xlwt.Workbook()
             ws = wb.add_sheet('HEADER')
             ws.write(row, col, 'Sequence Dataframes')
@@ -47,7 +47,8 @@ class FileList:
         else:
             if allfiles:
                 self.logger.info(f'getting *{self.ext} file list from {self.path}')
-                for file in allfiles:
+                # sort, os.listdir order is arbitrary (NTFS lists by name, other file systems do not)
+                for file in sorted(allfiles):
                     if file.endswith(self.ext):
                         self.files.append(file)
                 if not self.files:
@@ -0,0 +1,80 @@
+"""
+Module holds the histogram cube of rounded accuracy deltas (used if const.ACCURACY_AGGREGATION = 'histogram')
+Patryk Leszowski
+APTIV
+ADCAM MID
+CALIBRATION
+"""
+import logging
+import numpy as np
+import pandas
+import const
+
+logger = logging.getLogger(__name__)
+
+
+def get_bins(values, decimals=None):
+    """
+    Function gets the integer bins of values rounded to decimals (bin = rint(value * 10 ** decimals))
+    :param values: array of values
+    :param decimals: number of decimals of the values (default const.HISTOGRAM_DECIMALS)
+    :return: int64 array of bins (values must not be nan)
+    """
+    decimals = const.HISTOGRAM_DECIMALS if decimals is None else decimals
+    return np.rint(values * 10 ** decimals).astype(np.int64)
+
+
+def get_values(bins, decimals=None):
+    """
+    Function gets the values of integer bins (same floats as numpy.round(value, decimals))
+    :param bins: int64 array of bins
+    :param decimals: number of decimals of the values (default const.HISTOGRAM_DECIMALS)
+    :return: float array of values
+    """
+    decimals = const.HISTOGRAM_DECIMALS if decimals is None else decimals
+    return bins / 10 ** decimals
+
+
+def add_df_to_histogram(histogram_dict, dataframe, param):
+    """
+    Function adds the weights of param values to the counts of their (condition, bin) cells
+    Conditions are the values of const.SKETCH_CONDITION_COLUMNS.
+    :param histogram_dict: dictionary {condition values tuple + (bin,): count}
+    :param dataframe: dataframe with condition columns, param and 'weight' columns
+    :param param: dataframe column of rounded values
+    :return: None
+    """
+    columns = const.SKETCH_CONDITION_COLUMNS
+    values = pandas.to_numeric(dataframe[param], errors='coerce').to_numpy(dtype=float)
+    # rows without weight column (roll standard deviation) have no weight
+    if 'weight' in dataframe.columns:
+        weights = dataframe['weight'].to_numpy()
+    else:
+        weights = np.zeros(dataframe.shape[0], dtype=np.int64)
+    used = ~np.isnan(values) & (weights != 0)
+    if not np.any(used):
+        return
+    bins = get_bins(values[used])
+    if not np.array_equal(get_values(bins), values[used]):
+        logger.warning(f'{param} has values with more than {const.HISTOGRAM_DECIMALS} decimals, histogram rounds them')
+    df = dataframe.loc[used, columns].reset_index(drop=True)
+    df['bin'] = bins
+    df['weight'] = weights[used]
+    for cell, count in df.groupby(columns + ['bin'], sort=False, dropna=False, observed=True)['weight'].sum().items():
+        # nan conditions as None (same key in every measurement)
+        cell = tuple(None if pandas.isnull(value) else value for value in cell)
+        histogram_dict[cell] = histogram_dict.get(cell, 0) + count
+
+
+def histogram_to_df(histogram_dict, param):
+    """
+    Function makes a weighed dataframe (one row per condition and bin) from the histogram dictionary
+    The dataframe has the same weighed percentiles, min, max and pass/fail counts as the concatenated weighed deltas.
+    :param histogram_dict: dictionary {condition values tuple + (bin,): count}
+    :param param: name of the values column
+    :return: dataframe with condition columns, param and 'weight' columns
+    """
+    df = pandas.DataFrame(list(histogram_dict.keys()), columns=const.SKETCH_CONDITION_COLUMNS + ['bin'])
+    df[param] = get_values(df['bin'].to_numpy(dtype=np.int64))
+    df['weight'] = np.array(list(histogram_dict.values()), dtype=np.int64)
+    return df.drop(columns=['bin'])
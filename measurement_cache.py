@@ -0,0 +1,124 @@
+"""
+Module manages an in-process cache of measurement dataframes shared by all kpi sequences
+Patryk Leszowski
+APTIV
+ADCAM MID
+CALIBRATION
+"""
+import logging
+import os
+from collections import OrderedDict
+import const
+import serializer
+
+logger = logging.getLogger(__name__)
+
+
+class MeasurementCache:
+    """
+    Class holds measurement dataframes in memory, up to a memory budget.
+    When the budget is exceeded, the least recently used dataframes are evicted.
+    Dataframes are shared between callers, so they must not be changed in place.
+    """
+
+    def __init__(self, size_mb):
+        self.budget = int(size_mb * 1024 * 1024)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.df_dict = OrderedDict()  # key: (path to measurement file, columns), value: (dataframe, size in bytes)
+        self.logger = logging.getLogger(__name__)
+
+    def get(self, path, file, columns=None):
+        """
+        :param path: path to folder with measurement dataframes
+        :param file: measurement file name
+        :param columns: list of columns to load (None = all columns)
+        :return: measurement dataframe
+        Method returns the dataframe from the cache, or loads it from disk and puts it into the cache.
+        Each column projection of a measurement is cached separately.
+        """
+        key = (os.path.join(path, file), tuple(columns) if columns is not None else None)
+        if key in self.df_dict:
+            self.hits += 1
+            self.df_dict.move_to_end(key)
+            return self.df_dict[key][0]
+
+        self.misses += 1
+        df = read_measurement_df(path, file, columns)
+        if self.budget > 0:
+            df_size = int(df.memory_usage(deep=True).sum())
+            if df_size <= self.budget:
+                self.df_dict[key] = (df, df_size)
+                self.size += df_size
+                self.evict()
+            else:
+                self.logger.info(f'{file} ({df_size} bytes) is larger than cache budget, not cached')
+        return df
+
+    def evict(self):
+        """
+        :return: None
+        Method removes least recently used dataframes until the cache fits in the budget
+        """
+        while self.size > self.budget and self.df_dict:
+            key, (df, df_size) = self.df_dict.popitem(last=False)
+            self.size -= df_size
+            self.evictions += 1
+            self.logger.debug(f'evicted {key}')
+
+    def clear(self):
+        """
+        :return: None
+        Method removes all dataframes from the cache (counters are kept)
+        """
+        self.df_dict.clear()
+        self.size = 0
+
+    def stats(self):
+        """
+        :return: dictionary with cache counters
+        """
+        requests = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / requests if requests else 0,
+                'cached': len(self.df_dict),
+                'size_mb': round(self.size / (1024 * 1024), 1),
+                'budget_mb': round(self.budget / (1024 * 1024), 1)}
+
+
+# cache shared by all kpi sequences
+cache = MeasurementCache(const.MEASUREMENT_CACHE_SIZE_MB)
+
+
+def read_measurement_df(path, file, columns=None):
+    """
+    :param path: path to folder with measurement dataframes
+    :param file: measurement file name
+    :param columns: list of columns to load (None = all columns), columns not in the dataframe are skipped
+    :return: measurement dataframe read from disk (const.MEASUREMENT_DF_EXT format)
+    Only npz dataframes are read column by column, pickles are read whole and then projected
+    """
+    if const.MEASUREMENT_DF_EXT == 'npz':
+        return serializer.load_npz_df(path, file, columns)
+    df = serializer.load_pkl(path, file)
+    if columns is not None:
+        df = df[[column for column in df.columns if column in set(columns)]]
+    return df
+
+
+def load_measurement_df(path, file, columns=None, use_cache=True):
+    """
+    :param path: path to folder with measurement dataframes
+    :param file: measurement file name
+    :param columns: list of columns to load (None = all columns)
+    :param use_cache: False to read the dataframe from disk without the cache (it is then freed with the last
+                      reference of the caller)
+    :return: measurement dataframe (shared, do not change in place)
+    """
+    if not use_cache:
+        return read_measurement_df(path, file, columns)
+    return cache.get(path, file, columns)
@@ -0,0 +1,65 @@
+"""
+Module manages a single pass over measurement dataframes for all kpi sequences
+Patryk Leszowski
+APTIV
+ADCAM MID
+CALIBRATION
+"""
+import logging
+import const
+import measurement_cache
+
+
+class MeasurementEngine:
+    """
+    Class loads each measurement dataframe once and passes it to every registered extractor.
+    An extractor is any object with methods add_measurement(file, df) and finalize_measurements().
+    An extractor may declare attribute columns (list of columns it reads, None = all columns),
+    the engine then loads only the union of the declared columns.
+    Extractors get measurements in the order of measurement_pickle_list and must not change df in place.
+    """
+
+    def __init__(self, measurement_pickle_list, measurement_dfs_folder=None):
+        self.measurement_pickle_list = measurement_pickle_list
+        self.measurement_dfs_folder = measurement_dfs_folder
+        self.extractors = []
+        self.logger = logging.getLogger(__name__)
+
+    def register(self, extractor):
+        """
+        :param extractor: object with add_measurement(file, df) and finalize_measurements() methods
+        :return: extractor
+        """
+        self.extractors.append(extractor)
+        return extractor
+
+    def get_columns(self):
+        """
+        :return: union of columns declared by the extractors, in declaration order (None if any extractor needs all)
+        """
+        columns = []
+        for extractor in self.extractors:
+            extractor_columns = getattr(extractor, 'columns', None)
+            if extractor_columns is None:
+                return None
+            columns += [column for column in extractor_columns if column not in columns]
+        return columns
+
+    def run(self):
+        """
+        :return: None
+        Method loads every measurement once, passes it to all extractors, then finalizes the extractors
+        """
+        folder = self.measurement_dfs_folder if self.measurement_dfs_folder else const.MEASUREMENT_DFS_FOLDER
+        columns = self.get_columns()
+        self.logger.info(f'Running {len(self.extractors)} extractors on {len(self.measurement_pickle_list)} measurements')
+        if columns is not None:
+            self.logger.info(f'Loading {len(columns)} columns')
+        for file in self.measurement_pickle_list:
+            # each measurement is read once: not cached, so it is freed before the next one is loaded
+            df = measurement_cache.load_measurement_df(folder, file, columns, use_cache=False)
+            for extractor in self.extractors:
+                extractor.add_measurement(file, df)
+            del df
+        for extractor in self.extractors:
+            extractor.finalize_measurements()
@@ -8,15 +8,29 @@ CALIBRATION
 import logging
 import const
 import sys
+import os
 import pandas
 import numpy as np
 from file_list import FileList
 import df_loader
 from excel_printer import ExcelPrinter
 import re
+import gc
+import time
+import signal
+import threading
+import _thread
 import serializer
 import datetime
-import math
+import calc_functions as cf
+import pickle_to_dict
+import measurement_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+try:
+    import psutil  # optional, resident memory check of the measurement workers
+except ImportError:
+    psutil = None
 
 
 class Measurements:
@@ -33,7 +47,12 @@ class Measurements:
         self.report_file_name = args_dict['report_file_name']
         self.sbV_PackageNumber = args_dict['sw_package_num']
         self.measurement_dfs_folder = args_dict['measurement_folder']
+        self.log_pickle_folder = args_dict.get('log_pickle_folder', const.LOG_PICKLE_FOLDER)
+        self.log_pickle_ext = args_dict.get('log_pickle_ext', const.LOG_PICKLE_EXT)
+        self.save_split_dicts = args_dict.get('save_split_dicts', const.SAVE_SPLIT_DICTS)
         self.measurement_id_list = []
+        self.split_table = None  # parsed split names (made in get_measurement_ids)
+        self.measurement_splits_dict = {}  # key: measurement_id, value: split files ordered by split index
         self.num_of_measurements = 0
         self.dataframe_list = []
         self.nvm_check_failed_dict = {}
@@ -44,38 +63,61 @@ class Measurements:
         self.oor_info_dict = {}
         self.measurement_data_dict = {}
         self.invalid_measurement_list = []
-        self.gt_data_df = df_loader.get_gt_data()
+        self.skipped_measurement_list = []  # measurements not made, because their worker ran out of memory
+        self.workers = args_dict.get('workers', const.WORKERS)
+        self.worker_memory_mb = args_dict.get('worker_memory_mb', const.WORKER_MEMORY_MB)
+        # gt_data_df can be passed in args_dict (process pool workers get it from the parent process)
+        self.gt_data_df = args_dict.get('gt_data_df')
+        if self.gt_data_df is None:
+            self.gt_data_df = df_loader.get_gt_data()
+        self.gt_lookup = df_loader.compile_gt_data(self.gt_data_df)
         self.file_list = FileList(self.path_pickle_dict_folder, self.ext)
+        self.split_file_list = FileList(self.log_pickle_folder, self.log_pickle_ext)
+        # columns read from measurement dataframes (loaded by MeasurementEngine)
+        self.columns = const.MEASUREMENT_DATA_INFO
         self.logger = logging.getLogger(__name__)
         # define lists to store info about each drive scenarios (ds)
-        # number of elements correspond to the number of ds values in static method get_ds_number
-        self.number_of_drives_per_ds = [0] * 31  # TODO range(x) depends on ds in get_ds_number method last elif
-        self.number_of_clips_per_ds = [0] * 31  # TODO range(x) depends on ds in get_ds_number method last elif
-        self.distance_driven_per_ds = [0] * 31  # TODO range(x) depends on ds in get_ds_number method last elif
-        self.time_driven_per_ds = [0] * 31  # TODO range(x) depends on ds in get_ds_number method last elif
+        # at least const.NUM_OF_DS_SLOTS elements (HEADER sheet rows DS-0 ... read by the VBA macro, unused ds are 0),
+        # more if the drive scenario table has larger ds values (ds 0 = invalid)
+        self.ds_table = self.get_ds_table()
+        num_of_ds = max([const.NUM_OF_DS_SLOTS] + [row[0] + 1 for row in self.ds_table])
+        self.number_of_drives_per_ds = [0] * num_of_ds
+        self.number_of_clips_per_ds = [0] * num_of_ds
+        self.distance_driven_per_ds = [0] * num_of_ds
+        self.time_driven_per_ds = [0] * num_of_ds
+        # first frame info (const.DS_TABLE_COLUMNS) and collected data of each measurement, in add_measurement order
+        self.ds_info_list = []
+        self.measurement_info_list = []
 
-    def get_measurement_ids(self):
+    def get_measurement_ids(self, from_splits=False):
         """
+        :param from_splits: if True, get measurement names from split pickles.xz in log_pickle_folder
         :return: None
         self.file_list.files contains a list of all splits ADCAM_VIN_DATE_TIME_XXXX
-        Method gets unique measurement names ADCAM_VIN_DATE_TIME from all split files ADCAM_VIN_DATE_TIME_XXXX
+        Method parses every split name ADCAM_VIN_DATE_TIME_XXXX once into self.split_table and gets unique
+        measurement names ADCAM_VIN_DATE_TIME. Splits of each measurement, ordered by split index, are put into
+        self.measurement_splits_dict
         After method is executed, self.measurement_id_list contains a list of unique measurement names ADCAM_VIN_DATE_TIME
         """
-        ids = []  # IDs list
+        rows = []  # parsed split names
         # get list of log files
-        self.file_list.get_file_list()
-        for file in self.file_list.files:
-            # in file name find 8 digits followed by underscore followed by 6 digits, and group them
-            if const.PROJECT_CONFIG == const.CARIAD:
-                search_file_name = re.search(r'(CDMFK_.+_\d{8}_\d{6})_', file)
-            else:  # const.PROJECT_CONFIG == const.ADCAM:
-                search_file_name = re.search(r'(AD(CAM|MCP)_.+_\d{8}_\d{6})_', file)
-            if search_file_name:
-                # if matched append group to IDs list
-                measurement_id = search_file_name.group(1)
-                ids.append(measurement_id)
+        file_list = self.split_file_list if from_splits else self.file_list
+        file_list.get_file_list()
+        for file in file_list.files:
+            split_name = self.parse_split_name(file)
+            if split_name:
+                rows.append(split_name)
+        self.split_table = pandas.DataFrame(rows, columns=['project', 'vin', 'date', 'time', 'split_index',
+                                                           'measurement_id', 'file'])
+        # order splits by measurement, then by split index (names without split index last, by name)
+        self.split_table['no_index'] = self.split_table['split_index'].isnull()
+        self.split_table = self.split_table.sort_values(['measurement_id', 'no_index', 'split_index', 'file'],
+                                                        kind='mergesort').drop(columns=['no_index'])
+        self.split_table.reset_index(drop=True, inplace=True)
+        self.measurement_splits_dict = {measurement_id: list(files) for measurement_id, files in
+                                        self.split_table.groupby('measurement_id', sort=True)['file']}
         # keep only unique IDs
-        self.measurement_id_list = np.unique(np.array(ids))
+        self.measurement_id_list = np.array(list(self.measurement_splits_dict.keys()), dtype=str)
         self.num_of_measurements = self.measurement_id_list.size
         # report to logger
         if self.num_of_measurements > 0:
@@ -84,45 +126,167 @@ class Measurements:
             self.logger.error(f'No {self.ext} files with ADCAM naming convention found')
             sys.exit(1)
 
+    @staticmethod
+    def parse_split_name(file):
+        """
+        :param file: split file name ADCAM_VIN_DATE_TIME_XXXX
+        :return: dictionary with project, vin, date, time, split_index (None if missing), measurement_id and file,
+        or None if file name does not follow the naming convention of const.PROJECT_CONFIG
+        """
+        # in file name find 8 digits followed by underscore followed by 6 digits, and group them
+        if const.PROJECT_CONFIG == const.CARIAD:
+            search_file_name = re.search(r'((CDMFK)_(.+)_(\d{8})_(\d{6}))_(\d+)?', file)
+        else:  # const.PROJECT_CONFIG == const.ADCAM:
+            search_file_name = re.search(r'((AD(?:CAM|MCP))_(.+)_(\d{8})_(\d{6}))_(\d+)?', file)
+        if not search_file_name:
+            return None
+        measurement_id, project, vin, date, time, split_index = search_file_name.groups()
+        return {'project': project,
+                'vin': vin,
+                'date': date,
+                'time': time,
+                'split_index': int(split_index) if split_index is not None else None,
+                'measurement_id': measurement_id,
+                'file': file}
+
     def get_measurement_data(self):
         """
         :return: None
         Method puts info (type=dictionary) about each measurement into self.measurement_data_dict
+        Measurement summaries are read from the summary files, measurement dataframes are loaded only for
+        measurements without a summary file
         """
         self.logger.info('getting measurement data')
         # self.measurement_id_list contains files, each containing data from one measurement (unique ADCAM_VIN_DATE_TIME)
         for file in self.measurement_id_list:
             # Change to ADCAM name convention
             # file = self.to_adcam_split_name(file)
-            df = serializer.load_pkl(self.measurement_dfs_folder, file)
-            # use static method get_ds_number to get ds number from df
-            ds = self.get_ds_number(df)
-            # increment number of drives (trials) for that ds
-            self.number_of_drives_per_ds[ds] += 1
-            # get number of splits in measurement
-            self.number_of_clips_per_ds[ds] += len(set(df[const.DFROW_LOG_FILE]))
-            # get difference between last and first distance of current ds and add to total of that ds
-            self.distance_driven_per_ds[ds] += df[const.DFROW_DISTANCE].iloc[-1] - df[const.DFROW_DISTANCE].iloc[0]
-            # get difference between last and first timestamp of current ds and add to total of that ds
-            self.time_driven_per_ds[ds] += df[const.DFROW_TIMESTAMP].iloc[-1] - df[const.DFROW_TIMESTAMP].iloc[0]
+            summary = self.load_measurement_summary(file)
+            if summary is None:
+                df = measurement_cache.load_measurement_df(self.measurement_dfs_folder, file, self.columns)
+                summary = self.get_measurement_summary(df)
+            self.add_measurement_summary(file, summary)
+        self.finalize_measurements()
+
+    def get_measurement_data_from_summaries(self):
+        """
+        :return: True if every measurement has a summary file (measurement data is then collected), False otherwise
+        Method is used before a MeasurementEngine run: if it returns False, Measurements must be registered
+        as an extractor of the engine
+        """
+        summary_list = []
+        for file in self.measurement_id_list:
+            summary = self.load_measurement_summary(file)
+            if summary is None:
+                self.logger.info(f'no summary file for {file}, measurement data is collected from dataframes')
+                return False
+            summary_list.append(summary)
+        self.logger.info('getting measurement data from summary files')
+        for file, summary in zip(self.measurement_id_list, summary_list):
+            self.add_measurement_summary(file, summary)
+        self.finalize_measurements()
+        return True
+
+    def load_measurement_summary(self, measurement_id):
+        """
+        :param measurement_id: measurement name ADCAM_VIN_DATE_TIME
+        :return: summary dictionary saved by save_measurement_df, None if there is no summary file
+        """
+        file = measurement_id + const.MEASUREMENT_SUMMARY_SUFFIX
+        if not os.path.isfile(os.path.join(self.measurement_dfs_folder, file)):
+            return None
+        return serializer.load_json(self.measurement_dfs_folder, file)
+
+    @staticmethod
+    def get_measurement_summary(df):
+        """
+        :param df: measurement dataframe
+        :return: dictionary with the measurement data needed by add_measurement_summary (json serializable)
+        """
+        def to_python(value):
+            # numpy scalars to python types
+            return value.item() if isinstance(value, np.generic) else value
+
+        summary = {column: to_python(df.at[0, column]) if column in df.columns else None
+                   for column in const.DS_TABLE_COLUMNS}
+        summary.update({'LogNameStart': df[const.DFROW_LOG_FILE].iloc[0],  # name of first split in df
+                        'LogNameEnd': df[const.DFROW_LOG_FILE].iloc[-1],  # name of last split in df
+                        'clips': len(set(df[const.DFROW_LOG_FILE])),  # number of splits in measurement
+                        'DistanceStart': to_python(df[const.DFROW_DISTANCE].iloc[0]),
+                        'DistanceEnd': to_python(df[const.DFROW_DISTANCE].iloc[-1]),
+                        'TimestampStart': to_python(df[const.DFROW_TIMESTAMP].iloc[0]),
+                        'TimestampEnd': to_python(df[const.DFROW_TIMESTAMP].iloc[-1]),
+                        const.DFROW_GT_ID: int(df.at[0, const.DFROW_GT_ID])})
+        return summary
+
+    def add_measurement(self, file, df):
+        """
+        :param file: measurement file name
+        :param df: measurement dataframe
+        :return: None
+        Method collects info about one measurement, drive scenarios are labeled in finalize_measurements
+        """
+        self.add_measurement_summary(file, self.get_measurement_summary(df))
+
+    def add_measurement_summary(self, file, summary):
+        """
+        :param file: measurement file name
+        :param summary: measurement summary (get_measurement_summary)
+        :return: None
+        Method collects info about one measurement, drive scenarios are labeled in finalize_measurements
+        """
+        self.ds_info_list.append({column: summary[column] for column in const.DS_TABLE_COLUMNS})
+        self.measurement_info_list.append(
+            {'file': file,
+             'clips': summary['clips'],
+             # get difference between last and first distance
+             'distance': summary['DistanceEnd'] - summary['DistanceStart'],
+             # get difference between last and first timestamp
+             'time': summary['TimestampEnd'] - summary['TimestampStart'],
+             'LogNameStart': summary['LogNameStart'],
+             'LogNameEnd': summary['LogNameEnd'],
+             const.DFROW_GT_ID: summary[const.DFROW_GT_ID],  # ground truth ID
+             const.DFROW_ROAD: summary[const.DFROW_ROAD],  # road type
+             const.DFROW_WEATHER: summary[const.DFROW_WEATHER],  # weather
+             const.DFROW_DAYTIME: summary[const.DFROW_DAYTIME],  # time of day
+             'SUSPENSION': summary[const.DFROW_SUSPENSION]})  # suspension
+
+    def finalize_measurements(self):
+        """
+        :return: None
+        Method labels all measurements with drive scenarios, puts info (type=dictionary) about each measurement
+        into self.measurement_data_dict, counts drives, clips, distance and time per ds and reports invalid
+        drive scenarios
+        """
+        ds_array = self.get_ds_numbers(pandas.DataFrame(self.ds_info_list, columns=const.DS_TABLE_COLUMNS),
+                                       self.ds_table)
+        num_of_ds = len(self.number_of_drives_per_ds)
+        # trial = number of the drive within its ds, in measurement order
+        trial_array = pandas.Series(ds_array).groupby(ds_array).cumcount().to_numpy() + 1
+        self.number_of_drives_per_ds = np.bincount(ds_array, minlength=num_of_ds).tolist()
+        self.number_of_clips_per_ds = self.get_sums_per_ds(
+            ds_array, [info['clips'] for info in self.measurement_info_list], num_of_ds)
+        self.distance_driven_per_ds = self.get_sums_per_ds(
+            ds_array, [info['distance'] for info in self.measurement_info_list], num_of_ds)
+        self.time_driven_per_ds = self.get_sums_per_ds(
+            ds_array, [info['time'] for info in self.measurement_info_list], num_of_ds)
+        for info, ds, trial in zip(self.measurement_info_list, ds_array, trial_array):
             # put data into dictionary
-            data_dict = {'LogNameStart': df[const.DFROW_LOG_FILE].iloc[0],  # name of first split in df
-                         'LogNameEnd': df[const.DFROW_LOG_FILE].iloc[-1],  # name of last split in df
+            data_dict = {'LogNameStart': info['LogNameStart'],
+                         'LogNameEnd': info['LogNameEnd'],
                          'sbV_PackageNumber': self.sbV_PackageNumber,  # HIL SW package number
                          'Functionality': const.FUNCTIONALITY,  # functionality name (constant)
-                         'DriveScenario': ds,  # drive scenario number
-                         'Trial': self.number_of_drives_per_ds[ds],  # drive scenario trial
-                         const.DFROW_GT_ID: int(df.at[0, const.DFROW_GT_ID]),  # ground truth ID
-                         const.DFROW_ROAD: df.at[0, const.DFROW_ROAD],  # road type
-                         const.DFROW_WEATHER: df.at[0, const.DFROW_WEATHER],  # weather
-                         const.DFROW_DAYTIME: df.at[0, const.DFROW_DAYTIME],  # time of day
-                         'SUSPENSION': df.at[0, const.DFROW_SUSPENSION]}  # suspension
-
+                         'DriveScenario': int(ds),  # drive scenario number
+                         'Trial': int(trial),  # drive scenario trial
+                         const.DFROW_GT_ID: info[const.DFROW_GT_ID],
+                         const.DFROW_ROAD: info[const.DFROW_ROAD],
+                         const.DFROW_WEATHER: info[const.DFROW_WEATHER],
+                         const.DFROW_DAYTIME: info[const.DFROW_DAYTIME],
+                         'SUSPENSION': info['SUSPENSION']}
             # to self.measurement_data_dict add value data_dict with key
-            self.measurement_data_dict[file] = data_dict
+            self.measurement_data_dict[info['file']] = data_dict
             if ds == 0:  # invalid drive scenarios
-                self.invalid_measurement_list.append(file)
-
+                self.invalid_measurement_list.append(info['file'])
         # report invalid drive scenarios to logger
         if self.number_of_drives_per_ds[0] > 0:
             self.logger.warning(f'found {self.number_of_drives_per_ds[0]} invalid measurements')
@@ -130,6 +294,22 @@ class Measurements:
                 self.logger.warning(f'Measurement {measurement} does not match any DS.')
         self.logger.info('got measurement data')
 
+    @staticmethod
+    def get_sums_per_ds(ds_array, values, num_of_ds):
+        """
+        :param ds_array: drive scenario number of each measurement
+        :param values: value of each measurement (clips, distance or time)
+        :param num_of_ds: number of drive scenario slots
+        :return: list of the sums of values per ds, ds without measurements are int 0 (same as the counters made
+                 in __init__), sums of integer values are int
+        """
+        values = np.asarray(values)
+        sums = np.bincount(ds_array, values, minlength=num_of_ds)
+        if values.dtype.kind in 'iub':
+            return sums.astype(int).tolist()
+        drives = np.bincount(ds_array, minlength=num_of_ds)
+        return [value if count > 0 else 0 for value, count in zip(sums.tolist(), drives)]
+
     def export_ds_collected_data_info(self):
         """
         :return:
@@ -140,7 +320,7 @@ class Measurements:
         milliseconds = 0
         self.logger.info('\tDS\tNum of Drives\tNum of Clips\tDistance Driven [km]\tTime Driven [min]')
         current_row = 2
-        for i in range(31):  # TODO range(x) depends on ds in get_ds_number method last elif
+        for i in range(len(self.number_of_drives_per_ds)):
             key = 'DS-' + str(i)
             data_dict[key] = {}
             drives = self.number_of_drives_per_ds[i]
@@ -234,68 +414,246 @@ class Measurements:
         """
         :return: None
         self.measurement_id_list contains a list of unique measurement names ADCAM_VIN_DATE_TIME
-        self.file_list.files contains a list of all splits ADCAM_VIN_DATE_TIME_XXXX
-        Method takes every split ADCAM_VIN_DATE_TIME_XXXX in self.file_list.files that has the name ADCAM_VIN_DATE_TIME
+        self.measurement_splits_dict contains splits ADCAM_VIN_DATE_TIME_XXXX of each measurement ordered by split index
+        Method takes every split ADCAM_VIN_DATE_TIME_XXXX of the measurement ADCAM_VIN_DATE_TIME
         and concatenates the splits to one dataframe (makes one measurement dataframe of splits from the same drive).
         Does it for each measurement names ADCAM_VIN_DATE_TIME in self.measurement_id_list
         Saves each dataframe to a pickle file
         After method is executed, every dataframe pickle is one measurement (unique ADCAM_VIN_DATE_TIME)
         """
-        for measurement_id in self.measurement_id_list:
-            df_list = []
-            for file in self.file_list.files:
-                if measurement_id in file:
-                    # for each file unpack file to dictionary
-                    if self.ext == 'json':
-                        data_dict = serializer.load_json(self.path_pickle_dict_folder, file)
-                    elif self.ext == 'pkl' or self.ext == 'pickle':
-                        data_dict = serializer.load_pkl(self.path_pickle_dict_folder, file)
-                    else:
-                        self.logger.error(f'ERROR: wrong file extension {file}. Must be json or pkl')
-                        raise FileNotFoundError(f'File extension must be json or pkl')
-                    # Change to ADCAM name convention
-                    measurement_id_temp = self.to_adcam_split_name(measurement_id)
-                    # if data_dict['prelabel_dict']['LogName'] doesn't exist,
-                    # add key ('LogName'), and value (filename without extension)
-                    if measurement_id_temp in self.prelabel_dict.keys():
-                        data_dict['prelabel_dict'][const.DFROW_LOG_FILE] = [file[0:48]]
-                        data_dict['prelabel_dict'][const.DFROW_GT_ID] = [
-                            int(self.prelabel_dict[measurement_id_temp][const.DFROW_GT_ID][0])]
-                        data_dict['prelabel_dict'][const.DFROW_ROAD] = self.prelabel_dict[measurement_id_temp][
-                            const.DFROW_ROAD]
-                        data_dict['prelabel_dict'][const.DFROW_WEATHER] = self.prelabel_dict[measurement_id_temp][
-                            const.DFROW_WEATHER]
-                        data_dict['prelabel_dict'][const.DFROW_DAYTIME] = self.prelabel_dict[measurement_id_temp][
-                            const.DFROW_DAYTIME]
-                        self.logger.info('put prelabels into data_dict')
-                    else:
-                        self.logger.error(f'{measurement_id_temp} not in prelabel_dict')
-                        break
-                    # transform dictionary to dataframe
+        if self.workers > 1 and len(self.measurement_id_list) > 1:
+            self.make_measurement_df_pickles_in_pool()
+        else:
+            for measurement_id in self.measurement_id_list:
+                self.make_measurement_df_pickle(measurement_id)
+
+    def make_measurement_df_pickles_in_pool(self):
+        """
+        :return: None
+        Method makes the measurement dataframe pickles in a pool of self.workers processes, one measurement per task.
+        Workers get gt_data_df and prelabel_dict once, when the worker is started. If self.worker_memory_mb > 0,
+        the memory each measurement adds to its worker is limited to that size (see WorkerMemoryWatchdog).
+        Measurements that were not done, because they ran out of worker memory or a worker died, are made again once,
+        each alone in a new worker. Measurements that fail again are skipped and reported, they are never made
+        without the limit.
+        """
+        self.logger.info(f'making {len(self.measurement_id_list)} measurements with {self.workers} workers')
+        if not self.worker_memory_mb:
+            self.logger.warning('measurement workers have no memory limit (set --worker_memory)')
+        elif psutil is None:
+            self.logger.warning(f'measurement worker memory limit of {self.worker_memory_mb} MB cannot be applied '
+                                f'without psutil, workers have no memory limit')
+        done_list, broken = self.run_measurement_workers(self.measurement_id_list, self.workers)
+        if broken:
+            self.logger.error('measurement worker process died')
+        retry_list = [measurement_id for measurement_id in self.measurement_id_list if measurement_id not in done_list]
+        if retry_list:
+            self.logger.warning(f'making {len(retry_list)} measurements again, each alone in a new worker')
+        self.skipped_measurement_list = []
+        for measurement_id in retry_list:
+            self.run_measurement_workers([measurement_id], 1)
+        if self.skipped_measurement_list:
+            self.logger.error(f'skipped {len(self.skipped_measurement_list)} measurements, out of worker memory '
+                              f'({self.worker_memory_mb} MB) or worker process died')
+            for measurement_id in self.skipped_measurement_list:
+                self.logger.error(f'Measurement {measurement_id} was not made.')
+
+    def run_measurement_workers(self, measurement_ids, workers):
+        """
+        :param measurement_ids: measurement names ADCAM_VIN_DATE_TIME
+        :param workers: number of worker processes
+        :return: list of done measurement names, True if a worker process died
+        Method makes the measurements in a pool of worker processes. Measurements that fail with MemoryError,
+        or that were alone in a pool whose worker died, are added to self.skipped_measurement_list.
+        With a memory limit, each worker makes one measurement and is then replaced by a new worker (Python 3.11+),
+        so the memory a measurement leaves in its worker is given back.
+        """
+        worker_args_dict = {'pkl_dict_folder': self.path_pickle_dict_folder,
+                            'pkl_dict_ext': self.ext,
+                            'prelabel_dict': self.prelabel_dict,
+                            'path_report': self.path_report,
+                            'report_file_name': self.report_file_name,
+                            'sw_package_num': self.sbV_PackageNumber,
+                            'measurement_folder': self.measurement_dfs_folder,
+                            'workers': 1}
+        pool_kwargs = {}
+        if self.worker_memory_mb and sys.version_info >= (3, 11):
+            pool_kwargs['max_tasks_per_child'] = 1
+        done_list = []
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_measurement_worker,
+                                     initargs=(worker_args_dict, self.gt_data_df, self.worker_memory_mb),
+                                     **pool_kwargs) as executor:
+                futures = {measurement_id: executor.submit(make_measurement_df_in_worker, measurement_id,
+                                                           self.measurement_splits_dict[measurement_id])
+                           for measurement_id in measurement_ids}
+                for measurement_id, future in futures.items():
                     try:
-                        if not self.check_data_dict(data_dict, file):
-                            continue
-                        data_frame = df_loader.load_df(data_dict, self.gt_data_df)
-                        # self.logger.info(f'Put {self.ext} file {file} into dataframe')
-                        del data_dict
-                    except KeyError as e:
-                        self.logger.error(f'KeyError in {file}')
-                        self.logger.exception(e)
-                    else:
-                        df_list.append(data_frame)
-                        del data_frame
-            # concatenate the splits to one measurement dataframe
-            try:
-                measurement_df = pandas.concat(df_list, ignore_index=True, sort=True)
+                        done_list.append(future.result())
+                    except MemoryError:
+                        self.logger.error(f'{measurement_id}: out of worker memory')
+                        self.skipped_measurement_list.append(measurement_id)
+        except BrokenProcessPool as e:
+            self.logger.exception(e)
+            if len(measurement_ids) > 1:
+                return done_list, True
+            self.logger.error(f'{measurement_ids[0]}: measurement worker process died')
+            self.skipped_measurement_list.append(measurement_ids[0])
+        return done_list, False
+
+    def make_measurement_df_pickle(self, measurement_id, files=None):
+        """
+        :param measurement_id: measurement name ADCAM_VIN_DATE_TIME
+        :param files: splits of the measurement ordered by split index (default self.measurement_splits_dict)
+        :return: None
+        Method concatenates the split dictionaries of one measurement to a dataframe and saves it
+        """
+        if files is None:
+            files = self.measurement_splits_dict[measurement_id]
+        # each split dataframe is copied into the measurement arrays and released right away
+        splits = df_loader.SplitConcatenator(len(files))
+        for file in files:
+            # for each file unpack file to dictionary
+            if self.ext == 'json':
+                data_dict = serializer.load_json(self.path_pickle_dict_folder, file)
+            elif self.ext == 'pkl' or self.ext == 'pickle':
+                data_dict = serializer.load_pkl(self.path_pickle_dict_folder, file)
+            elif self.ext == 'npz':
+                data_dict = serializer.load_npz(self.path_pickle_dict_folder, file)
+            else:
+                self.logger.error(f'ERROR: wrong file extension {file}. Must be json, pkl or npz')
+                raise FileNotFoundError(f'File extension must be json, pkl or npz')
+            if not self.put_prelabels_into_data_dict(measurement_id, data_dict, file):
+                break
+            data_frame = self.split_dict_to_df(data_dict, file)
+            del data_dict
+            if data_frame is not None:
+                splits.add(data_frame)
+                del data_frame
+        self.save_measurement_df(measurement_id, splits)
+
+    def make_measurement_dfs_from_splits(self):
+        """
+        :return: None
+        Streaming version of make_cal_pickles + make_measurement_df_pickles.
+        self.measurement_id_list must be made with get_measurement_ids(from_splits=True).
+        Method reads the split pickles.xz of one measurement at a time, extracts the calibration dictionaries
+        in memory and saves only the measurement dataframe. Only one raw split and the split dataframes of one
+        measurement are held in memory, each split dataframe is copied into the measurement arrays
+        (df_loader.SplitConcatenator) and released. If self.save_split_dicts, the split calibration dictionaries are also saved
+        to pkl_dict_folder (same files as make_cal_pickles).
+        Driven distance is calculated split by split, continuing from the last row of the previous split.
+        Measurements without prelabels or without any loaded split are logged and not made, the other
+        measurements are made.
+        """
+        for measurement_id in self.measurement_id_list:
+            if self.to_adcam_split_name(measurement_id) not in self.prelabel_dict.keys():
+                self.logger.error(f'{self.to_adcam_split_name(measurement_id)} not in prelabel_dict, '
+                                  f'measurement_df of {measurement_id} not made')
+                continue
+            splits = df_loader.SplitConcatenator(len(self.measurement_splits_dict[measurement_id]))
+            last_row = None  # (distance, timestamp, veh_speed) of last row of previous split
+            for file in self.measurement_splits_dict[measurement_id]:
+                try:
+                    plk = serializer.load_pkl(self.log_pickle_folder, file)
+                except Exception as e:
+                    self.logger.error(f'Cant open: {file}')
+                    self.logger.exception(e)
+                    continue
+                data_dict = pickle_to_dict.get_split_dict(plk, file)
+                del plk
+                if data_dict is None:
+                    continue
+                if self.save_split_dicts:
+                    pickle_to_dict.save_split_dict(data_dict, self.path_pickle_dict_folder, file, self.ext)
+                self.put_prelabels_into_data_dict(measurement_id, data_dict, file)
+                data_frame = self.split_dict_to_df(data_dict, file)
+                del data_dict
+                if data_frame is not None:
+                    last_row = self.get_split_driven_distance(data_frame, last_row)
+                    splits.add(data_frame)
+                    del data_frame
+            if splits.split_count == 0:
+                self.logger.error(f'{measurement_id}: no split dataframes, measurement_df not made')
+                continue
+            self.save_measurement_df(measurement_id, splits, with_distance=True)
+
+    def put_prelabels_into_data_dict(self, measurement_id, data_dict, file):
+        """
+        :param measurement_id: measurement name ADCAM_VIN_DATE_TIME
+        :param data_dict: split calibration dictionary
+        :param file: split file name
+        :return: False if the measurement is not in self.prelabel_dict, True otherwise
+        Method puts LogName and prelabels of the measurement into data_dict['prelabel_dict']
+        """
+        # Change to ADCAM name convention
+        measurement_id_temp = self.to_adcam_split_name(measurement_id)
+        # if data_dict['prelabel_dict']['LogName'] doesn't exist,
+        # add key ('LogName'), and value (filename without extension)
+        if measurement_id_temp in self.prelabel_dict.keys():
+            data_dict['prelabel_dict'][const.DFROW_LOG_FILE] = [self.split_log_name(file)]
+            data_dict['prelabel_dict'][const.DFROW_GT_ID] = [
+                int(self.prelabel_dict[measurement_id_temp][const.DFROW_GT_ID][0])]
+            data_dict['prelabel_dict'][const.DFROW_ROAD] = self.prelabel_dict[measurement_id_temp][
+                const.DFROW_ROAD]
+            data_dict['prelabel_dict'][const.DFROW_WEATHER] = self.prelabel_dict[measurement_id_temp][
+                const.DFROW_WEATHER]
+            data_dict['prelabel_dict'][const.DFROW_DAYTIME] = self.prelabel_dict[measurement_id_temp][
+                const.DFROW_DAYTIME]
+            self.logger.info('put prelabels into data_dict')
+            return True
+        self.logger.error(f'{measurement_id_temp} not in prelabel_dict')
+        return False
+
+    def split_dict_to_df(self, data_dict, file):
+        """
+        :param data_dict: split calibration dictionary with prelabels
+        :param file: split file name
+        :return: split dataframe, None if the split has no data or is broken
+        """
+        # transform dictionary to dataframe
+        try:
+            if not self.check_data_dict(data_dict, file):
+                return None
+            return df_loader.load_df(data_dict, self.gt_data_df, self.gt_lookup)
+        except KeyError as e:
+            self.logger.error(f'KeyError in {file}')
+            self.logger.exception(e)
+            return None
+
+    def save_measurement_df(self, measurement_id, splits, with_distance=False):
+        """
+        :param measurement_id: measurement name ADCAM_VIN_DATE_TIME
+        :param splits: df_loader.SplitConcatenator with the split dataframes of the measurement
+        :param with_distance: True if split dataframes already have driven distance (get_split_driven_distance)
+        :return: None
+        Method concatenates the split dataframes to one measurement dataframe, adds driven distance and saves it
+        """
+        # concatenate the splits to one measurement dataframe
+        try:
+            measurement_df = splits.get_df()
+            if with_distance:
+                # keep distance as last column, same as get_driven_distance
+                measurement_df[const.DFROW_DISTANCE] = measurement_df.pop(const.DFROW_DISTANCE)
+            else:
                 measurement_df = self.get_driven_distance(measurement_df)
-                df_size = sys.getsizeof(measurement_df)
-                # save the dataframe to pickle
+            if const.MEASUREMENT_DF_COMPACT:
+                measurement_df = df_loader.compact_dtypes(measurement_df)
+            df_size = sys.getsizeof(measurement_df)
+            # save the dataframe to pickle or columnar npz
+            if const.MEASUREMENT_DF_EXT == 'npz':
+                serializer.save_npz_df(measurement_df, self.measurement_dfs_folder, measurement_id,
+                                       const.MEASUREMENT_DF_RLE_RATIO)
+            else:
                 serializer.save_pkl(measurement_df, self.measurement_dfs_folder, measurement_id)
-                self.logger.info(f'saved measurement_df, size {df_size}, to file {measurement_id}.pkl')
-            except ValueError as e:
-                self.logger.exception(e)
-                self.logger.error(f'one of the objects is empty')
-                raise e
+            self.logger.info(f'saved measurement_df, size {df_size}, to file {measurement_id}.{const.MEASUREMENT_DF_EXT}')
+            # save the summary used for the HEADER sheet, so it can be made without loading the dataframe
+            serializer.save_json(self.get_measurement_summary(measurement_df), self.measurement_dfs_folder,
+                                 measurement_id + const.MEASUREMENT_SUMMARY_SUFFIX, atomic=True)
+        except ValueError as e:
+            self.logger.exception(e)
+            self.logger.error(f'one of the objects is empty')
+            raise e
 
     def check_data_dict(self, data_dict, file):
         if 'veh_speed_dict' in data_dict:
@@ -307,6 +665,18 @@ class Measurements:
             return False
         return True
 
+    @staticmethod
+    def split_log_name(file):
+        """
+        :param file: split dictionary file name
+        :return: LogName of the split
+        LogName is the first 48 characters of the split file name. For npz split dictionaries the pickle name is
+        used, so the reports are the same as for pickle split dictionaries
+        """
+        if file.endswith('.npz'):
+            file = file[:-len('.npz')] + '.pickle'
+        return file[0:48]
+
     def to_adcam_split_name(self, split_name):
         if const.PROJECT_CONFIG == const.CARIAD:
             search = re.search(r'CDMFK_(\w{17}_\d{8}_\d{6})', split_name)
@@ -335,19 +705,59 @@ class Measurements:
 
     @staticmethod
     def get_driven_distance(df):
+        """
+        :param df: measurement dataframe
+        :return: df with driven distance column
+        """
+        df[const.DFROW_DISTANCE] = cf.calc_driven_distance(df[const.DFROW_TIMESTAMP], df[const.DFROW_VEHICLE_SPEED])
+        return df
 
-        time_stamp = np.array(df[const.DFROW_TIMESTAMP])
-        veh_speed = np.array(df['veh_speed'])
-        distance = [0]
-        last_valid_dist = 0
-        for i in range(1, time_stamp.size):
-            v_mean = (veh_speed[i] + veh_speed[i - 1]) / 2
-            dist = ((time_stamp[i] - time_stamp[i - 1]) * (v_mean / 3600)) + distance[i - 1]
-            if not math.isnan(dist):
-                last_valid_dist = dist
-            distance.append(last_valid_dist)
+    @staticmethod
+    def get_split_driven_distance(df, last_row=None):
+        """
+        :param df: split dataframe
+        :param last_row: (distance, timestamp, veh_speed) of last row of previous split (None for first split)
+        :return: (distance, timestamp, veh_speed) of last row of df
+        Method adds driven distance column to df, continuing from the previous split of the measurement
+        """
+        if last_row is None:
+            distance = cf.calc_driven_distance(df[const.DFROW_TIMESTAMP], df[const.DFROW_VEHICLE_SPEED])
+        else:
+            distance = cf.calc_driven_distance(df[const.DFROW_TIMESTAMP], df[const.DFROW_VEHICLE_SPEED], *last_row)
         df[const.DFROW_DISTANCE] = distance
-        return df
+        if df.shape[0] == 0:
+            return last_row
+        return distance[-1], df[const.DFROW_TIMESTAMP].iloc[-1], df[const.DFROW_VEHICLE_SPEED].iloc[-1]
+
+    @staticmethod
+    def get_ds_table():
+        """
+        :return: drive scenario table of const.PROJECT_CONFIG (const.ADCAM_DS_TABLE or const.CARIAD_DS_TABLE)
+        """
+        if const.PROJECT_CONFIG == const.ADCAM:
+            return const.ADCAM_DS_TABLE
+        if const.PROJECT_CONFIG == const.CARIAD:
+            return const.CARIAD_DS_TABLE
+        return ()
+
+    @staticmethod
+    def get_ds_numbers(ds_info_df, ds_table):
+        """
+        :param ds_info_df: dataframe with columns const.DS_TABLE_COLUMNS, first frame of each measurement
+        :param ds_table: drive scenario table, rows (ds, pitch, yaw, roll, suspension, road, weather, daytime)
+        :return: array of drive scenario numbers, one per row of ds_info_df (0 = no ds matched)
+        Each measurement gets the ds of the first table row where all values (except None) are equal
+        """
+        if ds_info_df.shape[0] == 0 or not ds_table:
+            return np.zeros(ds_info_df.shape[0], dtype=int)
+        condition_list = []
+        for row in ds_table:
+            condition = np.ones(ds_info_df.shape[0], dtype=bool)
+            for column, value in zip(const.DS_TABLE_COLUMNS, row[1:]):
+                if value is not None:
+                    condition &= (ds_info_df[column] == value).to_numpy(dtype=bool)
+            condition_list.append(condition)
+        return np.select(condition_list, [row[0] for row in ds_table], default=0)
 
     @staticmethod
     def get_ds_number(df):
@@ -356,280 +766,112 @@ class Measurements:
         :return: ds: (int) drive scenario number
         (defined in document BMW ADCAM Mid-ECU-10031411-UCC-015000-CAL-Use_Case_Catalog)
         """
-        ds = 0
-        if const.PROJECT_CONFIG == const.ADCAM:
-            if df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0 and \
-                    df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_DEFAULT and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 1
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0 and \
-                    df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_DEFAULT and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_RURAL and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 2
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0 and \
-                    df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_DEFAULT and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_CITY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 3
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0 and \
-                    df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_DEFAULT and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 4
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0 and \
-                    df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_DEFAULT and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 5
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0 and \
-                    df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_DEFAULT and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_SNOW and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 6
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0 and \
-                    df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_DEFAULT and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_FOG and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 7
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0 and \
-                    df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 8
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0 and \
-                    df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 9
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0 and \
-                    df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_VARYING and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 10
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 3.5 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 11
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 2.5 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 12
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == -2.5 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 13
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == -3.5 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 14
-            elif df.at[0, const.DFROW_BR_YAW] == 3.5 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 15
-            elif df.at[0, const.DFROW_BR_YAW] == 2.5 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 16
-            elif df.at[0, const.DFROW_BR_YAW] == -2.5 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 17
-            elif df.at[0, const.DFROW_BR_YAW] == -3.5 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 18
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 3.5:
-                ds = 19
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 2.5:
-                ds = 20
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == -2.5:
-                ds = 21
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == -3.5:
-                ds = 22
-            elif df.at[0, const.DFROW_BR_YAW] == 3.5 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 3.5 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 3.5:
-                ds = 23
-            elif df.at[0, const.DFROW_BR_YAW] == -3.5 and \
-                    df.at[0, const.DFROW_BR_PITCH] == -3.5 and \
-                    df.at[0, const.DFROW_BR_ROLL] == -3.5:
-                ds = 24
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 4 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 25
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == -4 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 26
-            elif df.at[0, const.DFROW_BR_YAW] == 4 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 27
-            elif df.at[0, const.DFROW_BR_YAW] == -4 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 0 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 28
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == 5 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 29
-            elif df.at[0, const.DFROW_BR_YAW] == 0 and \
-                    df.at[0, const.DFROW_BR_PITCH] == -5 and \
-                    df.at[0, const.DFROW_BR_ROLL] == 0:
-                ds = 30
-        if const.PROJECT_CONFIG == const.CARIAD:
-            if df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 1
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_RURAL and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 2
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_CITY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 3
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 4
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_RURAL and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 5
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_CITY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 6
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 7
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_RURAL and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 8
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_CITY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 9
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 10
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_RURAL and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 11
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_CITY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 12
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 13
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_RURAL and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 14
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_CITY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 15
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 16
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_RURAL and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 17
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_LOW and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_CITY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 18
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 19
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_RURAL and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 20
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_CITY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY:
-                ds = 21
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 22
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_RURAL and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 23
-            elif df.at[0, const.DFROW_SUSPENSION] == const.VAL_SUSP_HIGH and \
-                    df.at[0, const.DFROW_ROAD] == const.VAL_ROAD_CITY and \
-                    df.at[0, const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN and \
-                    df.at[0, const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT:
-                ds = 24
-        return ds
+        ds_info_df = pandas.DataFrame([{column: df.at[0, column] if column in df.columns else None
+                                        for column in const.DS_TABLE_COLUMNS}], columns=const.DS_TABLE_COLUMNS)
+        return int(Measurements.get_ds_numbers(ds_info_df, Measurements.get_ds_table())[0])
+
+
+# Measurements object of a process pool worker (made by init_measurement_worker)
+worker_measurements = None
+# memory watchdog of a process pool worker (None if the worker has no memory limit or psutil is not installed)
+worker_memory_watchdog = None
+
+
+class WorkerMemoryWatchdog(threading.Thread):
+    """
+    Class checks the resident memory of the worker process every const.WORKER_MEMORY_CHECK_INTERVAL seconds.
+    The limit applies to the memory a measurement task adds to the worker: resident memory over the resident memory
+    when the task started. If a task exceeds the limit, the main thread is interrupted and the task raises
+    MemoryError (see make_measurement_df_in_worker). If the memory of the task stays over the limit for
+    const.WORKER_MEMORY_KILL_CHECKS more checks (task stuck in a long C call), the worker exits (the pool is broken,
+    see run_measurement_workers). An idle worker is never interrupted or stopped.
+    The busy flag is changed and checked under self.lock, and the interrupt is only raised while a task runs
+    (see interrupt_handler), so an interrupt that comes after the task ended is dropped.
+    """
+
+    def __init__(self, memory_mb):
+        super().__init__(daemon=True)
+        self.limit = int(memory_mb * 1024 * 1024)
+        self.process = psutil.Process()
+        self.lock = threading.Lock()
+        self.busy = False  # True while a measurement task runs
+        self.exceeded = False  # True if the current task was interrupted
+        self.task_start_rss = 0  # resident memory of the worker when the current task started
+
+    def start_task(self):
+        with self.lock:
+            self.task_start_rss = self.process.memory_info().rss
+            self.exceeded = False
+            self.busy = True
+
+    def stop_task(self):
+        with self.lock:
+            self.busy = False
+
+    def interrupt_handler(self, signum, frame):
+        """
+        SIGINT handler of the worker main thread: raises KeyboardInterrupt only while a task runs
+        """
+        if self.busy:
+            raise KeyboardInterrupt
+
+    def run(self):
+        checks_over_limit = 0
+        while True:
+            time.sleep(const.WORKER_MEMORY_CHECK_INTERVAL)
+            with self.lock:
+                if not self.busy or self.process.memory_info().rss - self.task_start_rss <= self.limit:
+                    checks_over_limit = 0
+                    continue
+                checks_over_limit += 1
+                if not self.exceeded:
+                    self.exceeded = True
+                    _thread.interrupt_main()
+                elif checks_over_limit > const.WORKER_MEMORY_KILL_CHECKS:
+                    os._exit(1)
+
+
+def init_measurement_worker(args_dict, gt_data_df, memory_mb):
+    """
+    :param args_dict: Measurements arguments
+    :param gt_data_df: ground truth dataframe (loaded once in the parent process)
+    :param memory_mb: memory limit of a measurement in MB (0 = no limit)
+    :return: None
+    Process pool initializer, makes the Measurements object used by make_measurement_df_in_worker
+    The memory of each measurement is limited by WorkerMemoryWatchdog (if psutil is installed). The address space
+    is not limited (resource.RLIMIT_AS counts virtual reservations of numpy and BLAS, not used memory).
+    """
+    global worker_measurements, worker_memory_watchdog
+    if memory_mb and psutil is not None:
+        worker_memory_watchdog = WorkerMemoryWatchdog(memory_mb)
+        signal.signal(signal.SIGINT, worker_memory_watchdog.interrupt_handler)
+        worker_memory_watchdog.start()
+    worker_measurements = Measurements(dict(args_dict, gt_data_df=gt_data_df))
+
+
+def make_measurement_df_in_worker(measurement_id, files):
+    """
+    :param measurement_id: measurement name ADCAM_VIN_DATE_TIME
+    :param files: splits of the measurement ordered by split index
+    :return: measurement_id
+    Raises MemoryError if the worker memory watchdog interrupted the task
+    """
+    watchdog = worker_memory_watchdog
+    if watchdog is None:
+        worker_measurements.make_measurement_df_pickle(measurement_id, files)
+        return measurement_id
+    try:
+        try:
+            watchdog.start_task()
+            worker_measurements.make_measurement_df_pickle(measurement_id, files)
+        finally:
+            watchdog.stop_task()
+    except KeyboardInterrupt:
+        # the interrupt can come in the finally clause, before the task was stopped
+        watchdog.stop_task()
+        if not watchdog.exceeded:
+            raise
+        raise MemoryError(f'measurement memory over {watchdog.limit // (1024 * 1024)} MB') from None
+    finally:
+        gc.collect()
+    return measurement_id
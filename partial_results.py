@@ -47,6 +47,13 @@ class PartialResults:
         """
         accuracy_partial_results_dict = {}
         self.logger.info('getting accuracy partial results')
+        if 'accuracy_af_df_dict' not in self.sequence_df_dict and const.ACCURACY_AGGREGATION != 'frames':
+            # accuracy sketches or histogram have no frames of each measurement
+            not_available = f'not available with ACCURACY_AGGREGATION = {const.ACCURACY_AGGREGATION}'
+            self.logger.warning(f'accuracy partial results {not_available}')
+            for measurement_id in self.partial_results_dict.keys():
+                self.partial_results_dict[measurement_id] = {'Accuracy': not_available}
+            return
         # get accuracy dataframe dictionary
         try:
             accuracy_df_dict = self.sequence_df_dict['accuracy_af_df_dict']
@@ -57,7 +64,7 @@ class PartialResults:
                 # keep only ADCAM_VIN_DATE_TIME in split name
                 df[const.DFROW_LOG_FILE] = log_name_series.str.replace(self.pattern, lambda m: m.group(1))
                 # split df into multiple dfs based on split name ADCAM_VIN_DATE_TIME, and place dfs in dictionary
-                accuracy_partial_results_dict[df_name] = {k: v for k, v in df.groupby(const.DFROW_LOG_FILE)}
+                accuracy_partial_results_dict[df_name] = {k: v for k, v in df.groupby(const.DFROW_LOG_FILE, observed=True)}
             # partial_results_dict keys are the IDs for each measurement ADCAM_VIN_DATE_TIME,
             # values are empty dictionaries, see def init_partial_results_dict
             for measurement_id in self.partial_results_dict.keys():
@@ -147,7 +154,7 @@ class PartialResults:
             # keep only ADCAM_VIN_DATE_TIME in split name
             df[const.DFROW_LOG_FILE] = log_name_series.str.replace(self.pattern, lambda m: m.group(1))
             # split df into multiple dfs based on split name ADCAM_VIN_DATE_TIME, and place dfs in dictionary
-            df_dict = {k: v for k, v in df.groupby(const.DFROW_LOG_FILE)}
+            df_dict = {k: v for k, v in df.groupby(const.DFROW_LOG_FILE, observed=True)}
             # del df
             for k in self.partial_results_dict.keys():
                 if k in df_dict:
@@ -8,7 +8,13 @@ CALIBRATION
 import serializer
 from file_list import FileList
 import logging
+import hashlib
+import os
 import const as c
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+logger = logging.getLogger(__name__)
 
 
 class PickleToDict:
@@ -19,6 +25,11 @@ class PickleToDict:
         self.log_pickle_folder = args_dict['log_pickle_folder']
         self.log_pickle_ext = args_dict['log_pickle_ext']
         self.pkl_dict_folder = args_dict['pkl_dict_folder']
+        self.pkl_dict_ext = args_dict.get('pkl_dict_ext', c.CAL_PKL_DICT_EXT)
+        self.workers = args_dict.get('workers', c.WORKERS)
+        self.force = args_dict.get('force', False)
+        self.use_hash = args_dict.get('manifest_hash', c.SPLIT_MANIFEST_HASH)
+        self.manifest = {}
         self.bad_file_list = []
         self.good_file_list = []
         self.logger = logging.getLogger(__name__)
@@ -28,82 +39,39 @@ class PickleToDict:
         self.log_files = self.split_pickles.files
 
     def get_cal_dict_pickles(self):
-        log_counter = 0
-        logs_total = len(self.log_files)
+        """
+        :return: None
+        Method extracts the calibration dictionaries from every new or changed split pickle and saves them to
+        pkl_dict_folder. Splits already in the split manifest with the same size and mtime (or content hash) are
+        skipped, known bad splits are skipped unless self.force. With self.workers > 1 the splits are extracted in a
+        process pool. good_file_list.json and bad_file_list.json are made from the manifest in the order of
+        self.log_files, so they are the same as for a full serial run.
+        """
+        self.load_manifest()
+        todo = [log_file for log_file in self.log_files if not self.is_up_to_date(log_file)]
+        logs_total = len(todo)
+        self.logger.info(f'{len(self.log_files) - logs_total} splits up to date in manifest')
+        if self.workers > 1 and logs_total > 1:
+            self.logger.info(f'extracting {logs_total} splits with {self.workers} workers')
+            chunksize = max(1, logs_total // (self.workers * 4))
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = executor.map(convert_split, repeat(self.log_pickle_folder), repeat(self.pkl_dict_folder),
+                                       todo, repeat(self.use_hash), repeat(self.pkl_dict_ext), chunksize=chunksize)
+                self.update_manifest(results, todo)
+        else:
+            self.logger.info(f'extracting {logs_total} splits')
+            results = (convert_split(self.log_pickle_folder, self.pkl_dict_folder, log_file, self.use_hash,
+                                     self.pkl_dict_ext) for log_file in todo)
+            self.update_manifest(results, todo)
+
         for log_file in self.log_files:
-            try:
-                plk = serializer.load_pkl(self.log_pickle_folder, log_file)
-                log_counter += 1
-            except Exception as e:
-                self.logger.error(f'Cant open: {log_file}')
-                self.logger.exception(e)
-                self.bad_file_list.append(log_file)
-                continue
-            split_dict = {'cal_c2w_dict': {}, 'veh_speed_dict': {}, 'prelabel_dict': {}, 'common_counter_dict': {}}
-
-            try:
-                if 'EYEQ_TO_HOST' in plk['SPI'] and 'Core_Calibration_Output_protocol' in plk['SPI']['EYEQ_TO_HOST']:
-                    split_dict['cal_c2w_dict'][c.DFROW_TIMESTAMP] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.DFROW_TIMESTAMP]
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_STATE] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_STATE]
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_YAW] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_YAW]
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_PITCH] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_PITCH]
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_CAM_HEIGHT] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_CAM_HEIGHT]
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_ROLL] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_ROLL]
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_STATE_DEGRADE_CAUSE] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_STATE_DEGRADE_CAUSE]
-                else:
-                    split_dict['cal_c2w_dict'][c.DFROW_TIMESTAMP] = []
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_STATE] = []
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_YAW] = []
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_PITCH] = []
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_CAM_HEIGHT] = []
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_ROLL] = []
-                    split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_STATE_DEGRADE_CAUSE] = []
-                    self.logger.warning(f'No Core_Calibration_Output_protocol: {log_file}')
-
-            except KeyError as e:
-                self.bad_file_list.append(log_file)
-                self.logger.error(f'KeyError in Core_Calibration_Output_protocol: {log_file}')
-                self.logger.exception(e)
-                continue
-
-            try:
-                if 'EYEQ_TO_HOST' in plk['SPI'] and 'Core_Car_Output_protocol' in plk['SPI']['EYEQ_TO_HOST']:
-                    split_dict['veh_speed_dict'][c.DFROW_TIMESTAMP] = plk['SPI']['EYEQ_TO_HOST']['Core_Car_Output_protocol'][c.DFROW_TIMESTAMP]
-                    split_dict['veh_speed_dict'][c.DFROW_VEHICLE_SPEED] = plk['SPI']['EYEQ_TO_HOST']['Core_Car_Output_protocol'][c.SIG_VEHICLE_SPEED]
-                else:
-                    split_dict['veh_speed_dict'][c.DFROW_TIMESTAMP] = []
-                    split_dict['veh_speed_dict'][c.DFROW_VEHICLE_SPEED] = []
-
-            except KeyError as e:
-                self.bad_file_list.append(log_file)
-                self.logger.error(f'KeyError in Core_Car_Output_protocol: {log_file}')
-                self.logger.exception(e)
-                continue
-
-            try:
-                if 'EYEQ_TO_HOST' in plk['SPI'] and 'Core_Common_protocol' in plk['SPI']['EYEQ_TO_HOST']:
-                    split_dict['common_counter_dict'][c.DFROW_TIMESTAMP] = plk['SPI']['EYEQ_TO_HOST']['Core_Common_protocol'][c.DFROW_TIMESTAMP]
-                    split_dict['common_counter_dict'][c.SIG_CRC_COUNTER] = plk['SPI']['EYEQ_TO_HOST']['Core_Common_protocol'][c.SIG_CRC_COUNTER]
-                else:
-                    split_dict['common_counter_dict'][c.DFROW_TIMESTAMP] = []
-                    split_dict['common_counter_dict'][c.SIG_CRC_COUNTER] = []
-
-            except KeyError as e:
+            if self.manifest[log_file]['status'] == 'good':
+                self.good_file_list.append(log_file)
+            else:
                 self.bad_file_list.append(log_file)
-                self.logger.error(f'KeyError in Core_Common_protocol: {log_file}')
-                self.logger.exception(e)
-                continue
-
-            pkl_dict_name = log_file.split('.')[0]
-            serializer.save_pkl(split_dict, self.pkl_dict_folder, pkl_dict_name)
-            self.good_file_list.append(log_file)
-            sts = log_counter/logs_total * 100
-            # sts_str = f'{sts:.2f}'
-            # self.logger.info(f'status: {sts_str}% saved {log_counter}/{logs_total}: {self.pkl_dict_folder + pkl_dict_name}')
-            # print(f'saved {self.pkl_dict_folder + pkl_dict_name}')
 
         if self.bad_file_list:
-            bad_file_num = self.bad_file_list
+            bad_file_num = len(self.bad_file_list)
             self.logger.error(f'{bad_file_num} FILES NOT CONVERTED:')
             serializer.save_json(self.bad_file_list, self.pkl_dict_folder, 'bad_file_list.json')
             for bad_file in self.bad_file_list:
@@ -111,3 +79,214 @@ class PickleToDict:
 
         if self.good_file_list:
             serializer.save_json(self.good_file_list, self.pkl_dict_folder, 'good_file_list.json')
+
+    def load_manifest(self):
+        """
+        :return: None
+        Method loads the split manifest from pkl_dict_folder. Missing or unreadable manifest starts a new one.
+        """
+        path_file = os.path.join(self.pkl_dict_folder, c.SPLIT_MANIFEST_FILE)
+        if not os.path.isfile(path_file):
+            self.manifest = {}
+            return
+        try:
+            self.manifest = serializer.load_json(path_file)
+        except Exception as e:
+            self.logger.warning(f'Cant read split manifest {path_file}, converting all splits')
+            self.logger.exception(e)
+            self.manifest = {}
+
+    def save_manifest(self):
+        """
+        :return: None
+        Method saves the split manifest to pkl_dict_folder (atomic, a crash never leaves a broken manifest)
+        """
+        serializer.save_json(self.manifest, self.pkl_dict_folder, c.SPLIT_MANIFEST_FILE, atomic=True)
+
+    def is_up_to_date(self, log_file):
+        """
+        :param log_file: split pickle file name
+        :return: True if the split does not need to be converted
+        Split is up to date if it is in the manifest with the same size and mtime. If only mtime changed and
+        self.use_hash, the content hash is compared. Bad splits are up to date unless self.force, good splits
+        also need their calibration dictionary pickle in pkl_dict_folder.
+        """
+        entry = self.manifest.get(log_file)
+        if entry is None:
+            return False
+        if entry['status'] == 'bad' and self.force:
+            return False
+        if entry['status'] == 'good':
+            pkl_dict_file = log_file.split('.')[0] + ('.npz' if self.pkl_dict_ext == 'npz' else '.pickle')
+            if not os.path.isfile(os.path.join(self.pkl_dict_folder, pkl_dict_file)):
+                return False
+        try:
+            stat = os.stat(os.path.join(self.log_pickle_folder, log_file))
+        except OSError:
+            return False
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns == entry['mtime']:
+            return True
+        if self.use_hash and entry.get('hash'):
+            signature = get_split_signature(self.log_pickle_folder, log_file, True)
+            if signature['hash'] == entry['hash']:
+                entry['mtime'] = signature['mtime']
+                return True
+        return False
+
+    def update_manifest(self, results, todo):
+        """
+        :param results: iterable of (converted, signature) in the order of todo
+        :param todo: list of converted split pickle file names
+        :return: None
+        Method puts conversion results into the manifest as they come in. The manifest is saved every
+        c.SPLIT_MANIFEST_SAVE_INTERVAL splits and when the conversion ends or fails, so a rerun after a crash
+        only converts the splits that were not finished.
+        """
+        try:
+            for i, (log_file, (converted, signature)) in enumerate(zip(todo, results), 1):
+                signature['status'] = 'good' if converted else 'bad'
+                self.manifest[log_file] = signature
+                if i % c.SPLIT_MANIFEST_SAVE_INTERVAL == 0:
+                    self.logger.info(f'converted {i}/{len(todo)} splits')
+                    self.save_manifest()
+        finally:
+            self.save_manifest()
+
+
+def get_split_signature(log_pickle_folder, log_file, use_hash):
+    """
+    :param log_pickle_folder: folder with split pickles
+    :param log_file: split pickle file name
+    :param use_hash: if True, calculate sha1 of the split
+    :return: dictionary with size, mtime (ns) and hash (None if not use_hash)
+    """
+    path_file = os.path.join(log_pickle_folder, log_file)
+    stat = os.stat(path_file)
+    file_hash = None
+    if use_hash:
+        sha1 = hashlib.sha1()
+        with open(path_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(chunk)
+        file_hash = sha1.hexdigest()
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': file_hash}
+
+
+def convert_split(log_pickle_folder, pkl_dict_folder, log_file, use_hash, pkl_dict_ext='pickle'):
+    """
+    :param log_pickle_folder: folder with split pickles
+    :param pkl_dict_folder: folder where the calibration dictionary pickle is saved
+    :param log_file: split pickle file name
+    :param use_hash: if True, put sha1 of the split into the signature
+    :param pkl_dict_ext: 'npz' saves the calibration dictionaries to npz, otherwise pickle
+    :return: (converted, signature) - signature is taken before the split is read
+    """
+    signature = get_split_signature(log_pickle_folder, log_file, use_hash)
+    converted = extract_split(log_pickle_folder, pkl_dict_folder, log_file, pkl_dict_ext)
+    return converted, signature
+
+
+def extract_split(log_pickle_folder, pkl_dict_folder, log_file, pkl_dict_ext='pickle'):
+    """
+    :param log_pickle_folder: folder with split pickles
+    :param pkl_dict_folder: folder where the calibration dictionary pickle is saved
+    :param log_file: split pickle file name
+    :param pkl_dict_ext: 'npz' saves the calibration dictionaries to npz (one typed array per signal), otherwise pickle
+    :return: True if the split was converted, False otherwise
+    Function loads one split pickle, extracts the calibration dictionaries and saves them.
+    Module level function, so it can be sent to a process pool.
+    """
+    try:
+        plk = serializer.load_pkl(log_pickle_folder, log_file)
+    except Exception as e:
+        logger.error(f'Cant open: {log_file}')
+        logger.exception(e)
+        return False
+
+    split_dict = get_split_dict(plk, log_file)
+    del plk
+    if split_dict is None:
+        return False
+
+    save_split_dict(split_dict, pkl_dict_folder, log_file, pkl_dict_ext)
+    return True
+
+
+def save_split_dict(split_dict, pkl_dict_folder, log_file, pkl_dict_ext='pickle'):
+    """
+    :param split_dict: dictionary with calibration dictionaries
+    :param pkl_dict_folder: folder where the calibration dictionary pickle is saved
+    :param log_file: split pickle file name
+    :param pkl_dict_ext: 'npz' saves the calibration dictionaries to npz (one typed array per signal), otherwise pickle
+    :return: None
+    """
+    pkl_dict_name = log_file.split('.')[0]
+    if pkl_dict_ext == 'npz':
+        serializer.save_npz(split_dict, pkl_dict_folder, pkl_dict_name)
+    else:
+        serializer.save_pkl(split_dict, pkl_dict_folder, pkl_dict_name)
+
+
+def get_split_dict(plk, log_file):
+    """
+    :param plk: unpickled split (nested dictionary)
+    :param log_file: split pickle file name (used for logging)
+    :return: split_dict: dictionary with calibration dictionaries, None if a protocol is broken
+    Function copies Core_Calibration_Output_protocol, Core_Car_Output_protocol and Core_Common_protocol signals
+    from the split to split_dict
+    """
+    split_dict = {'cal_c2w_dict': {}, 'veh_speed_dict': {}, 'prelabel_dict': {}, 'common_counter_dict': {}}
+
+    try:
+        if 'EYEQ_TO_HOST' in plk['SPI'] and 'Core_Calibration_Output_protocol' in plk['SPI']['EYEQ_TO_HOST']:
+            split_dict['cal_c2w_dict'][c.DFROW_TIMESTAMP] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.DFROW_TIMESTAMP]
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_STATE] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_STATE]
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_YAW] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_YAW]
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_PITCH] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_PITCH]
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_CAM_HEIGHT] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_CAM_HEIGHT]
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_ROLL] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_ROLL]
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_STATE_DEGRADE_CAUSE] = plk['SPI']['EYEQ_TO_HOST']['Core_Calibration_Output_protocol'][c.SIG_CLB_C2W_STATE_DEGRADE_CAUSE]
+        else:
+            split_dict['cal_c2w_dict'][c.DFROW_TIMESTAMP] = []
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_STATE] = []
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_YAW] = []
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_PITCH] = []
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_CAM_HEIGHT] = []
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_ROLL] = []
+            split_dict['cal_c2w_dict'][c.SIG_CLB_C2W_STATE_DEGRADE_CAUSE] = []
+            logger.warning(f'No Core_Calibration_Output_protocol: {log_file}')
+
+    except KeyError as e:
+        logger.error(f'KeyError in Core_Calibration_Output_protocol: {log_file}')
+        logger.exception(e)
+        return None
+
+    try:
+        if 'EYEQ_TO_HOST' in plk['SPI'] and 'Core_Car_Output_protocol' in plk['SPI']['EYEQ_TO_HOST']:
+            split_dict['veh_speed_dict'][c.DFROW_TIMESTAMP] = plk['SPI']['EYEQ_TO_HOST']['Core_Car_Output_protocol'][c.DFROW_TIMESTAMP]
+            split_dict['veh_speed_dict'][c.DFROW_VEHICLE_SPEED] = plk['SPI']['EYEQ_TO_HOST']['Core_Car_Output_protocol'][c.SIG_VEHICLE_SPEED]
+        else:
+            split_dict['veh_speed_dict'][c.DFROW_TIMESTAMP] = []
+            split_dict['veh_speed_dict'][c.DFROW_VEHICLE_SPEED] = []
+
+    except KeyError as e:
+        logger.error(f'KeyError in Core_Car_Output_protocol: {log_file}')
+        logger.exception(e)
+        return None
+
+    try:
+        if 'EYEQ_TO_HOST' in plk['SPI'] and 'Core_Common_protocol' in plk['SPI']['EYEQ_TO_HOST']:
+            split_dict['common_counter_dict'][c.DFROW_TIMESTAMP] = plk['SPI']['EYEQ_TO_HOST']['Core_Common_protocol'][c.DFROW_TIMESTAMP]
+            split_dict['common_counter_dict'][c.SIG_CRC_COUNTER] = plk['SPI']['EYEQ_TO_HOST']['Core_Common_protocol'][c.SIG_CRC_COUNTER]
+        else:
+            split_dict['common_counter_dict'][c.DFROW_TIMESTAMP] = []
+            split_dict['common_counter_dict'][c.SIG_CRC_COUNTER] = []
+
+    except KeyError as e:
+        logger.error(f'KeyError in Core_Common_protocol: {log_file}')
+        logger.exception(e)
+        return None
+
+    return split_dict
@@ -0,0 +1,306 @@
+"""
+Module holds mergeable weighted quantile sketches (used if const.ACCURACY_AGGREGATION = 'sketch')
+Patryk Leszowski
+APTIV
+ADCAM MID
+CALIBRATION
+"""
+import math
+import os
+import logging
+import numpy as np
+import pandas
+import const
+import serializer
+import calc_functions as cf
+
+logger = logging.getLogger(__name__)
+
+
+class QuantileSketch:
+    """
+    Class holds a merging t-digest of weighted values.
+    While the sketch has at most compression distinct values it keeps them all (exact, same percentiles as
+    calc_functions.weighed_percentile). With more distinct values, neighbouring values are merged to centroids,
+    a centroid spans at most 1 in k = compression / (2 * pi) * asin(2 * q - 1). The rank error of percentile q is then
+    at most about 2 * pi * sqrt(q * (1 - q)) / compression of the sum of weights (0.7 % for Percentile 95 and
+    compression 200). Min, max and the sum of weights are exact. Merging sketches keeps the bound.
+    """
+
+    def __init__(self, compression=None):
+        self.compression = compression if compression else const.QUANTILE_SKETCH_COMPRESSION
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.exact = True
+        self.min = np.nan
+        self.max = np.nan
+
+    @property
+    def sum_of_weights(self):
+        return self.weights.sum()
+
+    def to_dict(self):
+        """
+        :return: dictionary of the sketch with python types (saved to json by save_sketches)
+        """
+        return {'compression': self.compression,
+                'means': self.means.tolist(),
+                'weights': self.weights.tolist(),
+                'exact': bool(self.exact),
+                'min': float(self.min),
+                'max': float(self.max)}
+
+    @classmethod
+    def from_dict(cls, sketch_data):
+        """
+        :param sketch_data: dictionary made by to_dict
+        :return: QuantileSketch
+        """
+        sketch = cls(sketch_data['compression'])
+        sketch.means = np.asarray(sketch_data['means'], dtype=float)
+        sketch.weights = np.asarray(sketch_data['weights'])
+        sketch.exact = sketch_data['exact']
+        sketch.min = sketch_data['min']
+        sketch.max = sketch_data['max']
+        return sketch
+
+    def add(self, values, weights=None):
+        """
+        :param values: array of values (nan values are not used)
+        :param weights: array of weights (default 1 for each value, zero weights are not used)
+        :return: self
+        """
+        values = np.asarray(values, dtype=float)
+        weights = np.ones(values.size) if weights is None else np.asarray(weights)
+        used = ~np.isnan(values) & (weights != 0)
+        if np.any(used):
+            self.add_centroids(values[used], weights[used])
+        return self
+
+    def merge(self, other):
+        """
+        :param other: QuantileSketch
+        :return: self
+        Method merges other sketch into this sketch
+        """
+        if other.means.size:
+            self.exact = self.exact and other.exact
+            self.add_centroids(other.means, other.weights)
+            self.min = np.fmin(self.min, other.min)
+            self.max = np.fmax(self.max, other.max)
+        return self
+
+    def add_centroids(self, means, weights):
+        """
+        :param means: array of centroid means (no nan)
+        :param weights: array of centroid weights
+        :return: None
+        Method adds the centroids and compresses the sketch
+        """
+        means = np.concatenate((self.means, means))
+        weights = np.concatenate((self.weights, weights))
+        self.min = np.fmin(self.min, means.min())
+        self.max = np.fmax(self.max, means.max())
+        # one centroid per distinct value
+        means, inverse = np.unique(means, return_inverse=True)
+        weights = np.bincount(inverse.ravel(), weights=weights, minlength=means.size)
+        if means.size > self.compression:
+            means, weights = self.compress(means, weights)
+            self.exact = False
+        self.means = means
+        self.weights = weights
+
+    def compress(self, means, weights):
+        """
+        :param means: sorted array of centroid means
+        :param weights: array of centroid weights
+        :return: means and weights of the merged centroids
+        Method merges neighbouring centroids while they span at most 1 in k (scale function k1 of t-digest)
+        """
+        sum_of_weights = weights.sum()
+        k_scale = self.compression / (2 * math.pi)
+        merged_means = []
+        merged_weights = []
+        weight_before = 0.0
+        centroid_mean = means[0]
+        centroid_weight = weights[0]
+        q_limit = self.q_limit(0.0, k_scale)
+        for mean, weight in zip(means[1:], weights[1:]):
+            if (weight_before + centroid_weight + weight) / sum_of_weights <= q_limit:
+                centroid_mean += (mean - centroid_mean) * weight / (centroid_weight + weight)
+                centroid_weight += weight
+            else:
+                merged_means.append(centroid_mean)
+                merged_weights.append(centroid_weight)
+                weight_before += centroid_weight
+                q_limit = self.q_limit(weight_before / sum_of_weights, k_scale)
+                centroid_mean = mean
+                centroid_weight = weight
+        merged_means.append(centroid_mean)
+        merged_weights.append(centroid_weight)
+        return np.array(merged_means), np.array(merged_weights)
+
+    @staticmethod
+    def q_limit(q_left, k_scale):
+        """
+        :param q_left: quantile of the left edge of the centroid
+        :param k_scale: compression / (2 * pi)
+        :return: largest quantile of the right edge of the centroid
+        """
+        k_left = k_scale * math.asin(2 * min(q_left, 1.0) - 1)
+        return (math.sin(min((k_left + 1) / k_scale, math.pi / 2)) + 1) / 2
+
+    def weighed_percentile(self, nth_q):
+        """
+        :param nth_q: nth quantile (n is any number between and including 0 and 1)
+        :return: percentile value (linear interpolation, see calc_functions.weighed_percentile), nan if sketch is empty
+        """
+        if self.means.size == 0:
+            return np.nan
+        if nth_q <= 0:
+            return self.min
+        if nth_q >= 1:
+            return self.max
+        if self.exact:
+            if self.weights.dtype.kind == 'f':
+                steps = np.trunc(self.weights).astype(np.int64)
+            else:
+                steps = self.weights.astype(np.int64)
+            percentile = cf.sorted_weighed_percentile(self.means, self.sum_of_weights,
+                                                      np.cumsum(np.maximum(steps, 0)), nth_q)
+            return np.nan if percentile is None else percentile
+        # position of the percentile in the (not weighed) sorted data, centroid means at the middle of their weights
+        position = nth_q * (self.sum_of_weights - 1)
+        centers = np.cumsum(self.weights) - (self.weights + 1) / 2
+        return float(np.interp(position, np.concatenate(([0], centers, [self.sum_of_weights - 1])),
+                               np.concatenate(([self.min], self.means, [self.max]))))
+
+
+def add_df_to_sketches(sketch_dict, dataframe, param, threshold=None):
+    """
+    Function adds the weighed values of param to the sketches of their conditions (const.SKETCH_CONDITION_COLUMNS)
+    :param sketch_dict: dictionary {condition values tuple: [QuantileSketch, sum of weights, sum of failed weights]}
+    :param dataframe: dataframe with condition columns, param and 'weight' columns
+    :param param: dataframe column of values
+    :param threshold: values larger than threshold are counted as failed (None = no failed count)
+    :return: None
+    """
+    columns = const.SKETCH_CONDITION_COLUMNS
+    for condition, df in dataframe.groupby(columns, sort=False, dropna=False, observed=True):
+        # nan conditions as None (same key in every measurement)
+        condition = tuple(None if pandas.isnull(value) else value for value in condition)
+        values = pandas.to_numeric(df[param], errors='coerce').to_numpy(dtype=float)
+        # rows without weight column (roll standard deviation) have no weight
+        weights = df['weight'].to_numpy() if 'weight' in df.columns else np.zeros(df.shape[0], dtype=np.int64)
+        if condition not in sketch_dict:
+            sketch_dict[condition] = [QuantileSketch(), 0, 0]
+        sketch_dict[condition][0].add(values, weights)
+        sketch_dict[condition][1] += weights[~np.isnan(values)].sum()
+        if threshold is not None:
+            sketch_dict[condition][2] += weights[values > threshold].sum()
+
+
+def sketches_to_df(sketch_dict):
+    """
+    Function makes a sketch dataframe (one row per condition) from the sketch dictionary
+    :param sketch_dict: dictionary {condition values tuple: [QuantileSketch, sum of weights, sum of failed weights]}
+    :return: dataframe with condition columns, 'weight', 'failed weight' and 'sketch' columns
+    """
+    columns = const.SKETCH_CONDITION_COLUMNS + ['weight', 'failed weight', 'sketch']
+    rows = [list(condition) + values[1:] + values[:1] for condition, values in sketch_dict.items()]
+    return pandas.DataFrame(rows, columns=columns)
+
+
+def merge_sketch_dicts(sketch_dict, other_sketch_dict):
+    """
+    Function merges the sketches, weights and failed weights of other_sketch_dict into sketch_dict
+    :param sketch_dict: dictionary {condition values tuple: [QuantileSketch, sum of weights, sum of failed weights]}
+    :param other_sketch_dict: dictionary of the same form
+    :return: None
+    """
+    for condition, (sketch, weight, failed_weight) in other_sketch_dict.items():
+        if condition not in sketch_dict:
+            sketch_dict[condition] = [QuantileSketch(), 0, 0]
+        sketch_dict[condition][0].merge(sketch)
+        sketch_dict[condition][1] += weight
+        sketch_dict[condition][2] += failed_weight
+
+
+def save_sketches(sketch_dicts, path, file):
+    """
+    Function saves sketch dictionaries to json, so that a later run can merge them (see merge_saved_sketches)
+    :param sketch_dicts: dictionary {name: sketch dictionary}, sketch dictionary as in add_df_to_sketches
+    :param path: path to folder
+    :param file: json file name
+    :return: None
+    """
+    def to_python(value):
+        # numpy scalars to python types
+        return value.item() if isinstance(value, np.generic) else value
+
+    data = {name: [{'condition': [to_python(value) for value in condition],
+                    'weight': to_python(values[1]),
+                    'failed weight': to_python(values[2]),
+                    'sketch': values[0].to_dict()} for condition, values in sketch_dict.items()]
+            for name, sketch_dict in sketch_dicts.items()}
+    serializer.save_json(data, path, file, atomic=True)
+
+
+def load_sketches(path, file):
+    """
+    Function loads sketch dictionaries saved with save_sketches
+    :param path: path to folder
+    :param file: json file name
+    :return: dictionary {name: sketch dictionary}
+    """
+    data = serializer.load_json(path, file)
+    return {name: {tuple(row['condition']): [QuantileSketch.from_dict(row['sketch']), row['weight'], row['failed weight']]
+                   for row in rows}
+            for name, rows in data.items()}
+
+
+def merge_saved_sketches(sketch_dicts, file, folders=None):
+    """
+    Function merges the sketches saved by earlier runs into sketch_dicts
+    :param sketch_dicts: dictionary {name: sketch dictionary}, sketch dictionary as in add_df_to_sketches
+    :param file: json file name of the sketches (see save_sketches)
+    :param folders: folders with the saved sketches (default const.QUANTILE_SKETCH_MERGE_FOLDERS)
+    :return: None
+    """
+    folders = const.QUANTILE_SKETCH_MERGE_FOLDERS if folders is None else folders
+    for folder in folders:
+        if not os.path.isfile(os.path.join(folder, serializer.json_file_name(file))):
+            logger.warning(f'no saved sketches {file} in {folder}')
+            continue
+        logger.info(f'merging saved sketches {file} from {folder}')
+        for name, other_sketch_dict in load_sketches(folder, file).items():
+            if name not in sketch_dicts:
+                sketch_dicts[name] = {}
+            merge_sketch_dicts(sketch_dicts[name], other_sketch_dict)
+
+
+def merge_sketches(sketch_series):
+    """
+    :param sketch_series: series or list of QuantileSketch
+    :return: new QuantileSketch with all sketches merged
+    """
+    sketch = QuantileSketch()
+    for other in sketch_series:
+        sketch.merge(other)
+    return sketch
+
+
+def calc_sketch_percentile_df(dataframe, param):
+    """
+    Function merges the sketches of the sketch dataframe, and calculates percentiles (see calc_weighed_percentile_df).
+    Returns dictionary
+    :param dataframe: sketch dataframe (see sketches_to_df)
+    :param param: Calibration parameter (values of the sketches)
+    :return: dictionary
+    """
+    sketch = merge_sketches(dataframe['sketch'])
+    percentile_dict = {'Percentile 0': sketch.min}
+    for nth_q in [0.25, 0.5, 0.75, 0.90, 0.95, 0.98, 0.99]:
+        percentile_dict[f'Percentile {round(nth_q * 100)}'] = sketch.weighed_percentile(nth_q)
+    percentile_dict['Percentile 100'] = sketch.max
+    return percentile_dict
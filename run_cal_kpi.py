@@ -79,14 +79,21 @@ def main():
     path_gt_data = const.GT_DATA_FOLDER
     measurement_folder = const.MEASUREMENT_DFS_FOLDER
     sw_package_num = const.SW_PACKAGE_NUM
+    workers = const.WORKERS
+    worker_memory_mb = const.WORKER_MEMORY_MB
+    manifest_hash = const.SPLIT_MANIFEST_HASH
     output_arg_ok = 0
 
     # get args
     parser = argparse.ArgumentParser(epilog='Edit paths in const.py to use just run_cal_kpi.py without args')
     parser.add_argument('-i', '--input', help='input pkl_dict_folder to log files')
     parser.add_argument('-o', '--output', help='output pkl_dict_folder for report files')
-    parser.add_argument('-t', '--log_file_type', help='change log file type - can be json or pkl (default json)')
+    parser.add_argument('-t', '--log_file_type', help='change log file type - can be json, pkl or npz (default json)')
     parser.add_argument('-s', '--software', help='set software package number (default 0)')
+    parser.add_argument('-w', '--workers', type=int, help=f'number of worker processes (default {const.WORKERS})')
+    parser.add_argument('--worker_memory', type=int, help=f'memory limit of each measurement in its worker in MB (default {const.WORKER_MEMORY_MB})')
+    parser.add_argument('-f', '--force', action='store_true', help='reconvert splits marked bad in the split manifest')
+    parser.add_argument('--hash', action='store_true', help='compare split content hash when mtime changed')
     args = parser.parse_args()
 
     if args.input:
@@ -106,6 +113,15 @@ def main():
     if args.software:
         sw_package_num = args.software
 
+    if args.workers:
+        workers = args.workers
+
+    if args.worker_memory:
+        worker_memory_mb = args.worker_memory
+
+    if args.hash:
+        manifest_hash = True
+
     if not args.input and not args.output:
         logger.info('Using default paths from const.py')
         print('Using default paths from const.py')
@@ -155,7 +171,12 @@ def main():
                  'partial_results_folder': partial_results_folder,
                  'measurement_folder': measurement_folder,
                  'path_gt_data': path_gt_data,
-                 'sw_package_num': sw_package_num}
+                 'sw_package_num': sw_package_num,
+                 'workers': workers,
+                 'worker_memory_mb': worker_memory_mb,
+                 'force': args.force,
+                 'manifest_hash': manifest_hash,
+                 'save_split_dicts': const.SAVE_SPLIT_DICTS}
 
     # Get prelabels and save for future use (use if prelabel_dict.json has not been made)
     def get_prelabels(arguments):
@@ -186,6 +207,16 @@ def main():
         sq.get_measurement_ids()
         sq.splits_to_measurements()  # also puts prelabels into measurements
 
+    # Make measurement dataframe pickles directly from split pickles.xz (script functions 2 and 3 in one pass)
+    def stream_measurements(arguments):
+        pl = GetPrelabel(arguments)
+        pl.load_prelabel_dict()
+        arguments['prelabel_dict'] = pl.prelabel_dict
+        logger.info('Initializing Sequencer')
+        sq = Sequencer(arguments)
+        sq.get_measurement_ids(from_splits=True)
+        sq.stream_splits_to_measurements()  # also puts prelabels into measurements
+
     # Run KPI sequences on measurement dataframe pickles
     def run_kpi_sequence(arguments):
         logger.info('Initializing Sequencer')
@@ -208,6 +239,9 @@ def main():
     # 4: Run KPI sequences on measurement dataframe pickles
     elif script_function == 4:
         run_kpi_sequence(args_dict)
+    # 5: Make measurement dataframe pickles directly from split pickles.xz (no CAL dictionary pickles needed)
+    elif script_function == 5:
+        stream_measurements(args_dict)
     else:
         logger.error('Wrong script function chosen')
         sys.exit()
@@ -10,7 +10,9 @@ from excel_printer import ExcelPrinter
 import df_filter
 import pandas
 import const
-import serializer
+import measurement_cache
+import quantile_sketch
+import histogram_cube
 from sequence_kpi import KpiSequence
 import statistics as stat
 import calc_functions as cf
@@ -40,10 +42,28 @@ class AccuracySequence(KpiSequence):
         self.calib_sig = const.SIG_CLB_C2W_STATE
         self.height_sig = const.SIG_CLB_C2W_CAM_HEIGHT
         self.accuracy_rows = const.ACCURACY_INFO
-        calc_func = cf.calc_weighed_percentile_df
+        self.accuracy_df_list_dict = {const.DFROW_D_PITCH: [],
+                                      const.DFROW_D_YAW: [],
+                                      const.DFROW_D_ROLL: [],
+                                      const.DFROW_D_HEIGHT: []
+                                      }
+        # sketches of the weighed deltas per condition {param: {condition: [sketch, weight, failed weight]}}
+        self.sketch_dict = {param: {} for param in self.accuracy_df_list_dict}
+        # counts of the weighed deltas per condition and bin {param: {condition + (bin,): count}}
+        self.histogram_dict = {param: {} for param in self.accuracy_df_list_dict}
+        self.aggregation = const.ACCURACY_AGGREGATION
+        # sketches are saved in the report folder, and merged with the saved sketches of earlier runs
+        self.path_report = path_report
+        self.sketch_file = 'sketches_accuracy_' + self.app_mode.lower().replace(' ', '_')
+        if self.aggregation == 'sketch':
+            calc_func = quantile_sketch.calc_sketch_percentile_df
+        else:
+            calc_func = cf.calc_weighed_percentile_df
         # calc_func = cf.calc_percentile_df
         self.xls = [ExcelPrinter(path_report, report_file_name, 'Accuracy ' + self.app_mode)]
         super().__init__(self.df_obj, const.S_PARAMS_ACC, self.xls, function=calc_func)
+        # columns read from measurement dataframes (loaded by MeasurementEngine)
+        self.columns = self.accuracy_rows
         self.logger = logging.getLogger(__name__)
 
     def get_accuracy_df(self):
@@ -52,57 +72,100 @@ class AccuracySequence(KpiSequence):
         Method gets dataframe where CLB_SPC_STATUS = Calibrated, Unvalidated, and Suspected
         """
         self.logger.info(f'Get accuracy dataframe')
-        accuracy_df_list_dict = {const.DFROW_D_PITCH: [],
-                                 const.DFROW_D_YAW: [],
-                                 const.DFROW_D_ROLL: [],
-                                 const.DFROW_D_HEIGHT: []
-                                 }
-
         for file in self.measurement_pickle_list:
-            df = serializer.load_pkl(const.MEASUREMENT_DFS_FOLDER, file)
-            self.logger.info(f'Getting {self.app_mode} accuracy dataframe from {file}')
-            # keep only columns relevant to accuracy
-            df = df[self.accuracy_rows].reset_index(drop=True)
-            # get first row from df
-            df_1st_row = df.iloc[[0]].reset_index(drop=True)
-            # keep only rows where calibrated
-            df_temp = df_filter.copy_rows__col_eq_val_df(df, self.calib_sig, self.calib_value)
-            if df_temp.shape[0] > 0:
-                # substitute file name with shorter form
-                # df[const.DFROW_LOG_FILE] = file
-                # get weighed values of each parameter
-                for idx, param in enumerate(accuracy_df_list_dict.keys()):
-                    # get unique delta values and their weights
-                    df_weight = df_temp[param].value_counts().to_frame(name='weight').reset_index().rename(columns={'index': param})
-                    # if delta roll std, get standard deviation of unique delta rolls
-                    if param == const.DFROW_D_ROLL and self.roll_std is True:
-                        # get first row from df_param
-                        df_acc = df_temp.iloc[[0]].reset_index(drop=True)
-                        df_acc.at[0, param] = stat.pstdev(df_weight[param])
-                        # put param column at end of dataframe
-                        cols = list(df_acc.columns.values)
-                        cols.pop(cols.index(param))
-                        df_acc = df_acc[cols + [param]]
-                        accuracy_df_list_dict[param].append(df_acc)
-                    # else get unique deltas with weights (weights used if weighed percentile function passed to parent)
-                    else:
-                        # get indexes of delta weights
-                        weight_indexes = df_filter.get_indexes_of_first_occurrence(df_temp[param], df_weight[param])
-                        # get only rows with weight_indexes, all columns
-                        df_cut = df_temp.iloc[weight_indexes, :].reset_index(drop=True)
-                        # drop column param (its duplicated in df_weight)
-                        df_cut.drop([param], axis=1, inplace=True)
-                        df_joined = df_cut.join(df_weight)
-                        accuracy_df_list_dict[param].append(df_joined)
-            else:
-                self.logger.warning(f'No {self.app_mode} convergence in {file} ')
-                for idx, param in enumerate(accuracy_df_list_dict.keys()):
-                    df_1st_row[param] = None  # np.nan
-                    # add weight column
-                    df_1st_row['weight'] = 0
-                    accuracy_df_list_dict[param].append(df_1st_row)
+            df = measurement_cache.load_measurement_df(const.MEASUREMENT_DFS_FOLDER, file, self.columns)
+            self.add_measurement(file, df)
+        self.finalize_measurements()
+
+    def add_measurement(self, file, df):
+        """
+        :param file: measurement file name
+        :param df: measurement dataframe
+        :return: None
+        Method puts weighed deltas of one measurement into self.accuracy_df_list_dict
+        """
+        self.logger.info(f'Getting {self.app_mode} accuracy dataframe from {file}')
+        # keep only columns relevant to accuracy
+        df = df[self.accuracy_rows].reset_index(drop=True)
+        # get first row from df
+        df_1st_row = df.iloc[[0]].reset_index(drop=True)
+        # keep only rows where calibrated
+        df_temp = df_filter.copy_rows__col_eq_val_df(df, self.calib_sig, self.calib_value)
+        if df_temp.shape[0] > 0:
+            # substitute file name with shorter form
+            # df[const.DFROW_LOG_FILE] = file
+            # get weighed values of each parameter
+            for idx, param in enumerate(self.accuracy_df_list_dict.keys()):
+                # get unique delta values and their weights
+                df_weight = df_temp[param].value_counts().to_frame(name='weight').reset_index().rename(columns={'index': param})
+                # if delta roll std, get standard deviation of unique delta rolls
+                if param == const.DFROW_D_ROLL and self.roll_std is True:
+                    # get first row from df_param
+                    df_acc = df_temp.iloc[[0]].reset_index(drop=True)
+                    df_acc.at[0, param] = stat.pstdev(df_weight[param])
+                    # put param column at end of dataframe
+                    cols = list(df_acc.columns.values)
+                    cols.pop(cols.index(param))
+                    df_acc = df_acc[cols + [param]]
+                    self.accuracy_df_list_dict[param].append(df_acc)
+                # else get unique deltas with weights (weights used if weighed percentile function passed to parent)
+                else:
+                    # get indexes of delta weights
+                    weight_indexes = df_filter.get_indexes_of_first_occurrence(df_temp[param], df_weight[param])
+                    # get only rows with weight_indexes, all columns
+                    df_cut = df_temp.iloc[weight_indexes, :].reset_index(drop=True)
+                    # drop column param (its duplicated in df_weight)
+                    df_cut.drop([param], axis=1, inplace=True)
+                    df_joined = df_cut.join(df_weight)
+                    self.add_weighed_df(param, df_joined)
+        else:
+            self.logger.warning(f'No {self.app_mode} convergence in {file} ')
+            for idx, param in enumerate(self.accuracy_df_list_dict.keys()):
+                df_1st_row[param] = None  # np.nan
+                # add weight column
+                df_1st_row['weight'] = 0
+                self.add_weighed_df(param, df_1st_row)
+
+    def add_weighed_df(self, param, df):
+        """
+        :param param: accuracy parameter
+        :param df: weighed deltas of one measurement
+        :return: None
+        Method keeps the weighed deltas in self.accuracy_df_list_dict, or adds them to the sketches (or histogram)
+        of their conditions
+        """
+        if self.aggregation == 'sketch':
+            # get rid of drop frames (HEIGHT=0 when frame is bad)
+            df = df[df[self.height_sig] != 0]
+            quantile_sketch.add_df_to_sketches(self.sketch_dict[param], df, param,
+                                               const.ACCURACY_PASS_THRESHOLDS.get(param))
+        elif self.aggregation == 'histogram':
+            df = df[df[self.height_sig] != 0]
+            histogram_cube.add_df_to_histogram(self.histogram_dict[param], df, param)
+        else:
+            self.accuracy_df_list_dict[param].append(df)
 
-        for param, df_list in accuracy_df_list_dict.items():
+    def finalize_measurements(self):
+        """
+        :return: None
+        Method concatenates weighed deltas of all measurements to self.df_obj
+        (sketch dataframes with one row per condition if self.aggregation = 'sketch', saved sketches of earlier runs
+        in const.QUANTILE_SKETCH_MERGE_FOLDERS are merged and the sketches are saved to self.path_report,
+        weighed dataframes with one row per condition and delta if self.aggregation = 'histogram')
+        """
+        if self.aggregation == 'sketch':
+            quantile_sketch.merge_saved_sketches(self.sketch_dict, self.sketch_file)
+            quantile_sketch.save_sketches(self.sketch_dict, self.path_report, self.sketch_file)
+            for param, sketch_dict in self.sketch_dict.items():
+                self.df_obj[param] = quantile_sketch.sketches_to_df(sketch_dict)
+            self.logger.info('get_accuracy_df done (sketches)')
+            return
+        if self.aggregation == 'histogram':
+            for param, histogram_dict in self.histogram_dict.items():
+                self.df_obj[param] = histogram_cube.histogram_to_df(histogram_dict, param)
+            self.logger.info('get_accuracy_df done (histogram)')
+            return
+        for param, df_list in self.accuracy_df_list_dict.items():
             try:
                 self.df_obj[param] = pandas.concat(df_list, ignore_index=True)
             except ValueError as e:
@@ -116,13 +179,16 @@ class AccuracySequence(KpiSequence):
         self.logger.info('get_accuracy_df done')
 
     def get_failed_frames(self):
-        param_pass_dict = {const.DFROW_D_PITCH: 0.3, const.DFROW_D_YAW: 0.3, const.DFROW_D_ROLL: 0.5, const.DFROW_D_HEIGHT: 0.06}
+        param_pass_dict = const.ACCURACY_PASS_THRESHOLDS
         for param in param_pass_dict.keys():
             df_param = self.df_obj[param]
             total_frames = df_param["weight"].sum()
             # failed frames
-            df_failed = df_param[df_param[param] > param_pass_dict[param]]
-            failed_frames = df_failed["weight"].sum()
+            if self.aggregation == 'sketch':
+                failed_frames = df_param["failed weight"].sum()
+            else:
+                df_failed = df_param[df_param[param] > param_pass_dict[param]]
+                failed_frames = df_failed["weight"].sum()
             passed_frames = total_frames - failed_frames
             self.df_failed_frames.loc[param, "TOTAL"] = total_frames
             self.df_failed_frames.loc[param, "PASS"] = passed_frames
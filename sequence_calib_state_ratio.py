@@ -10,7 +10,7 @@ from excel_printer import ExcelPrinter
 import calc_functions as cf
 import pandas
 import const
-import serializer
+import measurement_cache
 from sequence_kpi import KpiSequence
 
 
@@ -21,11 +21,14 @@ class CalibStateRatioSequence(KpiSequence):
 
     def __init__(self, measurement_pickle_list, path_report, report_file_name):
         self.measurement_pickle_list = measurement_pickle_list
+        self.temp_df_list = []
         # del measurement_pickle_list
         self.df_obj = pandas.DataFrame()
         self.current_row = 0
         self.xls = ExcelPrinter(path_report, report_file_name, 'Calibrated state ratio')
         super().__init__(self.df_obj, const.S_PARAMS_PR, [self.xls], function=cf.calc_calib_state_ratio_df)
+        # columns read from measurement dataframes (loaded by MeasurementEngine)
+        self.columns = const.CALIB_STATE_RATIO_INFO + [const.SIG_CLB_C2W_STATE]
         self.logger = logging.getLogger(__name__)
 
     def get_vision_df(self):
@@ -33,34 +36,48 @@ class CalibStateRatioSequence(KpiSequence):
         :return: None
         Method gets dataframe where with SIG_CLB_C2W_STATE value counts
         """
-        temp_df_list = []
         for file in self.measurement_pickle_list:
-            self.logger.info(f'Get ratios dataframe from {file}')
-            # unpickle dictionary to dataframe
-            df = serializer.load_pkl(const.MEASUREMENT_DFS_FOLDER, file)
-            # drop rows where CLB_C2W_STATE is none
-            df = df[pandas.notnull(df[const.SIG_CLB_C2W_STATE])]
-            if df.shape[0] > 0:
-                # get number of occurrences for each value in CLB_C2W_STATE
-                counts = df[const.SIG_CLB_C2W_STATE].value_counts()
-                # if one value didn't occur add it with zero count
-                if const.VAL_C2W_STATE_CALIBRATED not in counts:
-                    counts.at[const.VAL_C2W_STATE_CALIBRATED] = 0
-                if const.VAL_C2W_STATE_UNVALIDATED not in counts:
-                    counts.at[const.VAL_C2W_STATE_UNVALIDATED] = 0
-                if const.VAL_C2W_STATE_SUSPECTED not in counts:
-                    counts.at[const.VAL_C2W_STATE_SUSPECTED] = 0
-                if const.VAL_C2W_STATE_OOR not in counts:
-                    counts.at[const.VAL_C2W_STATE_OOR] = 0
-                # keep only ratios info from first row (df becomes series)
-                df = df.loc[df.index[0]][const.CALIB_STATE_RATIO_INFO]
-                # substitute file name with shorter form
-                df[const.DFROW_LOG_FILE] = file
-                # append counts to df
-                df = df.append(counts)
-                # df back to dataframe, transpose
-                df = df.to_frame().T
-                # append to dataframe list
-                temp_df_list.append(df)
+            df = measurement_cache.load_measurement_df(const.MEASUREMENT_DFS_FOLDER, file, self.columns)
+            self.add_measurement(file, df)
+        self.finalize_measurements()
+
+    def add_measurement(self, file, df):
+        """
+        :param file: measurement file name
+        :param df: measurement dataframe
+        :return: None
+        Method puts SIG_CLB_C2W_STATE value counts of one measurement into self.temp_df_list
+        """
+        self.logger.info(f'Get ratios dataframe from {file}')
+        # drop rows where CLB_C2W_STATE is none
+        df = df[pandas.notnull(df[const.SIG_CLB_C2W_STATE])]
+        if df.shape[0] > 0:
+            # get number of occurrences for each value in CLB_C2W_STATE
+            counts = df[const.SIG_CLB_C2W_STATE].value_counts()
+            # if one value didn't occur add it with zero count
+            if const.VAL_C2W_STATE_CALIBRATED not in counts:
+                counts.at[const.VAL_C2W_STATE_CALIBRATED] = 0
+            if const.VAL_C2W_STATE_UNVALIDATED not in counts:
+                counts.at[const.VAL_C2W_STATE_UNVALIDATED] = 0
+            if const.VAL_C2W_STATE_SUSPECTED not in counts:
+                counts.at[const.VAL_C2W_STATE_SUSPECTED] = 0
+            if const.VAL_C2W_STATE_OOR not in counts:
+                counts.at[const.VAL_C2W_STATE_OOR] = 0
+            # keep only ratios info from first row (df becomes series)
+            df = df.loc[df.index[0]][const.CALIB_STATE_RATIO_INFO]
+            # substitute file name with shorter form
+            df[const.DFROW_LOG_FILE] = file
+            # append counts to df
+            df = df.append(counts)
+            # df back to dataframe, transpose
+            df = df.to_frame().T
+            # append to dataframe list
+            self.temp_df_list.append(df)
+
+    def finalize_measurements(self):
+        """
+        :return: None
+        Method concatenates value counts of all measurements to self.df_obj
+        """
         # concatenate all dataframes from list to one dataframe
-        self.df_obj = pandas.concat(temp_df_list, ignore_index=True, sort=True)
+        self.df_obj = pandas.concat(self.temp_df_list, ignore_index=True, sort=True)
@@ -8,9 +8,15 @@ CALIBRATION
 import sys
 import const
 import logging
+import numpy as np
+import pandas
 import df_filter
 import calc_functions as cf
 
+# calc functions with a grouped form, that calculates all conditions of a dataframe at once
+# (func(dataframe, param, masks) -> list of results, same as func(dataframe[mask], param) of each mask)
+GROUPED_FUNCTIONS = {cf.calc_weighed_percentile_df: cf.calc_weighed_percentile_dfs}
+
 
 class KpiSequence:
     """
@@ -135,210 +141,9 @@ class KpiSequence:
         Function calls the passed calc function for each passed parameter
         Used to generate DS 1-7 of the CAL KPI report
         """
-        # declare list of length equal to the number of parameters passed
-        dict_list = list(range(params.__len__()))
         for param in params:
             self.logger.info(f'param: {param}')
-        try:
-            # Full data
-            for num, param in enumerate(params):
-                self.logger.info(f'Full data: param: {param}')
-                dict_list[num] = {'Full data': func(dataframe, param)}
-            # Day
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY]
-            for num, param in enumerate(params):
-                self.logger.info(f'Day: param: {param}')
-                dict_list[num]['Day'] = func(env_condition_filtered_df, param)
-            # Night
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT]
-            for num, param in enumerate(params):
-                self.logger.info(f'Night: param: {param}')
-                dict_list[num]['Night'] = func(env_condition_filtered_df, param)
-            # # Dusk
-            # env_condition_filtered_df = dataframe[dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DUSK]
-            # for num, param in enumerate(params):
-            #   self.logger.info(f'Dusk: param: {param}')
-            # 	dict_list[num]['Dusk'] = func(env_condition_filtered_df, param)
-            # City
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_ROAD] == const.VAL_ROAD_CITY]
-            for num, param in enumerate(params):
-                self.logger.info(f'City: param: {param}')
-                dict_list[num]['City'] = func(env_condition_filtered_df, param)
-            # Highway
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY]
-            for num, param in enumerate(params):
-                self.logger.info(f'Highway: param: {param}')
-                dict_list[num]['Highway'] = func(env_condition_filtered_df, param)
-            # Rural
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_ROAD] == const.VAL_ROAD_RURAL]
-            for num, param in enumerate(params):
-                self.logger.info(f'Rural: param: {param}')
-                dict_list[num]['Rural'] = func(env_condition_filtered_df, param)
-            # Clear
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR]
-            for num, param in enumerate(params):
-                self.logger.info(f'Clear: param: {param}')
-                dict_list[num]['Clear'] = func(env_condition_filtered_df, param)
-            # # Overcast
-            # env_condition_filtered_df = dataframe[dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_OVERCAST]
-            # for num, param in enumerate(params):
-            #     self.logger.info(f'Overcast: param: {param}')
-            #     dict_list[num]['Overcast'] = func(env_condition_filtered_df, param)
-            # Rain
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN]
-            for num, param in enumerate(params):
-                self.logger.info(f'Rain: param: {param}')
-                dict_list[num]['Rain'] = func(env_condition_filtered_df, param)
-            # Snow
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_SNOW]
-            for num, param in enumerate(params):
-                self.logger.info(f'Snow: param: {param}')
-                dict_list[num]['Snow'] = func(env_condition_filtered_df, param)
-            # Fog
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_FOG]
-            for num, param in enumerate(params):
-                self.logger.info(f'Fog: param: {param}')
-                dict_list[num]['Fog'] = func(env_condition_filtered_df, param)
-
-            # City, Day, Clear
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_CITY) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR)]
-            for num, param in enumerate(params):
-                self.logger.info(f'CityDayClear: param: {param}')
-                dict_list[num]['CityDayClear'] = func(env_condition_filtered_df, param)
-            # Highway, Day, Clear
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR)]
-            for num, param in enumerate(params):
-                self.logger.info(f'HighwayDayClear: param: {param}')
-                dict_list[num]['HighwayDayClear'] = func(env_condition_filtered_df, param)
-            # Rural, Day, Clear
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_RURAL) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR)]
-            for num, param in enumerate(params):
-                self.logger.info(f'RuralDayClear: param: {param}')
-                dict_list[num]['RuralDayClear'] = func(env_condition_filtered_df, param)
-            # City, Night, Clear
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_CITY) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR)]
-            for num, param in enumerate(params):
-                self.logger.info(f'CityNightClear: param: {param}')
-                dict_list[num]['CityNightClear'] = func(env_condition_filtered_df, param)
-            # Highway, Night, Clear
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR)]
-            for num, param in enumerate(params):
-                self.logger.info(f'HighwayNightClear: param: {param}')
-                dict_list[num]['HighwayNightClear'] = func(env_condition_filtered_df, param)
-            # Rural, Night, Clear
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_RURAL) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_NIGHT) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_CLEAR)]
-            for num, param in enumerate(params):
-                self.logger.info(f'RuralNightClear: param: {param}')
-                dict_list[num]['RuralNightClear'] = func(env_condition_filtered_df, param)
-
-            # # City, Day, Overcast
-            # env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_CITY) &
-            #                                       (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-            #                                       (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_OVERCAST)]
-            # for num, param in enumerate(params):
-            #     self.logger.info(f'CityDayOvercast: param: {param}')
-            #     dict_list[num]['CityDayOvercast'] = func(env_condition_filtered_df, param)
-            # # Highway, Day, Overcast
-            # env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY) &
-            #                                       (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-            #                                       (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_OVERCAST)]
-            # for num, param in enumerate(params):
-            #     self.logger.info(f'HighwayDayOvercast: param: {param}')
-            #     dict_list[num]['HighwayDayOvercast'] = func(env_condition_filtered_df, param)
-            # Rural, Day, Overcast
-            # env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_RURAL) &
-            #                                       (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-            #                                       (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_OVERCAST)]
-            # for num, param in enumerate(params):
-            #     self.logger.info(f'RuralDayOvercast: param: {param}')
-            #     dict_list[num]['RuralDayOvercast'] = func(env_condition_filtered_df, param)
-
-            # City, Day, Rain
-            if const.PROJECT_CONFIG == const.CARIAD:
-                daytime = const.VAL_DAYTIME_NIGHT
-            else:
-                daytime = const.VAL_DAYTIME_DAY
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_CITY) &
-                                                  (dataframe[const.DFROW_DAYTIME] == daytime) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN)]
-            for num, param in enumerate(params):
-                self.logger.info(f'CityDayRain: param: {param}')
-                dict_list[num]['CityDayRain'] = func(env_condition_filtered_df, param)
-            # Highway, Day, Rain
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY) &
-                                                  (dataframe[const.DFROW_DAYTIME] == daytime) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN)]
-            for num, param in enumerate(params):
-                self.logger.info(f'HighwayDayRain: param: {param}')
-                dict_list[num]['HighwayDayRain'] = func(env_condition_filtered_df, param)
-            # Rural, Day, Rain
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_RURAL) &
-                                                  (dataframe[const.DFROW_DAYTIME] == daytime) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_RAIN)]
-            for num, param in enumerate(params):
-                self.logger.info(f'RuralDayRain: param: {param}')
-                dict_list[num]['RuralDayRain'] = func(env_condition_filtered_df, param)
-
-            # City, Day, Snow
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_CITY) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_SNOW)]
-            for num, param in enumerate(params):
-                self.logger.info(f'CityDaySnow: param: {param}')
-                dict_list[num]['CityDaySnow'] = func(env_condition_filtered_df, param)
-            # Highway, Day, Snow
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_SNOW)]
-            for num, param in enumerate(params):
-                self.logger.info(f'HighwayDaySnow: param: {param}')
-                dict_list[num]['HighwayDaySnow'] = func(env_condition_filtered_df, param)
-            # Rural, Day, Snow
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_RURAL) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_SNOW)]
-            for num, param in enumerate(params):
-                self.logger.info(f'RuralDaySnow: param: {param}')
-                dict_list[num]['RuralDaySnow'] = func(env_condition_filtered_df, param)
-            # City, Day, Fog
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_CITY) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_FOG)]
-            for num, param in enumerate(params):
-                self.logger.info(f'CityDayFog: param: {param}')
-                dict_list[num]['CityDayFog'] = func(env_condition_filtered_df, param)
-            # Highway, Day, Fog
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_FOG)]
-            for num, param in enumerate(params):
-                self.logger.info(f'HighwayDayFog: param: {param}')
-                dict_list[num]['HighwayDayFog'] = func(env_condition_filtered_df, param)
-            # Rural, Day, Fog
-            env_condition_filtered_df = dataframe[(dataframe[const.DFROW_ROAD] == const.VAL_ROAD_RURAL) &
-                                                  (dataframe[const.DFROW_DAYTIME] == const.VAL_DAYTIME_DAY) &
-                                                  (dataframe[const.DFROW_WEATHER] == const.VAL_WEATHER_FOG)]
-            for num, param in enumerate(params):
-                self.logger.info(f'RuralDayFog: param: {param}')
-                dict_list[num]['RuralDayFog'] = func(env_condition_filtered_df, param)
-
-        except KeyError as e:
-            self.logger.exception(e)
-            raise e
-        else:
-            return dict_list
+        return self.calc_conditions(func, dataframe, params, const.KPI_ALL_CONDITIONS)
 
     def calc_road_cond(self, func, dataframe, params):
         """
@@ -349,30 +154,75 @@ class KpiSequence:
         Function calls the passed calc function for each passed parameter
         Used to generate DS 8-last of the CAL KPI report
         """
-        dict_list = list(range(params.__len__()))
-        try:
-            # Full data
-            for num, param in enumerate(params):
-                self.logger.info(f'Full data: param: {param}')
-                dict_list[num] = {'Full data': func(dataframe, param)}
-            # City
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_ROAD] == const.VAL_ROAD_CITY]
-            for num, param in enumerate(params):
-                self.logger.info(f'City: param: {param}')
-                dict_list[num]['City'] = func(env_condition_filtered_df, param)
-            # Highway
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_ROAD] == const.VAL_ROAD_HIGHWAY]
-            for num, param in enumerate(params):
-                self.logger.info(f'Highway: param: {param}')
-                dict_list[num]['Highway'] = func(env_condition_filtered_df, param)
-            # Rural
-            env_condition_filtered_df = dataframe[dataframe[const.DFROW_ROAD] == const.VAL_ROAD_RURAL]
-            for num, param in enumerate(params):
-                self.logger.info(f'Rural: param: {param}')
-                dict_list[num]['Rural'] = func(env_condition_filtered_df, param)
+        return self.calc_conditions(func, dataframe, params, const.KPI_ROAD_CONDITIONS)
 
+    def calc_conditions(self, func, dataframe, params, conditions):
+        """
+        :param func: function used for calculations
+        :param dataframe: dataframe with data to perform calculations on
+        :param params: dataframe row to perform calculations on
+        :param conditions: table of conditions (name, road, daytime, weather), see const.KPI_ALL_CONDITIONS
+        :return: list of dictionaries with calculated data {condition name: func result}, one per parameter
+        Function gets the rows of all conditions from one grouping of the dataframe, then calls the passed calc
+        function on the rows of each condition (or the grouped function of func on all conditions at once)
+        """
+        names = [condition[0] for condition in conditions]
+        try:
+            masks = self.get_condition_masks(dataframe, conditions)
+            dict_list = []
+            for param in params:
+                self.logger.info(f'{", ".join(names)}: param: {param}')
+                if func in GROUPED_FUNCTIONS:
+                    results = GROUPED_FUNCTIONS[func](dataframe, param, masks)
+                else:
+                    results = [func(dataframe if mask is None else dataframe[mask], param) for mask in masks]
+                dict_list.append(dict(zip(names, results)))
         except KeyError as e:
             self.logger.exception(e)
             raise e
         else:
             return dict_list
+
+    @staticmethod
+    def get_condition_masks(dataframe, conditions):
+        """
+        :param dataframe: dataframe with condition columns
+        :param conditions: table of conditions (name, road, daytime, weather), see const.KPI_ALL_CONDITIONS
+        :return: list of boolean row masks, one per condition (None = all rows)
+        Function groups the rows once on the condition columns (one leaf group per combination of values),
+        the mask of a condition is the union of the leaf groups whose values match the condition
+        """
+        if const.PROJECT_CONFIG == const.CARIAD:
+            rain_daytime = const.VAL_DAYTIME_NIGHT
+        else:
+            rain_daytime = const.VAL_DAYTIME_DAY
+        columns = [const.DFROW_ROAD, const.DFROW_DAYTIME, const.DFROW_WEATHER]
+        any_values = [const.VAL_ROAD_ANY, const.VAL_DAYTIME_ANY, const.VAL_WEATHER_ANY]
+        conditions = [[rain_daytime if value == const.VAL_DAYTIME_RAIN_COND else value for value in condition[1:]]
+                      for condition in conditions]
+        used = [any(condition[i] != any_values[i] for condition in conditions) for i in range(len(columns))]
+        codes_list = []
+        uniques_list = []
+        for column, is_used in zip(columns, used):
+            if is_used:
+                codes, uniques = pandas.factorize(dataframe[column])
+                # code 0 = nan (never equal to a condition value)
+                codes_list.append(codes + 1)
+                uniques_list.append([None] + list(uniques))
+            else:
+                codes_list.append(np.zeros(dataframe.shape[0], dtype=np.int64))
+                uniques_list.append([None])
+        shape = [len(uniques) for uniques in uniques_list]
+        leaf_ids, leaves = pandas.factorize(np.ravel_multi_index(codes_list, shape))
+        leaf_codes = np.unravel_index(leaves, shape)
+        masks = []
+        for condition in conditions:
+            leaf_match = np.ones(len(leaves), dtype=bool)
+            filtered = False
+            for i, value in enumerate(condition):
+                if value != any_values[i]:
+                    filtered = True
+                    value_match = np.array([unique is not None and bool(unique == value) for unique in uniques_list[i]])
+                    leaf_match &= value_match[leaf_codes[i]]
+            masks.append(leaf_match[leaf_ids] if filtered else None)
+        return masks
@@ -7,7 +7,7 @@ CALIBRATION
 """
 import logging
 import pandas
-import serializer
+import measurement_cache
 import const
 import df_filter
 import calc_functions as cf
@@ -24,12 +24,15 @@ class OORCheck(KpiSequence):
 
     def __init__(self, measurement_pickle_list, path_report, report_file_name):
         self.measurement_pickle_list = measurement_pickle_list
+        self.temp_df_list = []
         self.drives_with_oor_counter = 0
         self.oor_info_dict = {'oor_counter': 0, 'oor_distance': 0, 'oor_time': 0}
         self.df_obj = pandas.DataFrame()
         self.clb_c2w_state_oor_df = pandas.DataFrame()
         self.xls = ExcelPrinter(path_report, report_file_name, 'OOR check')
         super().__init__(self.df_obj, const.S_PARAMS_OOR, [self.xls])
+        # columns read from measurement dataframes (loaded by MeasurementEngine)
+        self.columns = const.OOR_INFO
         self.logger = logging.getLogger(__name__)
 
     def get_oor_df(self):
@@ -38,48 +41,61 @@ class OORCheck(KpiSequence):
         Method gets dataframe with OOR data
         """
         self.logger.info(f'OOR Check')
-        temp_df_list = []
         for file in self.measurement_pickle_list:
-            # get measurement dataframe
-            df = serializer.load_pkl(const.MEASUREMENT_DFS_FOLDER, file)
-            # drop rows where CLB_C2W_STATE is none
-            df = df[pandas.notnull(df[const.SIG_CLB_C2W_STATE])]
-            # if dataframe is empty, go to next measurement
-            if df.shape[0] == 0:
-                continue
-            # check if there is an occurrence of OOR in CLB_C2W_State column
-            clb_c2w_status_values = set(df[const.SIG_CLB_C2W_STATE])
-            # keep only columns relevant to OOR
-            df = df[const.OOR_INFO].reset_index(drop=True)
-            # get total distance of measurement
-            total_distance = df[const.DFROW_DISTANCE].iloc[-1]
-            # add column with total distance
-            df['Total Distance'] = [total_distance] * df.shape[0]
-            # if OOR occurred in measurement
-            if const.VAL_C2W_STATE_OOR in clb_c2w_status_values:
-                # get dataframe where CLB_C2W_State = OOR
-                df_oor = df_filter.copy_rows__col_eq_val_df(df, const.SIG_CLB_C2W_STATE, const.VAL_C2W_STATE_OOR)
-                # get dataframe where change to CLB_C2W_State = OOR occurs
-                df_oor = df_filter.copy_rows__index_boundary_val_df(df_oor)
-                # if number of indexes is not even, drop last row
-                if df_oor.shape[0] % 2 != 0:
-                    df_oor = df_oor[:-1]
-                if df_oor.shape[0] > 0:
-                    # get dataframe with delta time and delta distance
-                    df_calc = cf.calc_delta_time_dist_df(df_oor, time_col='OOR Time', dist_col='OOR Distance')
-                    # add to dataframe list
-                    temp_df_list.append(df_calc)
-                    self.drives_with_oor_counter += 1
-                else:
-                    self.logger.warning(f'OOR detected in {file}, but dataframe is empty after filtering')
+            df = measurement_cache.load_measurement_df(const.MEASUREMENT_DFS_FOLDER, file, self.columns)
+            self.add_measurement(file, df)
+        self.finalize_measurements()
+
+    def add_measurement(self, file, df):
+        """
+        :param file: measurement file name
+        :param df: measurement dataframe
+        :return: None
+        Method puts OOR rows of one measurement into self.temp_df_list
+        """
+        # drop rows where CLB_C2W_STATE is none
+        df = df[pandas.notnull(df[const.SIG_CLB_C2W_STATE])]
+        # if dataframe is empty, go to next measurement
+        if df.shape[0] == 0:
+            return
+        # check if there is an occurrence of OOR in CLB_C2W_State column
+        clb_c2w_status_values = set(df[const.SIG_CLB_C2W_STATE])
+        # keep only columns relevant to OOR
+        df = df[const.OOR_INFO].reset_index(drop=True)
+        # get total distance of measurement
+        total_distance = df[const.DFROW_DISTANCE].iloc[-1]
+        # add column with total distance
+        df['Total Distance'] = [total_distance] * df.shape[0]
+        # if OOR occurred in measurement
+        if const.VAL_C2W_STATE_OOR in clb_c2w_status_values:
+            # get dataframe where CLB_C2W_State = OOR
+            df_oor = df_filter.copy_rows__col_eq_val_df(df, const.SIG_CLB_C2W_STATE, const.VAL_C2W_STATE_OOR)
+            # get dataframe where change to CLB_C2W_State = OOR occurs
+            df_oor = df_filter.copy_rows__index_boundary_val_df(df_oor)
+            # if number of indexes is not even, drop last row
+            if df_oor.shape[0] % 2 != 0:
+                df_oor = df_oor[:-1]
+            if df_oor.shape[0] > 0:
+                # get dataframe with delta time and delta distance
+                df_calc = cf.calc_delta_time_dist_df(df_oor, time_col='OOR Time', dist_col='OOR Distance')
+                # add to dataframe list
+                self.temp_df_list.append(df_calc)
+                self.drives_with_oor_counter += 1
             else:
-                # get first row from df
-                df_1st_row = df.iloc[[0]].reset_index(drop=True)
-                df_1st_row[const.DFROW_OOR_TIME] = 0.0
-                df_1st_row[const.DFROW_OOR_DISTANCE] = 0.0
-                temp_df_list.append(df_1st_row)
+                self.logger.warning(f'OOR detected in {file}, but dataframe is empty after filtering')
+        else:
+            # get first row from df
+            df_1st_row = df.iloc[[0]].reset_index(drop=True)
+            df_1st_row[const.DFROW_OOR_TIME] = 0.0
+            df_1st_row[const.DFROW_OOR_DISTANCE] = 0.0
+            self.temp_df_list.append(df_1st_row)
 
-        self.df_obj = pandas.concat(temp_df_list, ignore_index=True).drop(
+    def finalize_measurements(self):
+        """
+        :return: None
+        Method concatenates OOR rows of all measurements and gets OOR info
+        """
+        self.df_obj = pandas.concat(self.temp_df_list, ignore_index=True).drop(
             columns=[const.DFROW_TIMESTAMP, const.DFROW_DISTANCE])
         self.clb_c2w_state_oor_df = df_filter.copy_rows__col_eq_val_df(self.df_obj, const.SIG_CLB_C2W_STATE, const.VAL_C2W_STATE_OOR)
         self.oor_info_dict['oor_counter'] = self.drives_with_oor_counter
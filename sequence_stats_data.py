@@ -30,6 +30,7 @@ class StatsData:
         self.spc_dist_vf_df = pandas.DataFrame()
         self.c2w_time_dist_df = pandas.DataFrame()
         self.ratios_df = pandas.DataFrame()
+        self.two_sigma_by_dict = {}
         self.xls = ExcelPrinter(path_report, report_file_name, '')
         self.logger = logging.getLogger(__name__)
         self.get_stats_dfs()
@@ -115,6 +116,12 @@ class StatsData:
 
         if self.accuracy_af_df_dict:
             self.accuracy_error(self.accuracy_af_df_dict, filter_adcam_default_config=filter_adcam_default_config)
+        elif const.ACCURACY_AGGREGATION != 'frames':
+            # accuracy sketches or histogram have no frames of each measurement
+            not_available = f'not available with ACCURACY_AGGREGATION = {const.ACCURACY_AGGREGATION}'
+            self.logger.warning(f'\'Accuracy error\' {not_available} on {step_info}')
+            self.start_row = self.xls.export_to_excel({'Vision Accuracy': {'Accuracy error': not_available}},
+                                                      self.start_row, None, self.param_val)
         else:
             self.logger.warning(f'accuracy_af_df_dict is empty. Cannot generate \'Accuracy error\' on {step_info}')
         self.start_row += 2
@@ -204,10 +211,19 @@ class StatsData:
         Method to Accuracy error data
         """
         df_dict = accuracy_df_dict.copy()
-        if const.PROJECT_CONFIG == const.ADCAM and filter_adcam_default_config:
+        filter_adcam_default_config = const.PROJECT_CONFIG == const.ADCAM and filter_adcam_default_config
+        if filter_adcam_default_config:
             # filter only (0, 0, 0, default suspension) for ADCAM, else dont filter for CARIAD
             for k in accuracy_df_dict:
                 df_dict[k] = df_filter.copy_rows__bracket_df(accuracy_df_dict[k], 0, 0, 0, const.VAL_SUSP_DEFAULT)
+        if app_mode == 'Vision' and self.filter_param is not None:
+            # 2 sigma weighed of all values of the filter param, calculated once per sheet
+            two_sigma_by_key = (filter_adcam_default_config, self.filter_param)
+            if two_sigma_by_key not in self.two_sigma_by_dict:
+                self.two_sigma_by_dict[two_sigma_by_key] = cf.calc_2sigma_weighed_by(df_dict, self.filter_param)
+            two_sigma_by_dict = self.two_sigma_by_dict[two_sigma_by_key]
+        else:
+            two_sigma_by_dict = None
         # filter for param
         if self.filter_param is not None:
             for k in accuracy_df_dict:
@@ -215,7 +231,7 @@ class StatsData:
         try:
             std_dev_dict = {app_mode + ' Accuracy - standard deviation': cf.calc_accuracy_std_dev(df_dict)}
             if app_mode == 'Vision':
-                two_sigma_dict = {'Vision Accuracy - Percentile 95.5': cf.calc_2sigma_weighed(df_dict)}
+                two_sigma_dict = {'Vision Accuracy - Percentile 95.5': self.get_2sigma_weighed(df_dict, two_sigma_by_dict)}
                 # two_sigma_dict = {'Vision Accuracy - Percentile 95.5': cf.calc_2sigma(df_dict)}
             else:
                 two_sigma_dict = {'SPC Accuracy - Percentile 95.5': cf.calc_2sigma(df_dict)}
@@ -241,6 +257,24 @@ class StatsData:
             self.logger.error('Key Error')
             self.logger.exception(e)
 
+    def get_2sigma_weighed(self, df_dict, two_sigma_by_dict=None):
+        """
+        :param df_dict: dictionary of filtered dataframes {param: dataframe}
+        :param two_sigma_by_dict: 2 sigma weighed of every filter value {param: {filter value: 2 sigma}} or None
+        :return: dictionary {param: 2 sigma weighed}
+        Method takes the 2 sigma weighed of self.param_val from two_sigma_by_dict,
+        calculates it from the filtered dataframe where it is missing
+        """
+        if two_sigma_by_dict is None:
+            return cf.calc_2sigma_weighed(df_dict)
+        two_sigma_dict = {}
+        for param, dataframe in df_dict.items():
+            if self.param_val in two_sigma_by_dict[param]:
+                two_sigma_dict[param] = two_sigma_by_dict[param][self.param_val]
+            else:
+                two_sigma_dict[param] = cf.calc_2sigma_weighed({param: dataframe})[param]
+        return two_sigma_dict
+
     def export_stats_full_data(self):
         """
         :return: None
@@ -10,7 +10,8 @@ from excel_printer import ExcelPrinter
 import calc_functions as cf
 import pandas
 import const
-import serializer
+import measurement_cache
+import quantile_sketch
 from sequence_kpi import KpiSequence
 
 
@@ -21,9 +22,23 @@ class VelocitySequence(KpiSequence):
 
     def __init__(self, measurement_pickle_list, path_report, report_file_name):
         self.measurement_pickle_list = measurement_pickle_list
+        self.temp_df_list = []
         self.df_obj = pandas.DataFrame()
+        # sketches of the weighed velocities per condition {condition: [sketch, weight, failed weight]}
+        self.sketch_dict = {}
+        # velocities are not rounded, histogram aggregation keeps the frames
+        self.aggregation = 'sketch' if const.ACCURACY_AGGREGATION == 'sketch' else 'frames'
+        # sketches are saved in the report folder, and merged with the saved sketches of earlier runs
+        self.path_report = path_report
+        self.sketch_file = 'sketches_velocity'
         self.xls = ExcelPrinter(path_report, report_file_name, 'Velocity Distribution')
-        super().__init__(self.df_obj, const.S_PARAMS_VELOCITY, [self.xls], function=cf.calc_weighed_percentile_df)
+        if self.aggregation == 'sketch':
+            calc_func = quantile_sketch.calc_sketch_percentile_df
+        else:
+            calc_func = cf.calc_weighed_percentile_df
+        super().__init__(self.df_obj, const.S_PARAMS_VELOCITY, [self.xls], function=calc_func)
+        # columns read from measurement dataframes (loaded by MeasurementEngine)
+        self.columns = const.VELOCITY_INFO
         self.logger = logging.getLogger(__name__)
 
     def get_velocity_weighed(self):
@@ -32,35 +47,59 @@ class VelocitySequence(KpiSequence):
         Method gets dataframe with time and distance for CLB_C2W_STATE convergence
         """
         self.logger.info('Get vision time and distance dataframe')
-        temp_df_list = []
         for file in self.measurement_pickle_list:
-            df = serializer.load_pkl(const.MEASUREMENT_DFS_FOLDER, file)
-            try:
-                self.logger.info(f'Getting velocity distribution {file}')
-                # keep only columns relevant to velocity distribution
-                df = df[const.VELOCITY_INFO].reset_index(drop=True)
-                # keep only rows with velocity values
-                df = df[df[const.DFROW_VEHICLE_SPEED].notnull()]
-                # # keep only rows with valid velocity
-                # df = df[df[const.DFROW_VEHICLE_SPEED_V] == const.VAL_VALID]
-                # # drop column veh_speed_valid
-                # df.drop(columns=[const.DFROW_VEHICLE_SPEED_V], inplace=True)
-                # get unique delta values and their weights
-                df_weight = df[const.DFROW_VEHICLE_SPEED].value_counts().to_frame(name='weight').reset_index().rename(columns={'index': const.DFROW_VEHICLE_SPEED})
-                # get dataframe with info columns, same length as df_weight
-                df_info = df.loc[0:len(df_weight)-1, :]
-                # drop column veh_speed
-                df_info.drop(columns=[const.DFROW_VEHICLE_SPEED], inplace=True)
-                # merge info and velocity/weights
-                df_merged = df_info.merge(df_weight, left_index=True, right_index=True)
-                temp_df_list.append(df_merged)
-            except Exception as e:
-                self.logger.error(f'Error while processing {file}')
-                self.logger.exception(e)
-                continue
+            df = measurement_cache.load_measurement_df(const.MEASUREMENT_DFS_FOLDER, file, self.columns)
+            self.add_measurement(file, df)
+        self.finalize_measurements()
+
+    def add_measurement(self, file, df):
+        """
+        :param file: measurement file name
+        :param df: measurement dataframe
+        :return: None
+        Method puts weighed velocities of one measurement into self.temp_df_list
+        """
+        try:
+            self.logger.info(f'Getting velocity distribution {file}')
+            # keep only columns relevant to velocity distribution
+            df = df[const.VELOCITY_INFO].reset_index(drop=True)
+            # keep only rows with velocity values
+            df = df[df[const.DFROW_VEHICLE_SPEED].notnull()]
+            # # keep only rows with valid velocity
+            # df = df[df[const.DFROW_VEHICLE_SPEED_V] == const.VAL_VALID]
+            # # drop column veh_speed_valid
+            # df.drop(columns=[const.DFROW_VEHICLE_SPEED_V], inplace=True)
+            # get unique delta values and their weights
+            df_weight = df[const.DFROW_VEHICLE_SPEED].value_counts().to_frame(name='weight').reset_index().rename(columns={'index': const.DFROW_VEHICLE_SPEED})
+            # get dataframe with info columns, same length as df_weight
+            df_info = df.loc[0:len(df_weight)-1, :]
+            # drop column veh_speed
+            df_info.drop(columns=[const.DFROW_VEHICLE_SPEED], inplace=True)
+            # merge info and velocity/weights
+            df_merged = df_info.merge(df_weight, left_index=True, right_index=True)
+            if self.aggregation == 'sketch':
+                quantile_sketch.add_df_to_sketches(self.sketch_dict, df_merged, const.DFROW_VEHICLE_SPEED)
+            else:
+                self.temp_df_list.append(df_merged)
+        except Exception as e:
+            self.logger.error(f'Error while processing {file}')
+            self.logger.exception(e)
+
+    def finalize_measurements(self):
+        """
+        :return: None
+        Method concatenates weighed velocities of all measurements to self.df_obj
+        (sketch dataframe if self.aggregation = 'sketch', see AccuracySequence.finalize_measurements)
+        """
+        if self.aggregation == 'sketch':
+            sketch_dicts = {const.DFROW_VEHICLE_SPEED: self.sketch_dict}
+            quantile_sketch.merge_saved_sketches(sketch_dicts, self.sketch_file)
+            quantile_sketch.save_sketches(sketch_dicts, self.path_report, self.sketch_file)
+            self.df_obj = quantile_sketch.sketches_to_df(self.sketch_dict)
+            return
         # merge all dataframes from list, and calculate weighed velocities
         try:
-            self.df_obj = pandas.concat(temp_df_list, ignore_index=True)
+            self.df_obj = pandas.concat(self.temp_df_list, ignore_index=True)
         except ValueError as e:
             self.logger.exception(e)
 
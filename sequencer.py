@@ -6,6 +6,8 @@ ADCAM MID
 CALIBRATION
 """
 import logging
+import pandas
+import const
 from measurements import Measurements
 from sequence_accuracy import AccuracySequence
 from sequence_af_dist import AFDistanceSequence
@@ -18,7 +20,9 @@ from sequence_dfs_to_excel import DFsToExcel
 from sequence_not_converged import NotConvergedSequence
 from sequence_velocity import VelocitySequence
 from ave_hw_pose import HighwayPose
+from measurement_engine import MeasurementEngine
 import serializer
+import measurement_cache
 
 
 class Sequencer:
@@ -36,6 +40,7 @@ class Sequencer:
         self.path_gt_data = args_dict['path_gt_data']
         self.gt_id_list = []
         self.sequence_dict = {}
+        self.sequences = {}  # sequences with measurement data from run_measurement_engine, not exported yet
         self.logger = logging.getLogger(__name__)
         self.__me = Measurements(args_dict)
 
@@ -46,7 +51,7 @@ class Sequencer:
         """
         if self.__me.measurement_id_list.size > 0:
             self.logger.info('running test sequences')
-            self.get_measurement_data()
+            self.run_measurement_engine()  # also gets measurement data
             self.run_accuracy_af_cal_sequence()
             self.run_accuracy_af_unv_sequence()
             self.run_accuracy_af_sus_sequence()
@@ -67,13 +72,14 @@ class Sequencer:
         else:
             self.logger.error('No measurement pickles in me.measurement_id_list')
 
-    def get_measurement_ids(self):
+    def get_measurement_ids(self, from_splits=False):
         """
+        :param from_splits: if True, get measurement names from split pickles.xz
         :return: None
         Method calls Measurements class methods to change split pickles to measurement pickles
         """
         self.logger.info('getting dataframe list')
-        self.__me.get_measurement_ids()
+        self.__me.get_measurement_ids(from_splits)
 
     def splits_to_measurements(self):
         """
@@ -83,6 +89,14 @@ class Sequencer:
         self.logger.info('getting dataframe list')
         self.__me.make_measurement_df_pickles()
 
+    def stream_splits_to_measurements(self):
+        """
+        :return: None
+        Method calls Measurements class method to change split pickles.xz directly to measurement pickles
+        """
+        self.logger.info('streaming splits to measurements')
+        self.__me.make_measurement_dfs_from_splits()
+
     def save_dataframes_list(self):
         """
         :return: None
@@ -122,6 +136,37 @@ class Sequencer:
         """
         self.__me.get_measurement_data()
 
+    def run_measurement_engine(self):
+        """
+        :return: None
+        Method makes the sequences that read measurement dataframes and gets their data in one pass over the
+        measurements (each measurement dataframe is loaded once). Measurement data is read from the measurement
+        summary files, or, if a summary is missing, collected in the same pass.
+        The run_..._sequence methods then use these sequences instead of reading the measurements again.
+        """
+        measurement_ids = self.__me.measurement_id_list
+        self.sequences = {'accuracy_af_cal': AccuracySequence(measurement_ids, self.path_report, self.report_file_name),
+                          'accuracy_af_unv': AccuracySequence(measurement_ids, self.path_report, self.report_file_name,
+                                                              calib_sts='Unvalidated'),
+                          'accuracy_af_sus': AccuracySequence(measurement_ids, self.path_report, self.report_file_name,
+                                                              calib_sts='Suspected'),
+                          'time_and_dist_c2w': AFDistanceSequence(measurement_ids, self.path_report, self.report_file_name),
+                          'calib_state_ratio': CalibStateRatioSequence(measurement_ids, self.path_report,
+                                                                       self.report_file_name),
+                          'degrade_cause_ratio': DegradeCauseRatioSequence(measurement_ids, self.path_report,
+                                                                           self.report_file_name),
+                          'oor_check': OORCheck(measurement_ids, self.path_report, self.report_file_name),
+                          'velocity': VelocitySequence(measurement_ids, self.path_report, self.report_file_name)}
+        engine = MeasurementEngine(measurement_ids)
+        if not self.__me.get_measurement_data_from_summaries():
+            engine.register(self.__me)
+        for sequence in self.sequences.values():
+            engine.register(sequence)
+        engine.run()
+        # every measurement was read once, cached dataframes would not be read again
+        self.logger.info(f'Measurement cache: {measurement_cache.cache.stats()}')
+        measurement_cache.cache.clear()
+
     def add_ds_collected_data_info(self):
         """
         :return: None
@@ -137,11 +182,16 @@ class Sequencer:
         # Accuracy Vision Calibrated
         if self.__me.measurement_id_list.size > 0:
             self.logger.info('Accuracy Vision Calibrated sequence start')
-            acc = AccuracySequence(self.__me.measurement_id_list, self.path_report, self.report_file_name)
-            acc.get_accuracy_df()
+            acc = self.sequences.pop('accuracy_af_cal', None)
+            if acc is None:
+                acc = AccuracySequence(self.__me.measurement_id_list, self.path_report, self.report_file_name)
+                acc.get_accuracy_df()
             acc.get_failed_frames()
             acc.export_kpi()
-            self.sequence_dict['accuracy_af_df_dict'] = acc.df_obj
+            if acc.aggregation != 'frames':
+                self.sequence_dict[f'accuracy_af_{acc.aggregation}_df_dict'] = acc.df_obj
+            else:
+                self.sequence_dict['accuracy_af_df_dict'] = acc.df_obj
             self.sequence_dict['accuracy_af_ff_df'] = acc.df_failed_frames
             del acc
         else:
@@ -155,11 +205,16 @@ class Sequencer:
         # Accuracy Vision Unvalidated
         if self.__me.measurement_id_list.size > 0:
             self.logger.info('Accuracy Vision Unvalidated sequence start')
-            acc = AccuracySequence(self.__me.measurement_id_list, self.path_report, self.report_file_name, calib_sts='Unvalidated')
-            acc.get_accuracy_df()
+            acc = self.sequences.pop('accuracy_af_unv', None)
+            if acc is None:
+                acc = AccuracySequence(self.__me.measurement_id_list, self.path_report, self.report_file_name, calib_sts='Unvalidated')
+                acc.get_accuracy_df()
             acc.get_failed_frames()
             acc.export_kpi()
-            self.sequence_dict['accuracy_af_uv_df_dict'] = acc.df_obj
+            if acc.aggregation != 'frames':
+                self.sequence_dict[f'accuracy_af_uv_{acc.aggregation}_df_dict'] = acc.df_obj
+            else:
+                self.sequence_dict['accuracy_af_uv_df_dict'] = acc.df_obj
             self.sequence_dict['accuracy_af_uv_ff_df'] = acc.df_failed_frames
             del acc
         else:
@@ -173,11 +228,16 @@ class Sequencer:
         # Accuracy Vision Unvalidated
         if self.__me.measurement_id_list.size > 0:
             self.logger.info('Accuracy Vision Suspected sequence start')
-            acc = AccuracySequence(self.__me.measurement_id_list, self.path_report, self.report_file_name, calib_sts='Suspected')
-            acc.get_accuracy_df()
+            acc = self.sequences.pop('accuracy_af_sus', None)
+            if acc is None:
+                acc = AccuracySequence(self.__me.measurement_id_list, self.path_report, self.report_file_name, calib_sts='Suspected')
+                acc.get_accuracy_df()
             acc.get_failed_frames()
             acc.export_kpi()
-            self.sequence_dict['accuracy_af_sp_df_dict'] = acc.df_obj
+            if acc.aggregation != 'frames':
+                self.sequence_dict[f'accuracy_af_sp_{acc.aggregation}_df_dict'] = acc.df_obj
+            else:
+                self.sequence_dict['accuracy_af_sp_df_dict'] = acc.df_obj
             self.sequence_dict['accuracy_af_sp_ff_df'] = acc.df_failed_frames
             del acc
         else:
@@ -191,8 +251,10 @@ class Sequencer:
         # Time and distance to C2W
         if self.__me.measurement_id_list.size > 0:
             self.logger.info('Time and distance to C2W sequence start')
-            c2w = AFDistanceSequence(self.__me.measurement_id_list, self.path_report, self.report_file_name)
-            c2w.get_c2w_time_and_dist_df()
+            c2w = self.sequences.pop('time_and_dist_c2w', None)
+            if c2w is None:
+                c2w = AFDistanceSequence(self.__me.measurement_id_list, self.path_report, self.report_file_name)
+                c2w.get_c2w_time_and_dist_df()
             c2w.export_kpi()
             self.sequence_dict['c2w_time_dist_df'] = c2w.af_time_dist_df
             self.sequence_dict['c2w_not_conv_df'] = c2w.not_convereged_df
@@ -211,8 +273,10 @@ class Sequencer:
         # Calibration State Ratio
         if self.__me.measurement_id_list.size > 0:
             self.logger.info('Calibration State Ratio sequence start')
-            csr = CalibStateRatioSequence(self.__me.measurement_id_list, self.path_report, self.report_file_name)
-            csr.get_vision_df()
+            csr = self.sequences.pop('calib_state_ratio', None)
+            if csr is None:
+                csr = CalibStateRatioSequence(self.__me.measurement_id_list, self.path_report, self.report_file_name)
+                csr.get_vision_df()
             csr.export_kpi()
             self.sequence_dict['ratios_df'] = csr.df_obj
             del csr
@@ -227,8 +291,10 @@ class Sequencer:
         # Degrade Cause Ratio
         if self.__me.measurement_id_list.size > 0:
             self.logger.info('Degrade Cause Ratio sequence start')
-            dcr = DegradeCauseRatioSequence(self.__me.measurement_id_list, self.path_report, self.report_file_name)
-            dcr.get_vision_df()
+            dcr = self.sequences.pop('degrade_cause_ratio', None)
+            if dcr is None:
+                dcr = DegradeCauseRatioSequence(self.__me.measurement_id_list, self.path_report, self.report_file_name)
+                dcr.get_vision_df()
             dcr.export_kpi()
             self.sequence_dict['dc_ratios_df'] = dcr.df_obj
             serializer.save_pkl(self.sequence_dict, self.pkl_dict_folder, 'sequence_dict')  # temp, for tests only
@@ -241,8 +307,10 @@ class Sequencer:
         :return: None
         Method manages the OOR check
         """
-        oor = OORCheck(self.__me.measurement_id_list, self.path_report, self.report_file_name)
-        oor.get_oor_df()
+        oor = self.sequences.pop('oor_check', None)
+        if oor is None:
+            oor = OORCheck(self.__me.measurement_id_list, self.path_report, self.report_file_name)
+            oor.get_oor_df()
         oor.export_kpi()
         self.sequence_dict['clb_c2w_state_oor_df'] = oor.clb_c2w_state_oor_df
         self.__me.oor_info_dict = oor.oor_info_dict
@@ -252,10 +320,15 @@ class Sequencer:
         :return: None
         Method manages the generation of the 'Velocity Distribution' sheet in kpi report
         """
-        vel = VelocitySequence(self.__me.measurement_id_list, self.path_report, self.report_file_name)
-        vel.get_velocity_weighed()
+        vel = self.sequences.pop('velocity', None)
+        if vel is None:
+            vel = VelocitySequence(self.__me.measurement_id_list, self.path_report, self.report_file_name)
+            vel.get_velocity_weighed()
         vel.export_kpi()
-        self.sequence_dict['velocity_df'] = vel.df_obj
+        if vel.aggregation == 'sketch':
+            self.sequence_dict['velocity_sketch_df'] = vel.df_obj
+        else:
+            self.sequence_dict['velocity_df'] = vel.df_obj
 
     def run_stats_sequence(self):
         """
@@ -307,6 +380,12 @@ class Sequencer:
             self.logger.error('No dataframes in sequence_df_dict')
 
     def get_gt_hw_data(self):
+        if 'accuracy_af_df_dict' not in self.sequence_dict:
+            # accuracy sketches or histogram (const.ACCURACY_AGGREGATION) have no frames to average
+            not_available = f'not available with ACCURACY_AGGREGATION = {const.ACCURACY_AGGREGATION}'
+            self.logger.warning(f'highway pose {not_available}')
+            self.sequence_dict['hw_ave_pose_df'] = pandas.DataFrame({'Highway pose': [not_available]})
+            return
         hw_data = HighwayPose(self.sequence_dict['accuracy_af_df_dict'], self.gt_id_list)
         hw_data.get_ave_hw_pose()
         self.sequence_dict['hw_ave_pose_df'] = hw_data.ave_hw_pose_df
@@ -326,5 +405,6 @@ class Sequencer:
         self.logger.info(f'Input to VBA macro: gt_id_count = {gt_id_count}')
         self.logger.info(f'Input to VBA macro: tr_raw_name = {self.report_file_name}')
         self.logger.info(f'input to VBA macro: Path = {self.path_report}')
+        self.logger.info(f'Measurement cache: {measurement_cache.cache.stats()}')
         self.logger.info('Script done')
 
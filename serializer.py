@@ -11,16 +11,19 @@ import logging
 import re
 import lzma
 import os
+import numpy as np
+import pandas
 
 logger = logging.getLogger(__name__)
 
 
-def save_pkl(obj, path, file):
+def save_pkl(obj, path, file, atomic=False):
     """
     Save object to pickle
     :param obj: object to be serialized
     :param path: path to folder
     :param file: file name
+    :param atomic: write to a temporary file first and replace the target, so the pickle is never left half written
     :return:
     """
     logger.info(f'saving pickle: {file}')
@@ -29,8 +32,11 @@ def save_pkl(obj, path, file):
 
     try:
         path_file = os.path.join(path, file)
-        with open(path_file, 'wb+') as f:
+        path_file_write = path_file + '.tmp' if atomic else path_file
+        with open(path_file_write, 'wb+') as f:
             pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+        if atomic:
+            os.replace(path_file_write, path_file)
     except (FileNotFoundError, PermissionError, UnicodeDecodeError) as e:
         logger.error(f'failed to save pickle: {file}')
         logger.exception(e)
@@ -65,12 +71,233 @@ def load_pkl(path, file):
             raise e
 
 
-def save_json(obj, path, file=None):
+def save_npz(obj, path, file):
+    """
+    Save dictionary of signal dictionaries (split_dict) to uncompressed npz, one typed array per signal
+    Array names are 'dict_name/signal_name'. '__meta__' is a json string with the dictionary names (empty
+    dictionaries are kept) and the values that are not typed arrays (nested dictionaries, object arrays), so the
+    file is loaded without pickle
+    :param obj: dictionary of dictionaries of lists or arrays
+    :param path: path to folder
+    :param file: file name
+    :return:
+    """
+    logger.info(f'saving npz: {file}')
+    if not file.endswith('.npz'):
+        file += '.npz'
+    meta = {'dicts': list(obj.keys()), 'values': {}}
+    arrays = {}
+    for dict_name, signal_dict in obj.items():
+        if not isinstance(signal_dict, dict):
+            meta['values'][dict_name] = signal_dict
+            continue
+        for signal_name, values in signal_dict.items():
+            array = npz_array(values)
+            if array is None:
+                meta['values'].setdefault(dict_name, {})[signal_name] = values
+            else:
+                arrays[f'{dict_name}/{signal_name}'] = array
+    arrays['__meta__'] = np.array(json.dumps(meta, default=json_default))
+    try:
+        path_file = os.path.join(path, file)
+        with open(path_file, 'wb+') as f:
+            np.savez(f, **arrays)
+    except (FileNotFoundError, PermissionError) as e:
+        logger.error(f'failed to save npz: {file}')
+        logger.exception(e)
+
+
+def load_npz(path, file):
+    """
+    Load dictionary of signal dictionaries saved with save_npz
+    Numeric signals are read straight into typed arrays, without per-element conversion, lists of the json
+    metadata are returned as object arrays
+    :param path: path to folder
+    :param file: npz file name
+    :return: dictionary of dictionaries of numpy arrays
+    """
+    logger.info(f'loading npz: {file}')
+    if not file.endswith('.npz'):
+        file += '.npz'
+    path_file = os.path.join(path, file)
+    try:
+        with np.load(path_file) as npz:
+            meta = json.loads(str(npz['__meta__']))
+            obj = {dict_name: {} for dict_name in meta['dicts']}
+            for name in npz.files:
+                if name == '__meta__':
+                    continue
+                dict_name, signal_name = name.split('/', 1)
+                obj[dict_name][signal_name] = npz[name]
+    except (FileNotFoundError, PermissionError) as e:
+        logger.error(f'failed to load npz: {file}')
+        logger.exception(e)
+        raise e
+    for dict_name, values in meta['values'].items():
+        if isinstance(obj[dict_name], dict) and isinstance(values, dict):
+            for signal_name, signal_values in values.items():
+                obj[dict_name][signal_name] = from_json_list(signal_values)
+        else:
+            obj[dict_name] = from_json_list(values)
+    return obj
+
+
+def npz_array(values):
+    """
+    :param values: signal values (list or array)
+    :return: typed array of the values, None if the values are only stored as objects (nested dictionaries,
+             strings mixed with numbers, ragged lists)
+    """
+    if isinstance(values, dict):
+        return None
+    try:
+        array = np.asarray(values)
+    except ValueError:
+        return None
+    if array.dtype == object:
+        # lists with None (missing values) become float with nan, same as in pandas.DataFrame(dict)
+        try:
+            array = np.asarray(values, dtype=float)
+        except (TypeError, ValueError):
+            return None
+    return array
+
+
+def json_default(value):
+    """
+    :param value: value json can not serialize
+    :return: json serializable value (numpy arrays as lists, numpy scalars as python scalars)
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def from_json_list(value):
+    """
+    :param value: value of the json metadata
+    :return: lists as one dimensional object arrays (same as the object arrays saved with pickle), other values
+             as they are
+    """
+    if not isinstance(value, list):
+        return value
+    array = np.empty(len(value), dtype=object)
+    for idx, item in enumerate(value):
+        array[idx] = item
+    return array
+
+
+def save_npz_df(df, path, file, rle_ratio=0):
+    """
+    Save dataframe to uncompressed npz, one array per column, so that a subset of columns can be loaded
+    Array names are 'c0', 'c1', ... in column order, '__columns__' holds the column names,
+    '__dtypes__' the column dtypes and '__index__' the index. Categorical columns are saved as codes ('c0')
+    and categories ('c0_categories'). Columns with few runs of equal values are saved run-length encoded, as run
+    values ('c0_runs') and run lengths ('c0_run_lengths').
+    :param df: dataframe
+    :param path: path to folder
+    :param file: file name
+    :param rle_ratio: run-length encode numeric columns with at most rle_ratio runs per row (0 = no encoding)
+    :return:
+    """
+    logger.info(f'saving npz: {file}')
+    if not file.endswith('.npz'):
+        file += '.npz'
+    arrays = {'__columns__': np.array(list(df.columns), dtype=object),
+              '__dtypes__': np.array([str(dtype) for dtype in df.dtypes], dtype=str),
+              '__index__': df.index.to_numpy()}
+    for idx, column in enumerate(df.columns):
+        if isinstance(df[column].dtype, pandas.CategoricalDtype):
+            values = df[column].cat.codes.to_numpy()
+            arrays[f'c{idx}_categories'] = df[column].cat.categories.to_numpy()
+        else:
+            values = df[column].to_numpy()
+        runs = rle_encode(values) if rle_ratio > 0 else None
+        if runs is not None and runs[0].shape[0] <= rle_ratio * values.shape[0]:
+            arrays[f'c{idx}_runs'], arrays[f'c{idx}_run_lengths'] = runs
+        else:
+            arrays[f'c{idx}'] = values
+    try:
+        path_file = os.path.join(path, file)
+        with open(path_file, 'wb+') as f:
+            np.savez(f, **arrays)
+    except (FileNotFoundError, PermissionError) as e:
+        logger.error(f'failed to save npz: {file}')
+        logger.exception(e)
+
+
+def rle_encode(values):
+    """
+    Run-length encode a numeric array (nan values are equal)
+    :param values: numpy array
+    :return: (run values, run lengths), None if the array is not numeric or empty
+    """
+    if values.dtype.kind not in 'biuf' or values.shape[0] == 0:
+        return None
+    change = values[1:] != values[:-1]
+    if values.dtype.kind == 'f':
+        change &= ~(np.isnan(values[1:]) & np.isnan(values[:-1]))
+    starts = np.flatnonzero(np.concatenate(([True], change)))
+    return values[starts], np.diff(np.append(starts, values.shape[0]))
+
+
+def load_npz_df(path, file, columns=None):
+    """
+    Load dataframe saved with save_npz_df
+    Only the arrays of the requested columns are read from the file, run-length encoded columns are expanded
+    :param path: path to folder
+    :param file: npz file name
+    :param columns: list of column names to load (None = all columns), columns not in the file are skipped.
+    Columns keep the order they have in the file
+    :return: dataframe
+    """
+    logger.info(f'loading npz: {file}')
+    if not file.endswith('.npz'):
+        file += '.npz'
+    path_file = os.path.join(path, file)
+    try:
+        with np.load(path_file, allow_pickle=True) as npz:
+            all_columns = list(npz['__columns__'])
+            dtypes = npz['__dtypes__']
+            index = npz['__index__']
+            array_names = set(npz.files)
+            wanted = set(all_columns) if columns is None else set(columns)
+            data = {}
+            for idx, column in enumerate(all_columns):
+                if column not in wanted:
+                    continue
+                if f'c{idx}' in array_names:
+                    values = npz[f'c{idx}']
+                else:
+                    values = np.repeat(npz[f'c{idx}_runs'], npz[f'c{idx}_run_lengths'])
+                if dtypes[idx] == 'category':
+                    data[column] = pandas.Series(pandas.Categorical.from_codes(values, npz[f'c{idx}_categories']))
+                    continue
+                series = pandas.Series(values, copy=False)
+                if str(series.dtype) != dtypes[idx]:
+                    # extension dtypes (e.g. string) are saved as object arrays
+                    series = series.astype(dtypes[idx])
+                data[column] = series
+    except (FileNotFoundError, PermissionError) as e:
+        logger.error(f'failed to load npz: {file}')
+        logger.exception(e)
+        raise e
+    df = pandas.DataFrame(data, columns=[column for column in all_columns if column in data],
+                          index=pandas.RangeIndex(len(index)))
+    if not np.array_equal(index, np.arange(len(index))):
+        df.index = pandas.Index(index)
+    return df
+
+
+def save_json(obj, path, file=None, atomic=False):
     """
     Save object to json
     :param obj: object to be serialized
     :param path: path to folder
     :param file: file name
+    :param atomic: write to a temporary file first and replace the target, so the json is never left half written
     :return:
     """
     logger.info(f'saving json: {file}')
@@ -80,8 +307,14 @@ def save_json(obj, path, file=None):
     else:
         path_file = path
     try:
-        with open(path_file, 'w') as f:
-            json.dump(obj, f, indent=2)
+        if atomic:
+            path_file_tmp = path_file + '.tmp'
+            with open(path_file_tmp, 'w') as f:
+                json.dump(obj, f, indent=2)
+            os.replace(path_file_tmp, path_file)
+        else:
+            with open(path_file, 'w') as f:
+                json.dump(obj, f, indent=2)
     except (FileNotFoundError, PermissionError, UnicodeDecodeError) as e:
         logger.error(f'failed to save json: {file}')
         logger.exception(e)
@@ -1,6 +1,8 @@
 import unittest
 import calc_functions as cf
 import pandas as pd
+import numpy as np
+import math
 
 df1 = pd.DataFrame({'value': [1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 'weight': [1, 1, 1, 1, 1, 1, 1, 1, 1, 1]})
 
@@ -80,5 +82,195 @@ class TestWeighedQuantile(unittest.TestCase):
         self.assertRaises(KeyError)
 
 
+def weighed_percentile_loop(df, nth_q, interpolation='linear'):
+    """
+    Reference implementation of weighted percentile (steps through the rank one weight unit at a time)
+    """
+    df = df[pd.notnull(df[df.columns[0]])]
+    df = df.sort_values(df.columns[0]).reset_index(drop=True)
+    if 0 in df[df.columns[1]]:
+        df = df[df[df.columns[1]] != 0]
+    data = np.array(df[df.columns[0]])
+    weights = np.array(df[df.columns[1]])
+    if nth_q <= 0:
+        return data[0]
+    if nth_q >= 1:
+        return data[-1]
+    rank = (nth_q * (weights.sum() - 1)) + 1
+    rank_int_part = int(rank)
+    if rank_int_part < 1:
+        # the loop below finds no value
+        return None
+    rank_frac_part = rank % rank_int_part
+    data_iterator = 0
+    step = 0
+    while step < rank_int_part:
+        weight = int(weights[data_iterator])
+        for weight_iterator in range(weight):
+            step += 1
+            if step >= rank_int_part:
+                if weight_iterator == weight - 1 and data_iterator < weights.size - 1:
+                    if interpolation == 'linear':
+                        return data[data_iterator] + (rank_frac_part * (data[data_iterator + 1] - data[data_iterator]))
+                    elif interpolation == 'higher':
+                        return data[data_iterator + 1]
+                    elif interpolation == 'midpoint':
+                        return (data[data_iterator] + data[data_iterator + 1]) / 2
+                    elif interpolation == 'nearest':
+                        return data[data_iterator] if rank_frac_part < 0.5 else data[data_iterator + 1]
+                    elif interpolation == 'lower':
+                        return data[data_iterator]
+                    else:
+                        raise ValueError("interpolation can only be 'linear','higher','midpoint','nearest', or 'lower'")
+                else:
+                    return data[data_iterator]
+        data_iterator += 1
+
+
+class TestWeighedPercentileRandom(unittest.TestCase):
+    """
+    Test calc_functions.weighed_percentile against the step by step implementation on random data
+    """
+
+    def test_weighed_percentile_random(self):
+        rng = np.random.default_rng(0)
+        for i in range(2000):
+            size = int(rng.integers(1, 12))
+            # repeated values, nan values, zero and fractional weights
+            values = rng.choice([1.0, 2.0, 2.5, 3.0, -1.0, np.nan, 7.25], size)
+            if rng.random() < 0.7:
+                weights = rng.integers(0, 5, size)
+            else:
+                weights = rng.choice([0.0, 0.5, 1.0, 1.7, 3.0], size)
+            df = pd.DataFrame({'value': values, 'weight': weights})
+            if df['value'].notnull().sum() == 0:
+                continue
+            nth_q = float(rng.choice([0, 1, 0.25, 0.5, 0.95, rng.random()]))
+            interpolation = str(rng.choice(['linear', 'higher', 'midpoint', 'nearest', 'lower']))
+            try:
+                expected = weighed_percentile_loop(df, nth_q, interpolation)
+            except IndexError:
+                self.assertRaises(IndexError, cf.weighed_percentile, df, nth_q, interpolation)
+                continue
+            result = cf.weighed_percentile(df, nth_q, interpolation)
+            if expected is None or np.isnan(expected):
+                self.assertTrue(result is None or np.isnan(result))
+            else:
+                self.assertEqual(expected, result)
+
+
+    def test_weighed_percentile_no_rank(self):
+        # sum of weights < 1: no rank between min and max
+        df = pd.DataFrame({'value': [2.0, 1.0], 'weight': [0.25, 0.5]})
+        self.assertIsNone(cf.weighed_percentile(df, 0.5))
+        self.assertEqual(cf.weighed_percentiles(df, [0, 0.5, 1]), [1.0, None, 2.0])
+
+    def test_weighed_percentiles_random(self):
+        rng = np.random.default_rng(1)
+        nth_q_list = [0, 0.25, 0.5, 0.75, 0.90, 0.95, 0.98, 0.99, 1]
+        for i in range(500):
+            size = int(rng.integers(1, 30))
+            df = pd.DataFrame({'value': rng.normal(size=size).round(1), 'weight': rng.integers(0, 20, size)})
+            df.loc[0, 'weight'] = 1
+            expected = [weighed_percentile_loop(df, nth_q) for nth_q in nth_q_list]
+            self.assertEqual(expected, cf.weighed_percentiles(df, nth_q_list))
+
+
+class TestGroupedWeighedPercentiles(unittest.TestCase):
+    """
+    Test calc_functions.grouped_weighed_percentiles against calc_functions.weighed_percentiles of each group
+    """
+
+    def test_grouped_weighed_percentiles_random(self):
+        rng = np.random.default_rng(2)
+        nth_q_list = [0, 0.25, 0.5, 0.95, 0.99, 1, float(rng.random())]
+        for i in range(300):
+            size = int(rng.integers(0, 40))
+            n_groups = int(rng.integers(1, 6))
+            values = rng.choice([1.0, 2.0, 2.5, 3.0, -1.0, np.nan, 7.25, 0.001], size)
+            if rng.random() < 0.7:
+                weights = rng.integers(0, 5, size)
+            else:
+                weights = rng.choice([0.0, 0.5, 1.0, 1.5, 3.0], size)
+            group_ids = rng.integers(-1, n_groups, size)
+            interpolation = str(rng.choice(['linear', 'higher', 'midpoint', 'nearest', 'lower']))
+            expected = []
+            for group in range(n_groups):
+                df = pd.DataFrame({'value': values[group_ids == group], 'weight': weights[group_ids == group]})
+                if (df['weight'][df['value'].notnull()] == 0).all():
+                    expected.append([np.nan] * len(nth_q_list))
+                    continue
+                try:
+                    percentiles = cf.weighed_percentiles(df, nth_q_list, interpolation)
+                except IndexError:
+                    expected = None
+                    break
+                expected.append([np.nan if value is None else value for value in percentiles])
+            if expected is None:
+                self.assertRaises(IndexError, cf.grouped_weighed_percentiles, values, weights, group_ids, nth_q_list,
+                                  interpolation, n_groups)
+            else:
+                result = cf.grouped_weighed_percentiles(values, weights, group_ids, nth_q_list, interpolation, n_groups)
+                np.testing.assert_array_equal(np.array(expected, dtype=float).reshape(n_groups, -1), result)
+
+    def test_calc_2sigma_weighed_by(self):
+        df = pd.DataFrame({'D_Pitch': [0.1, 0.3, 0.2, 0.5, 0.4, np.nan],
+                           'weight': [3, 1, 2, 1, 0, 1],
+                           'ROAD': ['City', 'Highway', 'City', 'Highway', 'Rural', 'Rural']})
+        result = cf.calc_2sigma_weighed_by({'D_Pitch': df}, 'ROAD')
+        for road in ['City', 'Highway']:
+            expected = cf.calc_2sigma_weighed({'D_Pitch': df[df['ROAD'] == road]})
+            self.assertEqual(expected['D_Pitch'], result['D_Pitch'][road])
+        self.assertNotIn('Rural', result['D_Pitch'])
+
+
+def driven_distance_loop(time_stamp, veh_speed):
+    """
+    Reference implementation of driven distance (row by row)
+    """
+    distance = [0]
+    last_valid_dist = 0
+    for i in range(1, len(time_stamp)):
+        v_mean = (veh_speed[i] + veh_speed[i - 1]) / 2
+        dist = ((time_stamp[i] - time_stamp[i - 1]) * (v_mean / 3600)) + distance[i - 1]
+        if not math.isnan(dist):
+            last_valid_dist = dist
+        distance.append(last_valid_dist)
+    return distance
+
+
+class TestDrivenDistance(unittest.TestCase):
+    """
+    Test calc_functions.calc_driven_distance against row by row integration
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.time_stamp = np.cumsum(rng.uniform(0.05, 0.15, 1000))
+        self.veh_speed = rng.uniform(0, 130, 1000)
+        self.veh_speed[rng.choice(1000, 100, replace=False)] = np.nan
+        self.veh_speed[500:550] = np.nan
+        self.time_stamp[700] = np.nan
+
+    def test_calc_driven_distance(self):
+        expected = driven_distance_loop(self.time_stamp, self.veh_speed)
+        result = cf.calc_driven_distance(self.time_stamp, self.veh_speed)
+        self.assertEqual(expected, list(result))
+
+    def test_calc_driven_distance_splits(self):
+        expected = driven_distance_loop(self.time_stamp, self.veh_speed)
+        result = []
+        last_row = None
+        for start, end in ((0, 1), (1, 333), (333, 333), (333, 600), (600, 1000)):
+            if last_row is None:
+                distance = cf.calc_driven_distance(self.time_stamp[start:end], self.veh_speed[start:end])
+            else:
+                distance = cf.calc_driven_distance(self.time_stamp[start:end], self.veh_speed[start:end], *last_row)
+            result += list(distance)
+            if end > start:
+                last_row = (distance[-1], self.time_stamp[end - 1], self.veh_speed[end - 1])
+        self.assertEqual(expected, result)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from unittest import mock
+import const
+import df_filter
+import pandas as pd
+import numpy as np
+
+
+def random_condition_df(rng, rows):
+    """
+    Make a dataframe with bracket and drive scenario object columns
+    """
+    data = {'timestamp': np.arange(rows) * 0.05,
+            const.DFROW_BR_PITCH: rng.choice([0.0, 3.5], rows),
+            const.DFROW_BR_YAW: rng.choice([0.0, -2.0], rows),
+            const.DFROW_BR_ROLL: np.zeros(rows),
+            const.DFROW_SUSPENSION: rng.choice(['default', 'high'], rows),
+            const.DFROW_ROAD: rng.choice([const.VAL_ROAD_HIGHWAY, const.VAL_ROAD_CITY], rows),
+            const.DFROW_WEATHER: rng.choice(['sunny', 'rain'], rows),
+            const.DFROW_DAYTIME: rng.choice(['day', 'night'], rows)}
+    for column in list(data)[1:]:
+        data[column] = np.array(list(data[column]), dtype=object)
+    return pd.DataFrame(data)
+
+
+class TestCategoricalFilters(unittest.TestCase):
+    """
+    Test df_filter filters on categorical condition columns against the same filters on object columns
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.df_object = random_condition_df(rng, 50)
+        self.df_categorical = self.df_object.astype({column: 'category' for column in self.df_object.columns[1:]})
+
+    def test_copy_rows__bracket_df(self):
+        for values in [(0.0, 0.0, 0.0, 'default'), (3.5, -2.0, 0, 'high'), (1.0, 0.0, 0.0, 'default'),
+                       ('x', 0.0, 0.0, 'default'), (3.5, 0.0, 0.0, np.nan)]:
+            expected = df_filter.copy_rows__bracket_df(self.df_object, *values)
+            with mock.patch.object(pd.Categorical, '__array__', side_effect=AssertionError('categorical expanded')):
+                result = df_filter.copy_rows__bracket_df(self.df_categorical, *values)
+            self.assertEqual(expected.index.tolist(), result.index.tolist())
+
+    def test_copy_rows__cariad_ds_df(self):
+        for values in [(const.VAL_ROAD_ANY, const.VAL_WEATHER_ANY, const.VAL_DAYTIME_ANY, const.VAL_SUSP_ANY),
+                       (const.VAL_ROAD_HIGHWAY, const.VAL_WEATHER_ANY, 'night', const.VAL_SUSP_ANY),
+                       (const.VAL_ROAD_CITY, 'rain', 'day', 'high'),
+                       (const.VAL_ROAD_RURAL, const.VAL_WEATHER_ANY, const.VAL_DAYTIME_ANY, const.VAL_SUSP_ANY)]:
+            expected = df_filter.copy_rows__cariad_ds_df(self.df_object, *values)
+            with mock.patch.object(pd.Categorical, '__array__', side_effect=AssertionError('categorical expanded')):
+                result = df_filter.copy_rows__cariad_ds_df(self.df_categorical, *values)
+            self.assertEqual(expected.index.tolist(), result.index.tolist())
+
+    def test_copy_rows__col_eq_val_df(self):
+        with mock.patch.object(pd.Categorical, '__array__', side_effect=AssertionError('categorical expanded')):
+            result = df_filter.copy_rows__col_eq_val_df(self.df_categorical, const.DFROW_WEATHER, 'rain')
+        self.assertEqual(df_filter.copy_rows__col_eq_val_df(self.df_object, const.DFROW_WEATHER, 'rain').index.tolist(),
+                         result.index.tolist())
+        self.assertIsInstance(result[const.DFROW_WEATHER].dtype, pd.CategoricalDtype)
+
+
+if __name__ == '__main__':
+    unittest.main()
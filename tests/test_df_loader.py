@@ -0,0 +1,321 @@
+import math
+import os
+import tempfile
+import unittest
+from unittest import mock
+import xlwt
+import const
+import df_loader
+import pandas as pd
+import numpy as np
+
+
+def random_split_dfs(rng, column_names):
+    """
+    Make a list of split dataframes with random columns, dtypes and lengths (some empty)
+    """
+    df_list = []
+    for split in range(rng.integers(1, 5)):
+        rows = int(rng.choice([0, 1, 5, 20]))
+        columns = rng.choice(column_names, size=rng.integers(1, len(column_names) + 1), replace=False)
+        data = {}
+        for column in columns:
+            kind = rng.choice(['float', 'float_nan', 'int', 'object'])
+            if kind == 'float':
+                data[column] = rng.normal(size=rows)
+            elif kind == 'float_nan':
+                values = rng.normal(size=rows)
+                values[::3] = np.nan
+                data[column] = values
+            elif kind == 'int':
+                data[column] = rng.integers(0, 5, rows)
+            else:
+                data[column] = np.array([['a', None, 1.5][i % 3] for i in range(rows)], dtype=object)
+        df_list.append(pd.DataFrame(data))
+    return df_list
+
+
+def random_stream_df(rng, name, rows):
+    """
+    Make a random timestamped stream dataframe, timestamps with random start, end and cycle jitter
+    """
+    start = rng.choice([0.0, 0.05, 0.5, 2.0])
+    timestamp = start + np.cumsum(rng.choice([0.033, 0.066, 0.1, 0.0], size=rows))
+    data = {'timestamp': timestamp}
+    kind = rng.choice(['float', 'int', 'bool', 'object'])
+    if kind == 'float':
+        data[name] = rng.normal(size=rows)
+    elif kind == 'int':
+        data[name] = rng.integers(0, 5, rows)
+    elif kind == 'bool':
+        data[name] = rng.integers(0, 2, rows).astype(bool)
+    else:
+        data[name] = [['a', None, 1.5][i % 3] for i in range(rows)]
+    return pd.DataFrame(data)
+
+
+def decode_categoricals(df):
+    """
+    Copy of df with categorical columns as object columns
+    """
+    return df.astype({column: object for column, dtype in df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)})
+
+
+class TestConcatSplitDfs(unittest.TestCase):
+    """
+    Test df_loader.concat_split_dfs against pandas.concat(df_list, ignore_index=True, sort=True)
+    """
+
+    def test_concat_split_dfs(self):
+        rng = np.random.default_rng(0)
+        column_names = ['timestamp', 'veh_speed', 'LogName', 'GT_ID', 'CO_main_safetyState']
+        for i in range(200):
+            df_list = random_split_dfs(rng, column_names)
+            expected = pd.concat(df_list, ignore_index=True, sort=True)
+            result = df_loader.concat_split_dfs(list(df_list))
+            pd.testing.assert_frame_equal(expected, result)
+
+    def test_split_concatenator(self):
+        # splits added one by one, arrays sized from the average split length and resized
+        rng = np.random.default_rng(1)
+        column_names = ['timestamp', 'veh_speed', 'LogName', 'GT_ID', 'CO_main_safetyState']
+        for i in range(200):
+            df_list = random_split_dfs(rng, column_names)
+            expected = pd.concat(df_list, ignore_index=True, sort=True)
+            splits = df_loader.SplitConcatenator(expected_splits=int(rng.integers(1, 5)))
+            for df in df_list:
+                splits.add(df)
+            pd.testing.assert_frame_equal(expected, splits.get_df())
+            self.assertEqual(splits.split_count, 0)
+
+    def test_concat_split_dfs_releases_splits(self):
+        df_list = [pd.DataFrame({'b': [1, 2], 'a': [0.5, 1.5]}), pd.DataFrame({'a': [2.5]})]
+        result = df_loader.concat_split_dfs(df_list)
+        self.assertEqual(df_list, [])
+        self.assertEqual(list(result.columns), ['a', 'b'])
+        self.assertTrue(np.isnan(result.at[2, 'b']))
+
+    def test_concat_split_dfs_empty(self):
+        self.assertRaises(ValueError, df_loader.concat_split_dfs, [])
+
+    def test_concat_split_dfs_categorical(self):
+        rng = np.random.default_rng(2)
+        value_list = ['b', 'a', None, 1.5, 0.0, 'c']
+        for i in range(200):
+            df_list = []
+            for split in range(rng.integers(1, 5)):
+                rows = int(rng.choice([0, 1, 5, 20]))
+                data = {'timestamp': rng.normal(size=rows)}
+                if rng.random() < 0.8:
+                    values = np.array(rng.choice(value_list, size=rows), dtype=object)
+                    # splits merged without compiled GT data have object columns
+                    data['Vehicle'] = df_loader.to_categorical(values) if rng.random() < 0.7 else values
+                df_list.append(pd.DataFrame(data))
+            expected = decode_categoricals(pd.concat(df_list, ignore_index=True, sort=True))
+            if any(isinstance(df.dtypes.get('Vehicle'), pd.CategoricalDtype) for df in df_list):
+                expected['Vehicle'] = expected['Vehicle'].astype('category')
+            result = df_loader.concat_split_dfs(list(df_list))
+            pd.testing.assert_frame_equal(expected, result)
+
+    def test_concat_split_dfs_categorical_not_expanded(self):
+        df_list = [pd.DataFrame({'timestamp': [0.0, 0.1], 'LogName': df_loader.to_categorical(np.array(['s1'] * 2, dtype=object))}),
+                   pd.DataFrame({'timestamp': [0.2], 'LogName': df_loader.to_categorical(np.array(['s0'], dtype=object))})]
+        with mock.patch.object(pd.Categorical, '__array__', side_effect=AssertionError('categorical expanded')):
+            result = df_loader.concat_split_dfs(df_list)
+        self.assertEqual(list(result['LogName'].cat.categories), ['s0', 's1'])
+        self.assertEqual(result['LogName'].cat.codes.tolist(), [1, 1, 0])
+
+
+class TestAlignStreams(unittest.TestCase):
+    """
+    Test df_loader.align_streams against chained df_loader.merge_df calls
+    """
+
+    def test_align_streams(self):
+        rng = np.random.default_rng(0)
+        aligned = 0
+        for i in range(300):
+            df_list = [random_stream_df(rng, name, int(rng.choice([0, 1, 10, 20, 40])))
+                       for name in ['veh_speed', 'CO_main_safetyState', 'COM_EyeQ_Frame_ID']]
+            df_list.append(pd.DataFrame({'LogName': ['log'], 'GT_ID': [int(rng.integers(0, 10))]}))
+            try:
+                expected = df_list[0]
+                for slave_df in df_list[1:]:
+                    expected = df_loader.merge_df(expected, slave_df)
+            except Exception:
+                expected = None
+            result = df_loader.align_streams(df_list)
+            if expected is None:
+                self.assertIsNone(result)
+            elif result is not None:
+                aligned += 1
+                pd.testing.assert_frame_equal(expected, result)
+        self.assertGreater(aligned, 200)
+
+    def test_align_streams_constant_columns(self):
+        df_list = [pd.DataFrame({'timestamp': np.arange(5) * 0.1, 'veh_speed': np.arange(5.0)}),
+                   pd.DataFrame({'LogName': ['log'], 'GT_ID': [3], 'ROAD_TYPE': ['highway']})]
+        result = df_loader.align_streams(df_list)
+        for column in ['LogName', 'ROAD_TYPE']:
+            self.assertIsInstance(result[column].dtype, pd.CategoricalDtype)
+            self.assertEqual(result[column].cat.codes.dtype, np.int8)
+        self.assertEqual(result['ROAD_TYPE'].tolist(), ['highway'] * 5)
+        self.assertEqual(result['GT_ID'].tolist(), [3] * 5)
+        pd.testing.assert_frame_equal(df_loader.merge_df(df_list[0], df_list[1]), result)
+
+    def test_get_asof_indexer(self):
+        master_ts = np.array([1.0, 2.0, 3.0, 5.0])
+        slave_ts = np.array([0.0, 2.0, 2.0, 4.0])
+        self.assertEqual(df_loader.get_asof_indexer(master_ts, slave_ts, 'backward').tolist(), [0, 2, 2, 3])
+        self.assertEqual(df_loader.get_asof_indexer(master_ts, slave_ts, 'forward').tolist(), [1, 1, 3, -1])
+        self.assertEqual(df_loader.get_asof_indexer(master_ts, slave_ts, 'nearest').tolist(), [0, 2, 2, 3])
+        self.assertEqual(df_loader.get_asof_indexer(master_ts, slave_ts, 'nearest', 0.5).tolist(), [-1, 2, -1, -1])
+
+
+def read_gt_data_by_cell(path_file):
+    """
+    Read the GT workbook cell by cell (reference for df_loader.read_gt_data)
+    """
+    import xlrd
+    sheet = xlrd.open_workbook(path_file).sheet_by_index(0)
+    gt_data_dict = {}
+    for row in range(1, sheet.nrows):
+        gt_data_dict[sheet.cell(row, 0).value] = {sheet.cell(0, col).value: sheet.cell(row, col).value
+                                                   for col in range(1, sheet.ncols)}
+    return pd.DataFrame(gt_data_dict).T
+
+
+class TestGtData(unittest.TestCase):
+    """
+    Test df_loader.read_gt_data and the GT data cache of df_loader.get_gt_data
+    """
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = self.folder.name + '/'
+        self.file = 'GT_Data.xls'
+        workbook = xlwt.Workbook()
+        sheet = workbook.add_sheet('GT')
+        rows = [['GT_ID', 'Vehicle', 'GT Pitch', 'GT Height', 'GT Pitch'],
+                [1, 'car1', 0.012, 1.41, 0.013],
+                [2, 'car1', -0.002, '', 0.0],
+                [2, 'car2', 0.003, 1.39, 0.001],
+                [4, 'car3', 0.0, 1.45, 0.5]]
+        for row, values in enumerate(rows):
+            for col, value in enumerate(values):
+                sheet.write(row, col, value)
+        workbook.save(self.path + self.file)
+        self.const_values = (const.GT_DATA_FOLDER, const.GT_DATA_FILE)
+        const.GT_DATA_FOLDER, const.GT_DATA_FILE = self.path, self.file
+        df_loader.gt_data_cache.clear()
+
+    def tearDown(self):
+        const.GT_DATA_FOLDER, const.GT_DATA_FILE = self.const_values
+        df_loader.gt_data_cache.clear()
+        self.folder.cleanup()
+
+    def test_read_gt_data(self):
+        pd.testing.assert_frame_equal(read_gt_data_by_cell(self.path + self.file),
+                                      df_loader.read_gt_data(self.path + self.file))
+
+    def test_get_gt_data_cache(self):
+        expected = read_gt_data_by_cell(self.path + self.file)
+        pd.testing.assert_frame_equal(expected, df_loader.get_gt_data())
+        self.assertTrue(os.path.isfile(self.path + self.file + const.GT_DATA_CACHE_SUFFIX))
+        # from the cache file
+        df_loader.gt_data_cache.clear()
+        pd.testing.assert_frame_equal(expected, df_loader.get_gt_data())
+        # workbook changed, cache is stale
+        os.utime(self.path + self.file, ns=(0, 0))
+        df_loader.gt_data_cache.clear()
+        cache = df_loader.serializer.load_pkl(self.path, self.file + const.GT_DATA_CACHE_SUFFIX)
+        pd.testing.assert_frame_equal(expected, df_loader.get_gt_data())
+        self.assertNotEqual(cache['key'], df_loader.gt_data_cache['key'])
+
+
+class TestGtLookup(unittest.TestCase):
+    """
+    Test df_loader.put_gt_data_into_master_df with compiled GT data against the merge with gt_data_df
+    """
+
+    def test_put_gt_data_into_master_df(self):
+        rng = np.random.default_rng(0)
+        gt_data_df = pd.DataFrame({float(gt_id): {'Vehicle': f'car{gt_id % 3}', 'GT Pitch': gt_id / 100, 'GT Height': ''}
+                                   for gt_id in [3, 1, 7, 4]}).T
+        gt_lookup = df_loader.compile_gt_data(gt_data_df)
+        self.assertIsNotNone(gt_lookup)
+        for gt_ids in ([1, 1, 1], [7.0, np.nan, 2.0, 4.5], [3, 4, 9, 0, -1], [100.0], []):
+            full_data_df = pd.DataFrame({'timestamp': rng.normal(size=len(gt_ids)), 'GT_ID': gt_ids})
+            expected = full_data_df.merge(gt_data_df, how='left', left_on='GT_ID', right_index=True)
+            result = df_loader.put_gt_data_into_master_df(full_data_df.copy(), gt_data_df, gt_lookup)
+            # condition columns are gathered as categorical codes
+            if gt_ids:
+                self.assertIsInstance(result['Vehicle'].dtype, pd.CategoricalDtype)
+            pd.testing.assert_frame_equal(expected, decode_categoricals(result))
+
+    def test_compile_gt_data_not_integer(self):
+        self.assertIsNone(df_loader.compile_gt_data(pd.DataFrame({'GT Pitch': [0.1]}, index=[1.5])))
+        self.assertIsNone(df_loader.compile_gt_data(pd.DataFrame({'GT Pitch': [0.1]}, index=['a'])))
+
+
+def put_deltas_by_steps(df):
+    """
+    Add the derived columns and round the dataframe step by step, literally as the original
+    put_deltas_into_master_df did (reference for df_loader.put_deltas_into_master_df).
+    Each step rounds the whole dataframe; GT Pitch and GT Yaw are rounded (not GT Pitch deg), GT Roll to 6 decimals
+    """
+    df_af = df[pd.notnull(df[const.SIG_CLB_C2W_STATE])].copy()
+    if df_af.shape[0] > 0:
+        df_af[const.DFROW_D_PITCH] = abs(df_af[const.SIG_CLB_C2W_PITCH] - df_af[const.DFROW_GT_PITCH]) / (math.pi / 180)
+        df_af[const.DFROW_D_YAW] = abs(df_af[const.SIG_CLB_C2W_YAW] - df_af[const.DFROW_GT_YAW]) / (math.pi / 180)
+        df_af[const.DFROW_D_ROLL] = abs(df_af[const.SIG_CLB_C2W_ROLL] - df_af[const.DFROW_GT_ROLL]) / (math.pi / 180)
+        df_af[const.DFROW_D_HEIGHT] = (abs(df_af[const.SIG_CLB_C2W_CAM_HEIGHT] - df_af[const.DFROW_GT_HEIGHT]) / df_af[const.DFROW_GT_HEIGHT]) * 100
+
+        df_af[const.DFROW_PITCH_DEG] = df_af[const.SIG_CLB_C2W_PITCH] / (math.pi / 180)
+        df_af[const.DFROW_YAW_DEG] = df_af[const.SIG_CLB_C2W_YAW] / (math.pi / 180)
+        df_af[const.DFROW_ROLL_DEG] = df_af[const.SIG_CLB_C2W_ROLL] / (math.pi / 180)
+
+        df_af[const.DFROW_GT_PITCH_DEG] = df_af[const.DFROW_GT_PITCH] / (math.pi / 180)
+        df_af[const.DFROW_GT_YAW_DEG] = df_af[const.DFROW_GT_YAW] / (math.pi / 180)
+        df_af[const.DFROW_GT_ROLL_DEG] = df_af[const.DFROW_GT_ROLL] / (math.pi / 180)
+
+        df_af = df_af.astype({const.DFROW_D_PITCH: float}).round(3)
+        df_af = df_af.astype({const.DFROW_D_YAW: float}).round(3)
+        df_af = df_af.astype({const.DFROW_D_ROLL: float}).round(3)
+        df_af = df_af.astype({const.DFROW_D_HEIGHT: float}).round(3)
+        df_af = df_af.astype({const.DFROW_PITCH_DEG: float}).round(3)
+        df_af = df_af.astype({const.DFROW_YAW_DEG: float}).round(3)
+        df_af = df_af.astype({const.DFROW_ROLL_DEG: float}).round(3)
+        df_af = df_af.astype({const.DFROW_GT_PITCH: float}).round(3)
+        df_af = df_af.astype({const.DFROW_GT_YAW: float}).round(3)
+        df_af = df_af.astype({const.DFROW_GT_ROLL: float}).round(6)
+    return df_af
+
+
+class TestPutDeltas(unittest.TestCase):
+    """
+    Test df_loader.put_deltas_into_master_df against step by step rounding of the whole dataframe
+    """
+
+    def test_put_deltas_into_master_df(self):
+        rng = np.random.default_rng(1)
+        for i in range(100):
+            rows = int(rng.choice([0, 1, 7, 50]))
+            df = pd.DataFrame({'timestamp': rng.normal(size=rows) * 100,
+                               const.SIG_CLB_C2W_STATE: rng.choice([64273.0, np.nan], rows),
+                               'GT_ID': rng.integers(0, 3, rows)})
+            for signal in [const.SIG_CLB_C2W_PITCH, const.SIG_CLB_C2W_YAW, const.SIG_CLB_C2W_ROLL]:
+                values = rng.normal(size=rows) * 0.05
+                df[signal] = values.astype(np.float32) if rng.random() < 0.2 else values
+            df[const.SIG_CLB_C2W_CAM_HEIGHT] = 1.4 + rng.normal(size=rows) * 0.05
+            # gt columns are object columns when read from the gt workbook
+            gt_object = rng.random() < 0.6
+            for gt_column in [const.DFROW_GT_PITCH, const.DFROW_GT_YAW, const.DFROW_GT_ROLL, const.DFROW_GT_HEIGHT]:
+                values = rng.normal(size=rows) * 0.01 + (1.4 if gt_column == const.DFROW_GT_HEIGHT else 0)
+                df[gt_column] = pd.Series(list(values), dtype=object) if gt_object else values
+            pd.testing.assert_frame_equal(put_deltas_by_steps(df), df_loader.put_deltas_into_master_df(df),
+                                          check_exact=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import const
+import histogram_cube
+import calc_functions as cf
+import pandas as pd
+import numpy as np
+
+
+class TestHistogramCube(unittest.TestCase):
+    """
+    Test histogram_cube weighed dataframes against the concatenated weighed deltas of all measurements
+    """
+
+    def test_histogram_to_df(self):
+        rng = np.random.default_rng(0)
+        frames = []
+        histogram_dict = {}
+        for measurement in range(20):
+            rows = int(rng.integers(1, 80))
+            df = pd.DataFrame({column: rng.choice(['a', 'b', None], rows) for column in const.SKETCH_CONDITION_COLUMNS})
+            df[const.DFROW_D_PITCH] = np.round(np.abs(rng.normal(size=rows) * 0.2), 3)
+            df['weight'] = rng.integers(0, 30, rows)
+            # measurements without convergence (no delta, weight 0)
+            df.loc[df.index[::11], [const.DFROW_D_PITCH, 'weight']] = [np.nan, 0]
+            frames.append(df)
+            histogram_cube.add_df_to_histogram(histogram_dict, df, const.DFROW_D_PITCH)
+        frame_df = pd.concat(frames, ignore_index=True)
+        histogram_df = histogram_cube.histogram_to_df(histogram_dict, const.DFROW_D_PITCH)
+        self.assertLess(histogram_df.shape[0], frame_df.shape[0])
+        for column in [None] + const.SKETCH_CONDITION_COLUMNS:
+            frame_filtered = frame_df if column is None else frame_df[frame_df[column] == 'a']
+            histogram_filtered = histogram_df if column is None else histogram_df[histogram_df[column] == 'a']
+            self.assertEqual(cf.calc_weighed_percentile_df(frame_filtered, const.DFROW_D_PITCH),
+                             cf.calc_weighed_percentile_df(histogram_filtered, const.DFROW_D_PITCH))
+            self.assertEqual(frame_filtered['weight'].sum(), histogram_filtered['weight'].sum())
+            self.assertEqual(frame_filtered.loc[frame_filtered[const.DFROW_D_PITCH] > 0.3, 'weight'].sum(),
+                             histogram_filtered.loc[histogram_filtered[const.DFROW_D_PITCH] > 0.3, 'weight'].sum())
+
+    def test_bins(self):
+        values = np.round(np.random.default_rng(1).normal(size=1000) * 5, 3)
+        bins = histogram_cube.get_bins(values)
+        self.assertEqual(bins.dtype, np.int64)
+        np.testing.assert_array_equal(values, histogram_cube.get_values(bins))
+
+
+if __name__ == '__main__':
+    unittest.main()
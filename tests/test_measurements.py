@@ -0,0 +1,80 @@
+import tempfile
+import unittest
+from unittest import mock
+import const
+import measurements
+import pandas as pd
+import numpy as np
+
+
+class TestMakeMeasurementDfsFromSplits(unittest.TestCase):
+    """
+    Test measurements.Measurements.make_measurement_dfs_from_splits with measurements that can not be made
+    """
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        args_dict = {'pkl_dict_folder': self.folder.name,
+                     'pkl_dict_ext': 'pkl',
+                     'prelabel_dict': {'ADCAM_WVWZZZ1KZAW000001_20220102_120001': {
+                         const.DFROW_GT_ID: [1], const.DFROW_ROAD: ['highway'], const.DFROW_WEATHER: ['clear'],
+                         const.DFROW_DAYTIME: ['day']}},
+                     'path_report': self.folder.name,
+                     'report_file_name': 'report',
+                     'sw_package_num': 'SW',
+                     'measurement_folder': self.folder.name,
+                     'log_pickle_folder': self.folder.name,
+                     'gt_data_df': pd.DataFrame({'Vehicle': ['car']}, index=[1])}
+        self.me = measurements.Measurements(args_dict)
+        self.me.measurement_id_list = np.array(['CDMFK_WVWZZZ1KZAW000000_20220101_120000',
+                                                'CDMFK_WVWZZZ1KZAW000001_20220102_120001'])
+        self.me.measurement_splits_dict = {
+            'CDMFK_WVWZZZ1KZAW000000_20220101_120000': ['CDMFK_WVWZZZ1KZAW000000_20220101_120000_0000.pickle.xz'],
+            'CDMFK_WVWZZZ1KZAW000001_20220102_120001': ['CDMFK_WVWZZZ1KZAW000001_20220102_120001_0000.pickle.xz',
+                                                        'CDMFK_WVWZZZ1KZAW000001_20220102_120001_0001.pickle.xz']}
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_no_prelabel_and_no_splits(self):
+        # first measurement has no prelabel, no split of the second measurement can be opened
+        with mock.patch.object(measurements.serializer, 'load_pkl', side_effect=OSError('broken')) as load_pkl, \
+                mock.patch.object(self.me, 'save_measurement_df') as save_measurement_df:
+            self.me.make_measurement_dfs_from_splits()
+        self.assertEqual([call.args[1] for call in load_pkl.call_args_list],
+                         self.me.measurement_splits_dict['CDMFK_WVWZZZ1KZAW000001_20220102_120001'])
+        save_measurement_df.assert_not_called()
+
+    def test_no_prelabel(self):
+        # the measurement without prelabel is not made, the next measurement is
+        with mock.patch.object(measurements.serializer, 'load_pkl', return_value={}), \
+                mock.patch.object(measurements.pickle_to_dict, 'get_split_dict', return_value={'prelabel_dict': {}}), \
+                mock.patch.object(self.me, 'split_dict_to_df',
+                                  side_effect=lambda data_dict, file: pd.DataFrame(
+                                      {'timestamp': [0.0, 0.1], 'veh_speed': [10.0, 10.0]})), \
+                mock.patch.object(self.me, 'save_measurement_df') as save_measurement_df:
+            self.me.make_measurement_dfs_from_splits()
+        save_measurement_df.assert_called_once()
+        measurement_id, splits = save_measurement_df.call_args.args
+        self.assertEqual(measurement_id, 'CDMFK_WVWZZZ1KZAW000001_20220102_120001')
+        self.assertEqual(splits.get_df().shape[0], 4)
+
+
+class TestGetSumsPerDs(unittest.TestCase):
+    """
+    Test measurements.Measurements.get_sums_per_ds against the per measurement counters
+    """
+
+    def test_get_sums_per_ds(self):
+        ds_array = np.array([2, 0, 2, 5])
+        distance = [1.25, 0.5, 2.0, 3.0]
+        expected = [0] * 7
+        for ds, value in zip(ds_array, distance):
+            expected[ds] += value
+        result = measurements.Measurements.get_sums_per_ds(ds_array, distance, 7)
+        self.assertEqual(expected, result)
+        # empty ds slots print as 0 in the HEADER sheet, not 0.0
+        self.assertEqual([str(value) for value in result], ['0.5', '0', '3.25', '0', '0', '3.0', '0'])
+        clips = measurements.Measurements.get_sums_per_ds(ds_array, [3, 1, 4, 2], 7)
+        self.assertEqual([str(value) for value in clips], ['1', '0', '7', '0', '0', '2', '0'])
+        self.assertEqual(measurements.Measurements.get_sums_per_ds(np.array([], dtype=int), [], 3), [0, 0, 0])
@@ -0,0 +1,99 @@
+import math
+import tempfile
+import unittest
+import const
+import quantile_sketch
+import calc_functions as cf
+import pandas as pd
+import numpy as np
+
+
+class TestQuantileSketch(unittest.TestCase):
+    """
+    Test quantile_sketch.QuantileSketch against calc_functions.weighed_percentiles
+    """
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.nth_q_list = [0.25, 0.5, 0.75, 0.90, 0.95, 0.98, 0.99]
+
+    def test_exact_sketch(self):
+        # rounded deltas: less distinct values than the compression
+        values = np.abs(self.rng.normal(size=5000) * 0.1).round(2)
+        weights = self.rng.integers(1, 10, 5000)
+        sketch = quantile_sketch.QuantileSketch(compression=200)
+        for part in np.array_split(np.arange(5000), 7):
+            sketch.merge(quantile_sketch.QuantileSketch(compression=200).add(values[part], weights[part]))
+        self.assertTrue(sketch.exact)
+        expected = cf.weighed_percentiles(pd.DataFrame({'value': values, 'weight': weights}), self.nth_q_list)
+        self.assertEqual(expected, [sketch.weighed_percentile(nth_q) for nth_q in self.nth_q_list])
+        self.assertEqual(weights.sum(), sketch.sum_of_weights)
+
+    def test_sketch_error_bound(self):
+        values = self.rng.lognormal(size=100000)
+        weights = self.rng.integers(1, 5, 100000)
+        sketch = quantile_sketch.QuantileSketch(compression=100)
+        for part in np.array_split(np.arange(100000), 50):
+            sketch.add(values[part], weights[part])
+        self.assertFalse(sketch.exact)
+        self.assertLessEqual(sketch.means.size, 200)
+        self.assertEqual(values.min(), sketch.min)
+        self.assertEqual(values.max(), sketch.max)
+        order = np.argsort(values)
+        cumulative_weights = np.cumsum(weights[order])
+        for nth_q in self.nth_q_list:
+            # rank of the sketch percentile in the data
+            rank = cumulative_weights[np.searchsorted(values[order], sketch.weighed_percentile(nth_q))]
+            rank_error = abs(rank / cumulative_weights[-1] - nth_q)
+            self.assertLessEqual(rank_error, 2 * math.pi * math.sqrt(nth_q * (1 - nth_q)) / 100)
+
+    def test_calc_sketch_percentile_df(self):
+        frames = []
+        sketch_dict = {}
+        for measurement in range(10):
+            rows = int(self.rng.integers(1, 50))
+            df = pd.DataFrame({column: self.rng.choice(['a', 'b'], rows) for column in const.SKETCH_CONDITION_COLUMNS})
+            df[const.DFROW_D_PITCH] = self.rng.integers(0, 60, rows) / 100
+            df['weight'] = self.rng.integers(1, 30, rows)
+            frames.append(df)
+            quantile_sketch.add_df_to_sketches(sketch_dict, df, const.DFROW_D_PITCH, 0.3)
+        frame_df = pd.concat(frames, ignore_index=True)
+        sketch_df = quantile_sketch.sketches_to_df(sketch_dict)
+        for column in [None] + const.SKETCH_CONDITION_COLUMNS:
+            frame_filtered = frame_df if column is None else frame_df[frame_df[column] == 'a']
+            sketch_filtered = sketch_df if column is None else sketch_df[sketch_df[column] == 'a']
+            self.assertEqual(cf.calc_weighed_percentile_df(frame_filtered, const.DFROW_D_PITCH),
+                             quantile_sketch.calc_sketch_percentile_df(sketch_filtered, const.DFROW_D_PITCH))
+        self.assertEqual(frame_df['weight'].sum(), sketch_df['weight'].sum())
+        self.assertEqual(frame_df.loc[frame_df[const.DFROW_D_PITCH] > 0.3, 'weight'].sum(),
+                         sketch_df['failed weight'].sum())
+
+    def test_merge_saved_sketches(self):
+        sketch_dicts = [{}, {}]
+        frames = []
+        for measurement in range(10):
+            rows = int(self.rng.integers(1, 50))
+            df = pd.DataFrame({column: self.rng.choice(['a', 'b'], rows) for column in const.SKETCH_CONDITION_COLUMNS})
+            df[const.DFROW_GT_ID] = self.rng.integers(1, 3, rows)
+            df[const.DFROW_D_PITCH] = self.rng.lognormal(size=rows)
+            df['weight'] = self.rng.integers(1, 30, rows)
+            frames.append(df)
+            # first run has the first half of the measurements, second run the rest
+            quantile_sketch.add_df_to_sketches(sketch_dicts[measurement % 2], df, const.DFROW_D_PITCH, 0.3)
+        with tempfile.TemporaryDirectory() as folder:
+            quantile_sketch.save_sketches({const.DFROW_D_PITCH: sketch_dicts[0]}, folder, 'sketches')
+            merged_dicts = {const.DFROW_D_PITCH: sketch_dicts[1]}
+            quantile_sketch.merge_saved_sketches(merged_dicts, 'sketches', [folder])
+        frame_df = pd.concat(frames, ignore_index=True)
+        sketch_df = quantile_sketch.sketches_to_df(merged_dicts[const.DFROW_D_PITCH])
+        self.assertEqual(frame_df['weight'].sum(), sketch_df['weight'].sum())
+        self.assertEqual(frame_df.loc[frame_df[const.DFROW_D_PITCH] > 0.3, 'weight'].sum(),
+                         sketch_df['failed weight'].sum())
+        self.assertEqual(frame_df.groupby(const.SKETCH_CONDITION_COLUMNS).ngroups, sketch_df.shape[0])
+        percentile_dict = quantile_sketch.calc_sketch_percentile_df(sketch_df, const.DFROW_D_PITCH)
+        self.assertEqual(frame_df[const.DFROW_D_PITCH].min(), percentile_dict['Percentile 0'])
+        self.assertEqual(frame_df[const.DFROW_D_PITCH].max(), percentile_dict['Percentile 100'])
+
+
+if __name__ == '__main__':
+    unittest.main()
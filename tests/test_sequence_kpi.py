@@ -0,0 +1,73 @@
+import unittest
+import const
+import calc_functions as cf
+from sequence_kpi import KpiSequence
+import pandas as pd
+import numpy as np
+
+
+def random_condition_df(rng, rows):
+    """
+    Make a random weighed dataframe with condition columns (categorical or object, some nan)
+    """
+    df = pd.DataFrame({const.DFROW_ROAD: rng.choice([const.VAL_ROAD_CITY, const.VAL_ROAD_HIGHWAY, const.VAL_ROAD_RURAL, None], rows),
+                       const.DFROW_DAYTIME: rng.choice([const.VAL_DAYTIME_DAY, const.VAL_DAYTIME_NIGHT, np.nan], rows),
+                       const.DFROW_WEATHER: rng.choice([const.VAL_WEATHER_CLEAR, const.VAL_WEATHER_RAIN, const.VAL_WEATHER_SNOW,
+                                                        const.VAL_WEATHER_FOG], rows),
+                       const.DFROW_D_PITCH: np.round(np.abs(rng.normal(size=rows)) * 0.2, 3),
+                       'weight': rng.integers(0, 20, rows)})
+    if rng.random() < 0.5:
+        df[const.DFROW_ROAD] = df[const.DFROW_ROAD].astype('category')
+    return df
+
+
+class TestConditionEngine(unittest.TestCase):
+    """
+    Test KpiSequence condition masks and grouped calc functions against filtering the dataframe for each condition
+    """
+
+    def setUp(self):
+        self.project_config = const.PROJECT_CONFIG
+
+    def tearDown(self):
+        const.PROJECT_CONFIG = self.project_config
+
+    def test_get_condition_masks(self):
+        rng = np.random.default_rng(0)
+        for rows, project_config in [(0, const.CARIAD), (1, const.ADCAM), (10, const.CARIAD), (200, const.CARIAD),
+                                     (200, const.ADCAM)]:
+            const.PROJECT_CONFIG = project_config
+            df = random_condition_df(rng, rows)
+            masks = KpiSequence.get_condition_masks(df, const.KPI_ALL_CONDITIONS)
+            for (name, road, daytime, weather), mask in zip(const.KPI_ALL_CONDITIONS, masks):
+                expected = np.ones(rows, dtype=bool)
+                if daytime == const.VAL_DAYTIME_RAIN_COND:
+                    daytime = const.VAL_DAYTIME_NIGHT if const.PROJECT_CONFIG == const.CARIAD else const.VAL_DAYTIME_DAY
+                for column, value, any_value in ((const.DFROW_ROAD, road, const.VAL_ROAD_ANY),
+                                                 (const.DFROW_DAYTIME, daytime, const.VAL_DAYTIME_ANY),
+                                                 (const.DFROW_WEATHER, weather, const.VAL_WEATHER_ANY)):
+                    if value != any_value:
+                        expected &= (df[column] == value).to_numpy()
+                if name == 'Full data':
+                    self.assertIsNone(mask)
+                else:
+                    np.testing.assert_array_equal(expected, mask)
+
+    def test_calc_weighed_percentile_dfs(self):
+        rng = np.random.default_rng(1)
+        for i in range(50):
+            df = random_condition_df(rng, int(rng.choice([0, 5, 50, 300])))
+            if rng.random() < 0.3:
+                # measurement without convergence: None delta, weight 0
+                df[const.DFROW_D_PITCH] = df[const.DFROW_D_PITCH].astype(object)
+                df.loc[df.index[::7], [const.DFROW_D_PITCH, 'weight']] = [None, 0]
+            masks = KpiSequence.get_condition_masks(df, const.KPI_ALL_CONDITIONS)
+            expected = [cf.calc_weighed_percentile_df(df if mask is None else df[mask], const.DFROW_D_PITCH)
+                        for mask in masks]
+            result = cf.calc_weighed_percentile_dfs(df, const.DFROW_D_PITCH, masks)
+            pd.testing.assert_frame_equal(pd.DataFrame(expected, dtype=float), pd.DataFrame(result, dtype=float),
+                                          check_exact=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
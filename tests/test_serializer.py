@@ -0,0 +1,82 @@
+import tempfile
+import unittest
+import serializer
+import pandas as pd
+import numpy as np
+
+
+class TestNpzDf(unittest.TestCase):
+    """
+    Test serializer.save_npz_df / serializer.load_npz_df round trip with run-length encoded columns
+    """
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        rows = 100
+        self.df = pd.DataFrame({'timestamp': np.arange(rows) * 0.033,
+                                'LogName': pd.Categorical(['split_0'] * 60 + ['split_1'] * 40),
+                                'GT_ID': np.full(rows, 3, dtype=np.int8),
+                                'WEATHER': pd.Categorical(['clear'] * rows),
+                                'state': np.repeat([np.nan, 43923.0, 64273.0, np.nan], 25),
+                                'valid': np.repeat([True, False], 50)})
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_npz_df_rle(self):
+        for rle_ratio in [0, 0.1]:
+            serializer.save_npz_df(self.df, self.folder.name, 'measurement', rle_ratio)
+            df = serializer.load_npz_df(self.folder.name, 'measurement')
+            pd.testing.assert_frame_equal(self.df, df)
+            df = serializer.load_npz_df(self.folder.name, 'measurement', ['state', 'GT_ID'])
+            pd.testing.assert_frame_equal(self.df[['GT_ID', 'state']], df)
+
+    def test_rle_encode(self):
+        values, lengths = serializer.rle_encode(self.df['state'].to_numpy())
+        self.assertEqual(lengths.tolist(), [25, 25, 25, 25])
+        np.testing.assert_array_equal(np.repeat(values, lengths), self.df['state'].to_numpy())
+        self.assertIsNone(serializer.rle_encode(np.array(['a', 'b'], dtype=object)))
+
+
+class TestNpz(unittest.TestCase):
+    """
+    Test serializer.save_npz / serializer.load_npz round trip of a split dictionary
+    """
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.split_dict = {
+            'cal_c2w_dict': {'timestamp': [0.0, 0.033, 0.066],
+                             'CO_main_safetyState': np.array([1, 2, 2], dtype=np.int64),
+                             'CO_main_camH': [1.2, None, 1.3]},
+            'prelabel_dict': {'LogName': ['CDMFK_WVWZZZ1KZAW000000_20220101_120000_0000.pick'],
+                              'ROAD_TYPE': np.array(['highway', None], dtype=object),
+                              'Vehicle': ['car', 1.5, None],
+                              'nested': {'a': [1, 2], 'b': {'c': 'd'}}},
+            'cal_nvm_dict': {}}
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_npz_round_trip(self):
+        serializer.save_npz(self.split_dict, self.folder.name, 'split')
+        with np.load(f'{self.folder.name}/split.npz') as npz:
+            # allow_pickle=False, no object arrays in the file
+            self.assertTrue(all(npz[name].dtype != object for name in npz.files))
+        split_dict = serializer.load_npz(self.folder.name, 'split')
+        self.assertEqual(list(split_dict.keys()), ['cal_c2w_dict', 'prelabel_dict', 'cal_nvm_dict'])
+        self.assertEqual(split_dict['cal_nvm_dict'], {})
+        c2w = split_dict['cal_c2w_dict']
+        np.testing.assert_array_equal(c2w['timestamp'], [0.0, 0.033, 0.066])
+        self.assertEqual(c2w['CO_main_safetyState'].dtype, np.int64)
+        np.testing.assert_array_equal(c2w['CO_main_camH'], [1.2, np.nan, 1.3])
+        prelabel = split_dict['prelabel_dict']
+        self.assertEqual(prelabel['LogName'].tolist(), self.split_dict['prelabel_dict']['LogName'])
+        self.assertEqual(prelabel['ROAD_TYPE'].dtype, object)
+        self.assertEqual(prelabel['ROAD_TYPE'].tolist(), ['highway', None])
+        self.assertEqual(prelabel['Vehicle'].tolist(), ['car', 1.5, None])
+        self.assertEqual(prelabel['nested'], {'a': [1, 2], 'b': {'c': 'd'}})
+
+
+if __name__ == '__main__':
+    unittest.main()